@@ -1,6 +1,10 @@
 from django.contrib import admin
 
-from .models import Acao, Carteira, Movimentacao
+from .models import (
+    Acao, AcaoPrecoHistorico, Carteira, Movimentacao, ResultadoMensal
+)
 
 
-admin.site.register([Acao, Carteira, Movimentacao])
\ No newline at end of file
+admin.site.register([
+    Acao, AcaoPrecoHistorico, Carteira, Movimentacao, ResultadoMensal
+])
\ No newline at end of file
@@ -0,0 +1,60 @@
+""" Utilitários comuns aos comandos de benchmark """
+import json
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Cronometro:
+    """ Mede o tempo decorrido em segundos dentro de um bloco with """
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        self.segundos = 0
+        return self
+
+    def __exit__(self, *args):
+        self.segundos = time.perf_counter() - self.inicio
+
+
+def por_segundo(quantidade, segundos):
+    """ Vazão de itens por segundo """
+    return quantidade / segundos if segundos else float('inf')
+
+
+def percentil(valores, percentual):
+    """ Percentil com interpolação linear entre as amostras """
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[percentual - 1]
+
+
+def mede(funcao, repeticoes, prepara=None):
+    """
+    Executa funcao repeticoes vezes (chamando prepara antes de cada uma, fora
+    da medição) e retorna latência em ms (p50, p95, máxima) e o maior número
+    de consultas de uma execução
+    """
+    tempos = []
+    consultas = 0
+    for _ in range(repeticoes):
+        if prepara is not None:
+            prepara()
+        with CaptureQueriesContext(connection) as capturadas, Cronometro() as cronometro:
+            funcao()
+        tempos.append(cronometro.segundos * 1000)
+        consultas = max(consultas, len(capturadas))
+    return {
+        'consultas': consultas,
+        'ms_p50': round(percentil(tempos, 50), 2),
+        'ms_p95': round(percentil(tempos, 95), 2),
+        'ms_max': round(max(tempos), 2),
+    }
+
+
+def salva_resultados(resultados, arquivo):
+    """ Grava os resultados em JSON para comparação entre execuções """
+    with open(arquivo, 'w') as saida:
+        json.dump(resultados, saida, indent=2, default=str)
@@ -0,0 +1,166 @@
+"""
+Cache por usuário dos fragmentos do dashboard e do JSON do gráfico. A chave
+combina a versão da carteira do usuário (User.versao_carteira, incrementada
+a cada reprocessamento de posição) com a versão dos preços, lida do banco
+(última Acao.data_hora_atualizacao, indexada), que o worker do Celery
+altera ao gravar um preço novo: nada é apagado, uma versão nova gera chaves novas e as
+antigas expiram
+
+Usa só get/set/get_many/set_many, então funciona com o backend local em
+memória ou em arquivo. Acertos e falhas de cada fragmento são acumulados no
+processo e somados à tabela EstatisticaCache no máximo a cada
+INTERVALO_GRAVACAO segundos, não a cada falha: o UPDATE nas linhas
+compartilhadas serializaria as requisições de todos os processos
+(estatisticas_cache)
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Max, Value, When
+
+from acoes.models import Acao, EstatisticaCache
+
+
+PREFIXO = 'dashboard'
+FRAGMENTOS = ('header', 'carteira', 'alocacao', 'grafico')
+# Segundos entre gravações dos contadores do processo
+INTERVALO_GRAVACAO = 60
+# Acessos pendentes que forçam a gravação antes do intervalo
+LIMITE_PENDENTES = 1000
+
+pendentes = Counter()
+lock = threading.Lock()
+ultima_gravacao = time.monotonic()
+
+
+def versao_precos():
+    """
+    Versão atual dos preços: instante, em microssegundos, da última
+    alteração de preço de qualquer ação (salva_precos, admin ou cadastro)
+    """
+    ultima = Acao.objects.aggregate(
+        ultima=Max('data_hora_atualizacao')
+    )['ultima']
+    if ultima is None:
+        return 0
+    return int(ultima.timestamp()) * 1000000 + ultima.microsecond
+
+
+def chave_usuario(nome, user, *partes):
+    """ Chave do fragmento para a versão atual da carteira do usuário """
+    return ':'.join(
+        str(parte) for parte in
+        (PREFIXO, nome, user.pk, user.versao_carteira, *partes)
+    )
+
+
+def registra(nome, hit):
+    """ Conta o acesso; retorna True se os contadores devem ser gravados """
+    with lock:
+        pendentes[nome, 'hits' if hit else 'misses'] += 1
+        return (
+            sum(pendentes.values()) >= LIMITE_PENDENTES
+            or time.monotonic() - ultima_gravacao >= INTERVALO_GRAVACAO
+        )
+
+
+def grava_estatisticas():
+    """ Soma os contadores pendentes do processo à tabela, em um UPDATE """
+    global ultima_gravacao
+    with lock:
+        contadores = dict(pendentes)
+        pendentes.clear()
+        ultima_gravacao = time.monotonic()
+    if not contadores:
+        return
+    nomes = {nome for nome, _ in contadores}
+
+    def incremento(tipo):
+        return F(tipo) + Case(
+            *[
+                When(fragmento=nome, then=Value(contadores.get((nome, tipo), 0)))
+                for nome in nomes
+            ],
+            default=Value(0),
+        )
+
+    atualizados = EstatisticaCache.objects.filter(fragmento__in=nomes).update(
+        hits=incremento('hits'), misses=incremento('misses')
+    )
+    if atualizados < len(nomes):
+        # Fragmento sem linha (ex.: tabela zerada): cria já com os contadores
+        existentes = set(EstatisticaCache.objects.filter(
+            fragmento__in=nomes
+        ).values_list('fragmento', flat=True))
+        EstatisticaCache.objects.bulk_create([
+            EstatisticaCache(
+                fragmento=nome,
+                hits=contadores.get((nome, 'hits'), 0),
+                misses=contadores.get((nome, 'misses'), 0),
+            )
+            for nome in nomes - existentes
+        ], ignore_conflicts=True)
+
+
+def busca_fragmentos(chaves, gera):
+    """
+    Busca os fragmentos em uma leitura ao cache e gera só os ausentes
+    chaves: dict nome -> chave; gera(nomes) retorna dict nome -> valor
+    Retorna dict nome -> valor
+    """
+    encontrados = cache.get_many(list(chaves.values()))
+    valores, ausentes, grava = {}, [], False
+    for nome, chave in chaves.items():
+        if chave in encontrados:
+            valores[nome] = encontrados[chave]
+        else:
+            ausentes.append(nome)
+        grava = registra(nome, chave in encontrados) or grava
+
+    if grava:
+        grava_estatisticas()
+    if ausentes:
+        gerados = gera(ausentes)
+        cache.set_many(
+            {chaves[nome]: gerados[nome] for nome in ausentes},
+            settings.DASHBOARD_CACHE_TIMEOUT
+        )
+        valores.update(gerados)
+    return valores
+
+
+def estatisticas():
+    """
+    Acertos, falhas e taxa de acerto por fragmento, de todos os processos
+    (mais os ainda pendentes neste)
+    """
+    with lock:
+        contadores = Counter(pendentes)
+    gravados = {
+        fragmento: (hits, misses)
+        for fragmento, hits, misses in EstatisticaCache.objects.values_list(
+            'fragmento', 'hits', 'misses'
+        )
+    }
+    resultado = {}
+    for nome in FRAGMENTOS:
+        hits, misses = gravados.get(nome, (0, 0))
+        hits += contadores[nome, 'hits']
+        misses += contadores[nome, 'misses']
+        resultado[nome] = {
+            'hits': hits,
+            'misses': misses,
+            'taxa_acerto': hits / (hits + misses) if hits + misses else 0,
+        }
+    return resultado
+
+
+def zera_estatisticas():
+    global ultima_gravacao
+    with lock:
+        pendentes.clear()
+        ultima_gravacao = time.monotonic()
+    EstatisticaCache.objects.update(hits=0, misses=0)
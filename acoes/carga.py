@@ -0,0 +1,200 @@
+"""
+Dados sintéticos de carga para reproduzir localmente bases do tamanho da
+produção: usuários, ações com preços mensais em passeio aleatório e, para
+cada usuário, um ledger de vários anos com compras em lotes, vendas
+parciais e vendas que zeram a posição
+
+Tudo é gravado com bulk_create, sem os signals; as posições das
+movimentações, as carteiras e os resultados mensais vêm depois do motor de
+posição (reconstroi_carteiras), então ficam consistentes com o ledger
+A mesma semente e a mesma data final geram sempre os mesmos dados
+"""
+import math
+import random
+import string
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from acoes.models import Acao, Carteira, Movimentacao
+from acoes.posicao import reconstroi_carteiras
+from acoes.resultados import reconstroi_resultados_mensais
+
+
+DOMINIO = 'carga.teste'
+# Os tickers da B3 começam por letra (e os terminados em 9 existem, como
+# recibos de subscrição): o prefixo marca as ações geradas, as únicas
+# apagadas por remove_dados_carga
+PREFIXO_TICKER = '_'
+PROBABILIDADE_VENDA = 0.35
+PROBABILIDADE_VENDA_TOTAL = 0.25
+PRECO_MINIMO, PRECO_MAXIMO = 100, 30000
+# Mantém posição x preço dentro dos DecimalField de 8 dígitos
+QUANTIDADE_MAXIMA = 99999999 // PRECO_MAXIMO
+
+
+def email_carga(indice):
+    return f'carga{indice:06d}@{DOMINIO}'
+
+
+def ticker_carga(indice):
+    """ _AAAA, _AAAB, ...: até 26 ** 4 tickers """
+    letras = ''
+    for _ in range(4):
+        indice, resto = divmod(indice, 26)
+        letras = string.ascii_uppercase[resto] + letras
+    return PREFIXO_TICKER + letras
+
+
+def usuarios_carga():
+    return get_user_model().objects.filter(email__endswith='@' + DOMINIO)
+
+
+def acoes_carga():
+    return Acao.objects.filter(ticker__startswith=PREFIXO_TICKER)
+
+
+def indice_mes(inicio, data):
+    return (data.year - inicio.year) * 12 + data.month - inicio.month
+
+
+def serie_precos(aleatorio, meses):
+    """ Preço mensal em centavos, passeio aleatório com leve alta """
+    preco = aleatorio.randint(500, 10000)
+    serie = []
+    for _ in range(meses):
+        serie.append(preco)
+        preco = round(preco * math.exp(aleatorio.gauss(0.005, 0.08)))
+        preco = min(max(preco, PRECO_MINIMO), PRECO_MAXIMO)
+    return serie
+
+
+def gera_ledger(aleatorio, user_id, acoes, precos, total, inicio, fim):
+    """
+    Movimentações do usuário em ordem de data sobre algumas das ações:
+    compras em lotes de 100 e, havendo posição, vendas parciais ou totais
+    """
+    carteira = aleatorio.sample(
+        acoes, min(len(acoes), aleatorio.randint(5, 20))
+    )
+    dias = (fim - inicio).days
+    datas = sorted(
+        inicio + timedelta(days=aleatorio.randint(0, dias))
+        for _ in range(total)
+    )
+    posicoes = {}
+    for data in datas:
+        acao = aleatorio.choice(carteira)
+        preco = min(PRECO_MAXIMO, round(
+            precos[acao.pk][indice_mes(inicio, data)]
+            * aleatorio.uniform(0.98, 1.02)
+        ))
+        quantidade = posicoes.get(acao.pk, 0)
+        lote = aleatorio.randint(1, 10) * 100
+        vende = quantidade and (
+            aleatorio.random() < PROBABILIDADE_VENDA
+            or quantidade + lote > QUANTIDADE_MAXIMA
+        )
+        if vende:
+            tipo = 'V'
+            if quantidade == 1 or aleatorio.random() < PROBABILIDADE_VENDA_TOTAL:
+                movimentada = quantidade
+            else:
+                movimentada = aleatorio.randint(1, quantidade - 1)
+            posicoes[acao.pk] = quantidade - movimentada
+        else:
+            tipo, movimentada = 'C', lote
+            posicoes[acao.pk] = quantidade + lote
+
+        preco = Decimal(preco).scaleb(-2)
+        yield Movimentacao(
+            user_id=user_id, acao_id=acao.pk, data_movimentacao=data,
+            tipo=tipo, preco=preco, quantidade=movimentada,
+            valor_total=preco * movimentada,
+        )
+
+
+def grava_em_lotes(modelo, objetos, tamanho_lote):
+    objetos = iter(objetos)
+    gravados = 0
+    while True:
+        lote = list(islice(objetos, tamanho_lote))
+        if not lote:
+            return gravados
+        modelo.objects.bulk_create(lote)
+        gravados += len(lote)
+
+
+def remove_dados_carga():
+    """ Apaga usuários e ações de carga com tudo que depende deles """
+    with transaction.atomic():
+        # Movimentações, carteiras e resultados mensais são apagados em
+        # cascata, sem reprocessar as posições dos usuários removidos
+        usuarios_carga().delete()
+        acoes_carga().exclude(
+            Exists(Movimentacao.objects.filter(acao=OuterRef('pk')))
+        ).exclude(
+            Exists(Carteira.objects.filter(acao=OuterRef('pk')))
+        ).delete()
+
+
+def gera_dados_carga(usuarios=100, tickers=50, movimentacoes=200, anos=5,
+                     fim=None, semente=42, senha='carga', tamanho_lote=5000):
+    """
+    Gera os usuários carga000000@carga.teste, ... (todos com a mesma senha),
+    as ações e, para cada usuário, o número informado de movimentações
+    entre o início do mês de fim, anos antes, e fim
+    Retorna a quantidade gravada de cada modelo
+    """
+    fim = fim or date.today()
+    inicio = date(fim.year - anos, fim.month, 1)
+    meses = indice_mes(inicio, fim) + 1
+    aleatorio = random.Random(semente)
+    User = get_user_model()
+
+    with transaction.atomic():
+        senha = make_password(senha)
+        grava_em_lotes(User, (
+            User(email=email_carga(indice), password=senha)
+            for indice in range(usuarios)
+        ), tamanho_lote)
+        user_ids = list(
+            usuarios_carga().order_by('email').values_list('pk', flat=True)
+        )
+
+        series = [serie_precos(aleatorio, meses) for _ in range(tickers)]
+        nomes = [ticker_carga(indice) for indice in range(tickers)]
+        Acao.objects.bulk_create([
+            Acao(ticker=ticker, preco=Decimal(serie[-1]).scaleb(-2))
+            for ticker, serie in zip(nomes, series)
+        ], batch_size=tamanho_lote)
+        # bulk_create não devolve as chaves em todos os bancos
+        por_ticker = {acao.ticker: acao for acao in acoes_carga()}
+        acoes = [por_ticker[ticker] for ticker in nomes]
+        precos = {acao.pk: serie for acao, serie in zip(acoes, series)}
+
+        gravadas = grava_em_lotes(Movimentacao, (
+            movimentacao
+            for user_id in user_ids
+            for movimentacao in gera_ledger(
+                aleatorio, user_id, acoes, precos, movimentacoes, inicio, fim
+            )
+        ), tamanho_lote)
+
+        # Subconsulta, e não a lista, que pode passar do limite de parâmetros
+        gerados = usuarios_carga().values('pk')
+        _, carteiras = reconstroi_carteiras(tamanho_lote, user_ids=gerados)
+        resultados = reconstroi_resultados_mensais(user_ids=gerados)
+
+    return {
+        'usuarios': len(user_ids),
+        'acoes': len(acoes),
+        'movimentacoes': gravadas,
+        'carteiras': carteiras,
+        'resultados_mensais': resultados,
+    }
@@ -0,0 +1,72 @@
+"""
+Resumo da carteira do usuário para o dashboard: as posições são lidas em
+uma única consulta (com a ação) e os valores de cada linha, os totais e a
+alocação são calculados em uma passada, sem novas consultas
+"""
+from decimal import Decimal
+
+from acoes.models import Carteira
+
+
+CEM = Decimal(100)
+
+
+def percentual(valor, total):
+    """ valor / total em %, zero se o total for zero """
+    return valor / total * CEM if total else Decimal(0)
+
+
+class PosicaoCarteira:
+    """ Linha da carteira com valor atual, ganho/perda e alocação """
+    __slots__ = (
+        'acao', 'preco_medio', 'quantidade', 'valor_investido',
+        'valor_atual', 'lucro', 'percentual_lucro', 'alocacao',
+    )
+
+    def __init__(self, carteira):
+        self.acao = carteira.acao
+        self.preco_medio = carteira.preco_medio
+        self.quantidade = carteira.quantidade
+        self.valor_investido = carteira.valor_investido
+        self.valor_atual = carteira.acao.preco * carteira.quantidade
+        self.lucro = (carteira.acao.preco - carteira.preco_medio) * carteira.quantidade
+        self.percentual_lucro = percentual(self.lucro, self.valor_investido)
+        self.alocacao = Decimal(0)
+
+
+class ResumoCarteira:
+    """
+    posicoes na ordem da carteira (ticker), alocacao por valor atual
+    decrescente e totais (total_investido, total_atual, lucro,
+    percentual_lucro)
+    """
+
+    def __init__(self, carteiras):
+        self.posicoes = []
+        total_investido = total_atual = Decimal(0)
+        for carteira in carteiras:
+            posicao = PosicaoCarteira(carteira)
+            total_investido += posicao.valor_investido
+            total_atual += posicao.valor_atual
+            self.posicoes.append(posicao)
+
+        for posicao in self.posicoes:
+            posicao.alocacao = percentual(posicao.valor_atual, total_atual)
+        self.alocacao = sorted(
+            self.posicoes, key=lambda posicao: posicao.valor_atual, reverse=True
+        )
+        lucro = total_atual - total_investido
+        self.totais = {
+            'total_investido': total_investido,
+            'total_atual': total_atual,
+            'lucro': lucro,
+            'percentual_lucro': percentual(lucro, total_investido),
+        }
+
+    @classmethod
+    def do_usuario(cls, user_id):
+        return cls(
+            Carteira.objects.filter(user_id=user_id).select_related(
+                'acao'
+            ).order_by('acao__ticker')
+        )
@@ -0,0 +1,63 @@
+"""
+Leitura dos arquivos de séries históricas da B3 (COTAHIST_AAAA.TXT/.ZIP)
+Layout de posições fixas, um registro de 245 caracteres por linha
+"""
+import mmap
+import os
+import zipfile
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+
+TIPO_REGISTRO_COTACAO = b'01'
+MERCADO_A_VISTA = b'010'
+
+
+@contextmanager
+def abre_linhas(caminho):
+    """
+    Itera as linhas do arquivo sem carregá-lo em memória: arquivos .TXT são
+    mapeados com mmap e os .ZIP descompactados em streaming
+    Arquivo vazio (ou .ZIP sem arquivos) não tem linhas; o mmap não aceita
+    arquivos de tamanho zero
+    """
+    if zipfile.is_zipfile(caminho):
+        with zipfile.ZipFile(caminho) as arquivo_zip:
+            nomes = arquivo_zip.namelist()
+            if not nomes:
+                yield iter(())
+                return
+            with arquivo_zip.open(nomes[0]) as arquivo:
+                yield arquivo
+    else:
+        with open(caminho, 'rb') as arquivo:
+            if os.fstat(arquivo.fileno()).st_size == 0:
+                yield iter(())
+                return
+            with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                yield iter(mapa.readline, b'')
+
+
+def converte_data(valor):
+    """ AAAAMMDD -> date """
+    return date(int(valor[0:4]), int(valor[4:6]), int(valor[6:8]))
+
+
+def converte_preco(valor):
+    """ Preço com 2 casas decimais implícitas """
+    return Decimal(int(valor)).scaleb(-2)
+
+
+def le_cotacoes(linhas, tickers):
+    """
+    Gera (acao_id, data, preço de fechamento) das cotações do mercado à vista
+    tickers: dict ticker em bytes -> acao_id das ações que serão importadas
+    """
+    for linha in linhas:
+        if linha[0:2] != TIPO_REGISTRO_COTACAO or linha[24:27] != MERCADO_A_VISTA:
+            continue
+        acao_id = tickers.get(linha[12:24].rstrip())
+        if acao_id is None:
+            continue
+        yield acao_id, converte_data(linha[2:10]), converte_preco(linha[108:121])
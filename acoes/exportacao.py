@@ -0,0 +1,169 @@
+"""
+Exportação do histórico de movimentações do usuário em CSV ou XLSX, gerada
+em streaming: as linhas vêm do banco em tuplas (values_list + iterator) e
+cada pedaço do arquivo é devolvido assim que fica pronto, então a memória
+não cresce com o tamanho do histórico
+
+As primeiras colunas são as da importação (acoes.importacao), de modo que o
+CSV exportado pode ser importado de volta. O XLSX é montado com zipfile
+sobre um destino sem seek, sem dependências externas
+"""
+import csv
+import io
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+from acoes.importacao import COLUNAS
+from acoes.models import Movimentacao
+
+
+COLUNAS_EXPORTACAO = COLUNAS + (
+    'valor_total', 'preco_medio_venda', 'custo_venda', 'resultado',
+)
+TAMANHO_LOTE = 2000
+
+
+def linhas_movimentacoes(user_id, tamanho_lote=TAMANHO_LOTE):
+    """ Tuplas na ordem de COLUNAS_EXPORTACAO, em ordem do ledger """
+    return Movimentacao.objects.filter(user_id=user_id).order_by(
+        'data_movimentacao', 'id'
+    ).values_list(
+        'data_movimentacao', 'acao__ticker', 'tipo', 'quantidade', 'preco',
+        'valor_total', 'preco_medio_venda', 'custo_venda', 'resultado',
+    ).iterator(chunk_size=tamanho_lote)
+
+
+def gera_csv(linhas, tamanho_lote=TAMANHO_LOTE):
+    """ Pedaços do CSV (bytes UTF-8) com tamanho_lote linhas cada """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_EXPORTACAO)
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if numero % tamanho_lote == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class DestinoStreaming(io.RawIOBase):
+    """ Arquivo só de escrita, sem seek, cujo conteúdo é retirado aos pedaços """
+
+    def __init__(self):
+        self.pedacos = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def retira(self):
+        dados = b''.join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Movimentações" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 1: data (formato embutido 14)
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font/></fonts>'
+    '<fills count="1"><fill/></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="2"><xf/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+FIM_PLANILHA = '</sheetData></worksheet>'
+DATA_BASE_EXCEL = date(1899, 12, 30)
+
+
+def celula_xlsx(valor):
+    if isinstance(valor, date):
+        return f'<c s="1"><v>{(valor - DATA_BASE_EXCEL).days}</v></c>'
+    if isinstance(valor, str):
+        return f'<c t="inlineStr"><is><t>{escape(valor)}</t></is></c>'
+    return f'<c><v>{valor}</v></c>'
+
+
+def linha_xlsx(valores):
+    return '<row>' + ''.join(celula_xlsx(valor) for valor in valores) + '</row>'
+
+
+def gera_xlsx(linhas, tamanho_lote=TAMANHO_LOTE):
+    """ Pedaços do XLSX (bytes), a planilha comprimida à medida que é escrita """
+    destino = DestinoStreaming()
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        for nome, conteudo in (
+            ('[Content_Types].xml', CONTENT_TYPES),
+            ('_rels/.rels', RELS),
+            ('xl/workbook.xml', WORKBOOK),
+            ('xl/_rels/workbook.xml.rels', WORKBOOK_RELS),
+            ('xl/styles.xml', STYLES),
+        ):
+            arquivo.writestr(nome, conteudo)
+
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            pedaco = [INICIO_PLANILHA, linha_xlsx(COLUNAS_EXPORTACAO)]
+            for numero, linha in enumerate(linhas, 1):
+                pedaco.append(linha_xlsx(linha))
+                if numero % tamanho_lote == 0:
+                    planilha.write(''.join(pedaco).encode())
+                    pedaco = []
+                    yield destino.retira()
+            pedaco.append(FIM_PLANILHA)
+            planilha.write(''.join(pedaco).encode())
+    yield destino.retira()
+
+
+FORMATOS = {
+    'csv': (gera_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (
+        gera_xlsx,
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+}
@@ -1,8 +1,9 @@
 from django import forms
 
 from .models import Movimentacao, Acao
+from .paginacao import decodifica_cursor
 from .validations import (
-    valida_acao_existe_carteira, valida_quantidade_carteira
+    busca_carteira, valida_acao_existe_carteira, valida_quantidade_carteira
 )
 
 
@@ -53,6 +54,7 @@ class MovimentacaoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         """ Modifica classe para receber request com o user """
         self.request = kwargs.pop("request")
+        self.carteira = None
         super().__init__(*args, **kwargs)
 
     def clean(self):
@@ -63,9 +65,11 @@ class MovimentacaoForm(forms.ModelForm):
         usuario = self.request.user
         campos_com_erro = {}
 
-        if tipo == 'V':
-            valida_acao_existe_carteira(acao, usuario, campos_com_erro)
-            valida_quantidade_carteira(acao, usuario, quantidade, campos_com_erro)
+        if tipo == 'V' and acao is not None:
+            # Posição lida uma vez e reaproveitada pela view
+            self.carteira = busca_carteira(acao, usuario)
+            valida_acao_existe_carteira(self.carteira, campos_com_erro)
+            valida_quantidade_carteira(self.carteira, quantidade, campos_com_erro)
         if campos_com_erro:
             for campo, mensagem in campos_com_erro.items():
                 self.add_error(campo, mensagem)
@@ -109,4 +113,75 @@ class AcaoForm(forms.ModelForm):
 
     class Meta:
         model = Acao
-        exclude = ['data_hora_atualizacao',]
\ No newline at end of file
+        exclude = ['data_hora_atualizacao',]
+
+class ImportacaoMovimentacoesForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo CSV',
+        required=True,
+        help_text='Colunas: data, ticker, tipo (C/V), quantidade, preco',
+        widget=forms.ClearableFileInput(attrs={
+            'class': "form-control",
+            'accept': ".csv",
+        })
+    )
+
+
+class FiltroMovimentacoesForm(forms.Form):
+    ticker = forms.CharField(
+        label='Ticker',
+        required=False,
+        max_length=5,
+        widget=forms.TextInput(attrs={
+            'class': "form-control",
+            'style' : "text-transform:uppercase"
+        })
+    )
+    tipo = forms.ChoiceField(
+        label='Tipo',
+        required=False,
+        choices=(('', 'Todos'),) + Movimentacao.TIPO_MOVIMENTACAO,
+        widget=forms.Select(attrs={
+            'class': "form-control"
+        })
+    )
+    inicio = forms.DateField(
+        label='De',
+        required=False,
+        widget=forms.DateInput(attrs={
+            'class': "form-control",
+            'type': "date"
+        })
+    )
+    fim = forms.DateField(
+        label='Até',
+        required=False,
+        widget=forms.DateInput(attrs={
+            'class': "form-control",
+            'type': "date"
+        })
+    )
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_cursor(self):
+        """ Posição (data, id) da última movimentação da página anterior """
+        cursor = self.cleaned_data.get('cursor')
+        if not cursor:
+            return None
+        try:
+            return decodifica_cursor(cursor)
+        except ValueError:
+            raise forms.ValidationError("Cursor inválido")
+
+    def filtra(self, movimentacoes):
+        """ Aplica os filtros informados """
+        dados = self.cleaned_data
+        if dados.get('ticker'):
+            movimentacoes = movimentacoes.filter(acao__ticker=dados['ticker'].upper())
+        if dados.get('tipo'):
+            movimentacoes = movimentacoes.filter(tipo=dados['tipo'])
+        if dados.get('inicio'):
+            movimentacoes = movimentacoes.filter(data_movimentacao__gte=dados['inicio'])
+        if dados.get('fim'):
+            movimentacoes = movimentacoes.filter(data_movimentacao__lte=dados['fim'])
+        return movimentacoes
@@ -0,0 +1,167 @@
+"""
+Importação em lote de movimentações a partir de CSV (planilha própria ou
+extrato de corretora). O arquivo é lido em streaming e validado em lotes;
+as movimentações são gravadas com bulk_create, sem os signals, e cada
+posição (usuário, ação) afetada é reprocessada uma única vez no final
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from acoes.models import Acao, Movimentacao
+from acoes.posicao import PosicaoInsuficiente, reprocessa_posicao
+from acoes.resultados import reconstroi_resultados_mensais
+
+
+COLUNAS = ('data', 'ticker', 'tipo', 'quantidade', 'preco')
+TIPOS = {'C': 'C', 'COMPRA': 'C', 'V': 'V', 'VENDA': 'V'}
+FORMATOS_DATA = ('%Y-%m-%d', '%d/%m/%Y')
+VALOR_MAXIMO = Decimal('999999.99')
+MAXIMO_ERROS = 20
+
+
+class ErroImportacao(Exception):
+    """ Arquivo inválido; nenhuma movimentação é gravada """
+
+    def __init__(self, erros):
+        self.erros = erros
+        super().__init__('\n'.join(erros))
+
+
+def le_csv(arquivo):
+    """
+    Gera (número da linha, campos na ordem de COLUNAS) a partir de um
+    arquivo texto com cabeçalho, separado por ',' ou ';'
+    """
+    cabecalho = arquivo.readline()
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = [
+        coluna.strip().lower()
+        for coluna in next(csv.reader([cabecalho], delimiter=delimitador), [])
+    ]
+    ausentes = [coluna for coluna in COLUNAS if coluna not in colunas]
+    if ausentes:
+        raise ErroImportacao([
+            f"Colunas ausentes no cabeçalho: {', '.join(ausentes)}"
+        ])
+
+    indices = [colunas.index(coluna) for coluna in COLUNAS]
+    for numero, linha in enumerate(csv.reader(arquivo, delimiter=delimitador), 2):
+        if not any(linha):
+            continue
+        yield numero, [
+            linha[indice].strip() if indice < len(linha) else ''
+            for indice in indices
+        ]
+
+
+def converte_data(valor):
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {valor!r}")
+
+
+def converte_decimal(valor):
+    """ Aceita 1234.56 e 1.234,56 """
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(valor).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"Preço inválido: {valor!r}")
+
+
+def converte_linha(campos, acoes_por_ticker, user_id):
+    """ Valida os campos da linha e monta a movimentação """
+    data, ticker, tipo, quantidade, preco = campos
+    acao_id = acoes_por_ticker.get(ticker.upper())
+    if acao_id is None:
+        raise ValueError(f"Ação não cadastrada: {ticker!r}")
+    if tipo.upper() not in TIPOS:
+        raise ValueError(f"Tipo inválido: {tipo!r}")
+    try:
+        quantidade = int(quantidade)
+    except ValueError:
+        raise ValueError(f"Quantidade inválida: {quantidade!r}")
+    if quantidade < 1:
+        raise ValueError("Quantidade deve ser maior que zero")
+    preco = converte_decimal(preco)
+    if preco < Decimal('0.01'):
+        raise ValueError("Preço deve ser maior que zero")
+    valor_total = preco * quantidade
+    if valor_total > VALOR_MAXIMO:
+        raise ValueError(f"Valor total acima de {VALOR_MAXIMO}")
+
+    return Movimentacao(
+        user_id=user_id,
+        acao_id=acao_id,
+        data_movimentacao=converte_data(data),
+        tipo=TIPOS[tipo.upper()],
+        quantidade=quantidade,
+        preco=preco,
+        valor_total=valor_total,
+    )
+
+
+def importa_movimentacoes(arquivo, user, tamanho_lote=5000):
+    """
+    Importa as movimentações do usuário; tudo ou nada
+    Retorna (movimentações importadas, posições reprocessadas)
+    """
+    acoes_por_ticker = {}
+    inicio_por_acao = {}
+    erros = []
+    importadas = 0
+    linhas = le_csv(arquivo)
+
+    with transaction.atomic():
+        while len(erros) < MAXIMO_ERROS:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+
+            novos = {campos[1].upper() for _, campos in lote} - acoes_por_ticker.keys()
+            if novos:
+                acoes_por_ticker.update(dict.fromkeys(novos))
+                acoes_por_ticker.update(
+                    Acao.objects.filter(ticker__in=novos).values_list('ticker', 'pk')
+                )
+
+            movimentacoes = []
+            for numero, campos in lote:
+                try:
+                    movimentacao = converte_linha(campos, acoes_por_ticker, user.pk)
+                except ValueError as erro:
+                    erros.append(f"Linha {numero}: {erro}")
+                    continue
+                movimentacoes.append(movimentacao)
+                inicio = inicio_por_acao.get(movimentacao.acao_id)
+                if inicio is None or movimentacao.data_movimentacao < inicio:
+                    inicio_por_acao[movimentacao.acao_id] = movimentacao.data_movimentacao
+
+            if not erros:
+                Movimentacao.objects.bulk_create(movimentacoes, batch_size=tamanho_lote)
+                importadas += len(movimentacoes)
+
+        if erros:
+            raise ErroImportacao(erros[:MAXIMO_ERROS])
+
+        tickers_por_id = {pk: ticker for ticker, pk in acoes_por_ticker.items()}
+        for acao_id, inicio in inicio_por_acao.items():
+            try:
+                reprocessa_posicao(
+                    user.pk, acao_id, inicio, estrito=True,
+                    atualiza_resultados=False
+                )
+            except PosicaoInsuficiente as erro:
+                raise ErroImportacao([f"{tickers_por_id[acao_id]}: {erro}"])
+        if inicio_por_acao:
+            reconstroi_resultados_mensais(user.pk)
+
+    return importadas, len(inicio_por_acao)
@@ -0,0 +1,124 @@
+import random
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from acoes.benchmark import Cronometro, por_segundo, salva_resultados
+from acoes.posicao import (
+    Posicao, RegistroMovimentacao, aplica_decimal, centavos, decimal
+)
+
+
+ZERO = Decimal('0.00')
+
+
+def gera_movimentacoes(total, posicoes, semente):
+    """
+    Movimentações sintéticas agrupadas por posição, sem vender além do que
+    se tem: lista de (posição, tipo, quantidade, valor_total)
+    """
+    aleatorio = random.Random(semente)
+    por_posicao = total // posicoes
+    movimentacoes = []
+    for posicao in range(posicoes):
+        quantidade_atual = 0
+        for _ in range(por_posicao):
+            preco = Decimal(aleatorio.randint(100, 10000)).scaleb(-2)
+            if quantidade_atual and aleatorio.random() < 0.4:
+                quantidade = aleatorio.randint(1, quantidade_atual)
+                tipo = 'V'
+                quantidade_atual -= quantidade
+            else:
+                quantidade = aleatorio.randint(1, 1000)
+                tipo = 'C'
+                quantidade_atual += quantidade
+            movimentacoes.append((posicao, tipo, quantidade, preco * quantidade))
+    return movimentacoes
+
+
+def calcula_decimal(movimentacoes):
+    """ Uma carteira (modelo, Decimal) por posição, como no fluxo original """
+    carteira, atual, resultados = None, None, []
+    for posicao, tipo, quantidade, valor_total in movimentacoes:
+        if posicao != atual:
+            carteira, atual = None, posicao
+        carteira = aplica_decimal(carteira, tipo, quantidade, valor_total)
+        resultados.append(
+            (carteira.quantidade, carteira.valor_investido, carteira.preco_medio)
+            if carteira else (0, ZERO, ZERO)
+        )
+    return resultados
+
+
+def calcula_centavos(registros):
+    """ Posição em centavos sobre registros com __slots__ """
+    estado, atual, resultados = None, None, []
+    for posicao, registro in registros:
+        if posicao != atual:
+            estado, atual = Posicao(), posicao
+        estado.aplica(registro)
+        resultados.append(
+            (estado.quantidade, estado.valor_investido, estado.preco_medio)
+        )
+    return resultados
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o cálculo de posição em Decimal (Carteira) com o cálculo em '
+        'centavos inteiros, conferindo que os resultados são iguais'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movimentacoes', type=int, default=1000000)
+        parser.add_argument('--posicoes', type=int, default=1000)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        movimentacoes = gera_movimentacoes(
+            options['movimentacoes'], options['posicoes'], options['semente']
+        )
+        # Os registros chegam em centavos do banco (campos_registro)
+        hoje = date.today()
+        registros = [
+            (posicao, RegistroMovimentacao(
+                0, hoje, tipo, quantidade, centavos(valor_total), 0, 0, 0, 0, 0, 0
+            ))
+            for posicao, tipo, quantidade, valor_total in movimentacoes
+        ]
+        resultados = []
+        calculados = {}
+        for nome, calcula, entrada in (
+            ('decimal', calcula_decimal, movimentacoes),
+            ('centavos', calcula_centavos, registros),
+        ):
+            with Cronometro() as cronometro:
+                calculados[nome] = calcula(entrada)
+            resultados.append({
+                'calculadora': nome,
+                'movimentacoes': len(movimentacoes),
+                'segundos': round(cronometro.segundos, 3),
+                'movimentacoes_por_segundo': round(
+                    por_segundo(len(movimentacoes), cronometro.segundos)
+                ),
+            })
+            self.stdout.write(
+                f"{nome:>8}: {len(movimentacoes)} movimentações em "
+                f"{cronometro.segundos:.2f}s "
+                f"({resultados[-1]['movimentacoes_por_segundo']}/s)"
+            )
+
+        for indice, (referencia, (quantidade, investido, preco_medio)) in enumerate(
+            zip(calculados['decimal'], calculados['centavos'])
+        ):
+            if referencia != (quantidade, decimal(investido), decimal(preco_medio)):
+                raise CommandError(
+                    f"Divergência na movimentação {indice}: {referencia} != "
+                    f"{(quantidade, decimal(investido), decimal(preco_medio))}"
+                )
+        self.stdout.write('Resultados idênticos com 2 casas decimais')
+
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
@@ -0,0 +1,102 @@
+import random
+import statistics
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from acoes.benchmark import Cronometro, salva_resultados
+from acoes.carteira import ResumoCarteira
+from acoes.models import Acao, Carteira
+from acoes.views import dashboard
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede consultas e latência do resumo da carteira e da página do '
+        'dashboard, sem e com cache, para um usuário com muitas posições; '
+        'os dados gerados são descartados e o cache é limpo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posicoes', type=int, default=500)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def gera_carteira(self, user, total, semente):
+        aleatorio = random.Random(semente)
+        tickers = [f'D{i:04d}' for i in range(total)]
+        Acao.objects.bulk_create([
+            Acao(
+                ticker=ticker,
+                preco=Decimal(aleatorio.randint(100, 10000)).scaleb(-2)
+            )
+            for ticker in tickers
+        ])
+        carteiras = []
+        for acao in Acao.objects.filter(ticker__in=tickers):
+            quantidade = aleatorio.randint(1, 1000)
+            preco_medio = Decimal(aleatorio.randint(100, 10000)).scaleb(-2)
+            carteiras.append(Carteira(
+                user=user, acao=acao, quantidade=quantidade,
+                preco_medio=preco_medio, valor_investido=preco_medio * quantidade,
+            ))
+        Carteira.objects.bulk_create(carteiras)
+
+    def mede(self, nome, funcao, repeticoes, prepara=None):
+        tempos = []
+        for _ in range(repeticoes):
+            if prepara is not None:
+                prepara()
+            with CaptureQueriesContext(connection) as consultas, Cronometro() as cronometro:
+                funcao()
+            tempos.append(cronometro.segundos * 1000)
+        return {
+            'medida': nome,
+            'consultas': len(consultas),
+            'ms_p50': round(statistics.median(tempos), 2),
+            'ms_max': round(max(tempos), 2),
+        }
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark_dashboard@teste.com', password='benchmark'
+            )
+            self.gera_carteira(user, options['posicoes'], options['semente'])
+
+            request = RequestFactory().get('/')
+            request.user = user
+            resultados = [
+                self.mede(
+                    'resumo', lambda: ResumoCarteira.do_usuario(user.pk),
+                    options['repeticoes']
+                ),
+                self.mede(
+                    'pagina', lambda: dashboard(request), options['repeticoes'],
+                    prepara=cache.clear
+                ),
+                # Fragmentos em cache, gravados na última execução acima
+                self.mede(
+                    'pagina_cache', lambda: dashboard(request),
+                    options['repeticoes']
+                ),
+            ]
+            cache.clear()
+
+            transaction.set_rollback(True)
+
+        for resultado in resultados:
+            resultado['posicoes'] = options['posicoes']
+            self.stdout.write(
+                f"{resultado['medida']}: {resultado['posicoes']} posições, "
+                f"{resultado['consultas']} consulta(s), "
+                f"p50 {resultado['ms_p50']:.2f} ms, máx {resultado['ms_max']:.2f} ms"
+            )
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
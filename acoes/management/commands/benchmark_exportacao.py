@@ -0,0 +1,102 @@
+import random
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from acoes.benchmark import Cronometro, por_segundo, salva_resultados
+from acoes.exportacao import FORMATOS, linhas_movimentacoes
+from acoes.models import Acao, Movimentacao
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede tempo e pico de memória da exportação em streaming para '
+        'históricos de tamanhos crescentes; os dados gerados são descartados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas', type=int, nargs='+', default=[100000, 1000000]
+        )
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def gera_movimentacoes(self, user, acoes, total, aleatorio):
+        """ Movimentações sintéticas gravadas em lotes, sem os signals """
+        inicio = date(2000, 1, 1)
+        movimentacoes = (
+            Movimentacao(
+                user=user, acao=aleatorio.choice(acoes),
+                tipo=aleatorio.choice('CV'), quantidade=quantidade,
+                data_movimentacao=inicio + timedelta(days=aleatorio.randint(0, 8000)),
+                preco=preco, valor_total=preco * quantidade,
+            )
+            for quantidade, preco in (
+                (aleatorio.randint(1, 500), Decimal(aleatorio.randint(100, 5000)).scaleb(-2))
+                for _ in range(total)
+            )
+        )
+        while True:
+            lote = list(islice(movimentacoes, 5000))
+            if not lote:
+                break
+            Movimentacao.objects.bulk_create(lote)
+
+    def exporta(self, user_id, formato):
+        """ Consome a exportação como o StreamingHttpResponse; retorna bytes """
+        gera, _ = FORMATOS[formato]
+        return sum(len(pedaco) for pedaco in gera(linhas_movimentacoes(user_id)))
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+        resultados = []
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark_exportacao@teste.com', password='benchmark'
+            )
+            tickers = [f'BE{i:03d}'[:5] for i in range(options['tickers'])]
+            Acao.objects.bulk_create([
+                Acao(ticker=ticker, preco=10) for ticker in tickers
+            ])
+            acoes = list(Acao.objects.filter(ticker__in=tickers))
+
+            gravadas = 0
+            for linhas in sorted(options['linhas']):
+                self.gera_movimentacoes(user, acoes, linhas - gravadas, aleatorio)
+                gravadas = linhas
+                for formato in FORMATOS:
+                    with Cronometro() as cronometro:
+                        tamanho = self.exporta(user.pk, formato)
+                    # Segunda passada só para o pico de memória, que o
+                    # tracemalloc deixaria mais lenta
+                    tracemalloc.start()
+                    self.exporta(user.pk, formato)
+                    _, pico = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    resultado = {
+                        'formato': formato,
+                        'linhas': linhas,
+                        'segundos': round(cronometro.segundos, 2),
+                        'linhas_por_segundo': round(por_segundo(linhas, cronometro.segundos)),
+                        'mb_arquivo': round(tamanho / 2 ** 20, 1),
+                        'mb_pico_memoria': round(pico / 2 ** 20, 2),
+                    }
+                    resultados.append(resultado)
+                    self.stdout.write(
+                        f"{formato}: {linhas} linhas em {resultado['segundos']:.2f}s "
+                        f"({resultado['linhas_por_segundo']}/s), "
+                        f"{resultado['mb_arquivo']} MB, "
+                        f"pico de memória {resultado['mb_pico_memoria']} MB"
+                    )
+
+            transaction.set_rollback(True)
+
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
@@ -0,0 +1,86 @@
+import random
+import statistics
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from acoes.benchmark import Cronometro, salva_resultados
+from acoes.models import Acao, Movimentacao
+from acoes.resultados import reconstroi_resultados_mensais
+from acoes.views import lucro_prejuizo_mes_chart
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede consultas e latência do gráfico de lucro/prejuízo mensal para '
+        'um usuário com muitas vendas; os dados gerados são descartados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendas', type=int, default=50000)
+        parser.add_argument('--ano', type=int, default=date.today().year)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def gera_vendas(self, user, acao, total, ano, semente):
+        """ Vendas distribuídas no ano, com lucro e prejuízo """
+        aleatorio = random.Random(semente)
+        inicio = date(ano, 1, 1)
+        vendas = []
+        for _ in range(total):
+            quantidade = aleatorio.randint(1, 500)
+            preco = Decimal(aleatorio.randint(100, 5000)).scaleb(-2)
+            preco_medio_venda = Decimal(aleatorio.randint(100, 5000)).scaleb(-2)
+            vendas.append(Movimentacao(
+                user=user, acao=acao, tipo='V',
+                data_movimentacao=inicio + timedelta(days=aleatorio.randint(0, 364)),
+                quantidade=quantidade, preco=preco, valor_total=preco * quantidade,
+                preco_medio_venda=preco_medio_venda,
+                custo_venda=preco_medio_venda * quantidade,
+                resultado=(preco - preco_medio_venda) * quantidade,
+            ))
+        Movimentacao.objects.bulk_create(vendas, batch_size=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark_grafico@teste.com', password='benchmark'
+            )
+            acao = Acao.objects.create(ticker='BGRF3', preco=10)
+            self.gera_vendas(
+                user, acao, options['vendas'], options['ano'], options['semente']
+            )
+            # Agregação das vendas pelo resultado gravado em cada uma
+            with Cronometro() as agregacao:
+                reconstroi_resultados_mensais(user.pk)
+
+            request = RequestFactory().get('/', {'ano': options['ano']})
+            request.user = user
+            tempos = []
+            for _ in range(options['repeticoes']):
+                with CaptureQueriesContext(connection) as consultas, Cronometro() as cronometro:
+                    lucro_prejuizo_mes_chart(request)
+                tempos.append(cronometro.segundos * 1000)
+
+            transaction.set_rollback(True)
+
+        resultado = {
+            'vendas': options['vendas'],
+            'consultas': len(consultas),
+            'ms_agregacao': round(agregacao.segundos * 1000, 2),
+            'ms_p50': round(statistics.median(tempos), 2),
+            'ms_max': round(max(tempos), 2),
+        }
+        self.stdout.write(
+            f"{resultado['vendas']} vendas: {resultado['consultas']} consulta(s), "
+            f"p50 {resultado['ms_p50']:.2f} ms, máx {resultado['ms_max']:.2f} ms "
+            f"(agregação das vendas {resultado['ms_agregacao']:.2f} ms)"
+        )
+        if options['saida']:
+            salva_resultados([resultado], options['saida'])
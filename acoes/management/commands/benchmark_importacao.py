@@ -0,0 +1,82 @@
+import csv
+import random
+import tempfile
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from acoes.benchmark import Cronometro, por_segundo, salva_resultados
+from acoes.importacao import importa_movimentacoes
+from acoes.models import Acao
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a importação de um CSV sintético de movimentações; os dados '
+        'gravados são descartados ao final'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=100000)
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def gera_csv(self, arquivo, linhas, tickers, semente):
+        """ Compras e vendas em datas crescentes, sem vender além da posição """
+        aleatorio = random.Random(semente)
+        posicoes = dict.fromkeys(tickers, 0)
+        escritor = csv.writer(arquivo)
+        escritor.writerow(['data', 'ticker', 'tipo', 'quantidade', 'preco'])
+        inicio = date(2010, 1, 1)
+        for i in range(linhas):
+            ticker = aleatorio.choice(tickers)
+            data = inicio + timedelta(days=i * 4000 // linhas)
+            preco = f"{aleatorio.uniform(1, 100):.2f}"
+            if posicoes[ticker] >= 100 and aleatorio.random() < 0.3:
+                quantidade = aleatorio.randint(1, posicoes[ticker] // 2)
+                posicoes[ticker] -= quantidade
+                escritor.writerow([data, ticker, 'V', quantidade, preco])
+            else:
+                quantidade = aleatorio.randint(1, 50) * 10
+                posicoes[ticker] += quantidade
+                escritor.writerow([data, ticker, 'C', quantidade, preco])
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark_importacao@teste.com', password='benchmark'
+            )
+            tickers = [f'BI{i:03d}'[:5] for i in range(options['tickers'])]
+            Acao.objects.bulk_create([
+                Acao(ticker=ticker, preco=10) for ticker in tickers
+            ])
+
+            with tempfile.TemporaryFile('w+', newline='') as arquivo:
+                self.gera_csv(
+                    arquivo, options['linhas'], tickers, options['semente']
+                )
+                arquivo.seek(0)
+                with Cronometro() as cronometro:
+                    importadas, posicoes = importa_movimentacoes(
+                        arquivo, user, options['lote']
+                    )
+
+            transaction.set_rollback(True)
+
+        resultado = {
+            'linhas': importadas,
+            'posicoes': posicoes,
+            'lote': options['lote'],
+            'segundos': round(cronometro.segundos, 3),
+            'linhas_por_segundo': round(por_segundo(importadas, cronometro.segundos)),
+        }
+        self.stdout.write(
+            f"{importadas} linhas, {posicoes} posições em "
+            f"{cronometro.segundos:.2f}s ({resultado['linhas_por_segundo']} linhas/s)"
+        )
+        if options['saida']:
+            salva_resultados([resultado], options['saida'])
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from acoes.benchmark import Cronometro, salva_resultados
+from acoes.scraper import ElementoNaoEncontrado
+from acoes.scraper.parser import PARSERS
+from acoes.scraper.servidor_local import DIRETORIO_PAGINAS
+
+
+class Command(BaseCommand):
+    help = 'Mede o custo de extração do preço por página para cada parser'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--diretorio', default=DIRETORIO_PAGINAS,
+            help='Diretório com páginas do fundamentus salvas (*.html)'
+        )
+        parser.add_argument('--repeticoes', type=int, default=2000)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        paginas = [
+            arquivo.read_text('latin-1')
+            for arquivo in sorted(Path(options['diretorio']).glob('*.html'))
+        ]
+        if not paginas:
+            raise CommandError(
+                f"Nenhuma página *.html em {options['diretorio']}"
+            )
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser pelo menos 1')
+        total = len(paginas) * options['repeticoes']
+        resultados = []
+        for nome, extrai in PARSERS.items():
+            with Cronometro() as cronometro:
+                for _ in range(options['repeticoes']):
+                    for html in paginas:
+                        try:
+                            extrai(html)
+                        except ElementoNaoEncontrado:
+                            pass
+            microssegundos = cronometro.segundos / total * 1e6
+            resultados.append({
+                'parser': nome,
+                'paginas': total,
+                'us_por_pagina': round(microssegundos, 2),
+            })
+            self.stdout.write(
+                f"{nome:>6}: {microssegundos:.2f} µs/página ({total} páginas)"
+            )
+
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+
+from acoes.benchmark import Cronometro, por_segundo, salva_resultados
+from acoes.scraper import HttpBackend, SeleniumBackend
+from acoes.scraper.drivers import DriverPool
+from acoes.scraper.servidor_local import inicia_servidor
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede tickers por segundo dos backends do scraper contra o servidor '
+        'local de páginas gravadas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=300)
+        parser.add_argument(
+            '--concorrencia', type=int, nargs='+', default=[1, 4, 8, 16]
+        )
+        parser.add_argument(
+            '--latencia', type=float, default=0.05,
+            help='Latência simulada por página em segundos'
+        )
+        parser.add_argument(
+            '--selenium', action='store_true',
+            help='Inclui o loop sequencial com o Firefox headless'
+        )
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        tickers = [f'T{i:03d}3' for i in range(options['tickers'])]
+        servidor = inicia_servidor(latencia=options['latencia'], sintetico=True)
+        resultados = []
+        try:
+            for concorrencia in options['concorrencia']:
+                backend = HttpBackend(
+                    concorrencia=concorrencia, url_base=servidor.url_base
+                )
+                resultados.append(
+                    self.mede(f'http x{concorrencia}', backend, tickers)
+                )
+            if options['selenium']:
+                pool = DriverPool()
+                backend = SeleniumBackend(url_base=servidor.url_base, pool=pool)
+                try:
+                    # Primeira execução inclui a inicialização do navegador
+                    resultados.append(self.mede('selenium frio', backend, tickers))
+                    resultados.append(self.mede('selenium pool', backend, tickers))
+                finally:
+                    pool.encerra()
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
+
+    def mede(self, nome, backend, tickers):
+        with backend, Cronometro() as cronometro:
+            precos = backend.busca_precos(tickers)
+        falhas = sum(isinstance(p, Exception) for p in precos.values())
+        resultado = {
+            'backend': nome,
+            'tickers': len(tickers),
+            'falhas': falhas,
+            'segundos': round(cronometro.segundos, 3),
+            'tickers_por_segundo': round(
+                por_segundo(len(tickers), cronometro.segundos), 1
+            ),
+        }
+        self.stdout.write(
+            f"{nome:>14}: {resultado['tickers_por_segundo']} tickers/s "
+            f"({resultado['segundos']}s, {falhas} falhas)"
+        )
+        return resultado
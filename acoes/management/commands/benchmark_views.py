@@ -0,0 +1,194 @@
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from acoes.benchmark import mede, salva_resultados
+from acoes.cache import chave_usuario, grava_estatisticas, versao_precos
+from acoes.carga import (
+    email_carga, gera_dados_carga, remove_dados_carga, usuarios_carga
+)
+from acoes.models import Movimentacao
+from acoes.views.dashboard import FRAGMENTOS_DASHBOARD, periodo_grafico
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência (p50/p95) e consultas das views de acoes, com '
+        'middlewares e templates, sobre bases de carga de tamanhos '
+        'crescentes; os dados gerados e as chaves de cache do usuário '
+        'medido são descartados. '
+        'Com --orcamento falha se algum limite for ultrapassado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--movimentacoes', type=int, nargs='+', default=[100, 1000, 5000],
+            help='Movimentações por usuário de cada base'
+        )
+        parser.add_argument('--usuarios', type=int, default=10)
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument('--anos', type=int, default=5)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+        parser.add_argument(
+            '--orcamento',
+            help=(
+                'Arquivo JSON {medida: {"consultas": n, "ms_p95": ms, ...}} '
+                'com os limites aplicados a todas as bases'
+            )
+        )
+
+    def requisicao(self, metodo, nome, dados=None):
+        """
+        Função que executa a requisição (dados pode ser uma função que gera
+        os dados de cada execução) e confere o status, que invalidaria a medida
+        """
+        def executa():
+            response = metodo(reverse(nome), dados() if callable(dados) else dados)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{nome} respondeu {response.status_code}: '
+                    f'{response.content[:200]!r}'
+                )
+        return executa
+
+    def esvazia_cache(self, user):
+        """
+        Fragmentos do usuário fora do cache, como após uma movimentação:
+        incrementa a versão da carteira, sem limpar o cache do site
+        """
+        def esvazia():
+            get_user_model().objects.filter(pk=user.pk).update(
+                versao_carteira=F('versao_carteira') + 1
+            )
+        return esvazia
+
+    def remove_chaves(self, user, versoes, versao, ano):
+        """ Apaga as chaves de cache que as medidas geraram para o usuário """
+        inicio, fim, _ = periodo_grafico({'ano': ano})
+        chaves = []
+        for versao_carteira in versoes:
+            user.versao_carteira = versao_carteira
+            chaves.append(chave_usuario('grafico', user, inicio, fim, True))
+            chaves.extend(
+                chave_usuario(nome, user, versao) for nome in FRAGMENTOS_DASHBOARD
+            )
+        cache.delete_many(chaves)
+
+    def mede_views(self, client, user, fim, repeticoes):
+        """ Leituras primeiro, com o cache vazio; depois as gravações """
+        # Contadores do cache gravados antes, fora das medições
+        grava_estatisticas()
+        # Ação com o maior histórico do usuário
+        acao = Movimentacao.objects.filter(user=user).values('acao_id').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        movimentacao = {
+            'acao': acao['acao_id'], 'data_movimentacao': fim.isoformat(),
+            'preco': '10.00',
+        }
+        tickers = (f'BV{i:03d}' for i in range(repeticoes))
+        medidas = [
+            ('dashboard', self.requisicao(client.get, 'dashboard'),
+             self.esvazia_cache(user)),
+            ('dashboard_cache', self.requisicao(client.get, 'dashboard'), None),
+            ('lucro_prejuizo_mes_chart', self.requisicao(
+                client.get, 'lucro_prejuizo_mes_chart', {'ano': fim.year}
+            ), self.esvazia_cache(user)),
+            ('movimentacoes', self.requisicao(client.get, 'movimentacoes'), None),
+            ('cria_movimentacao_compra', self.requisicao(
+                client.post, 'cria_movimentacao',
+                dict(movimentacao, tipo='C', quantidade=100)
+            ), None),
+            # Posição garantida pelas compras acima
+            ('cria_movimentacao_venda', self.requisicao(
+                client.post, 'cria_movimentacao',
+                dict(movimentacao, tipo='V', quantidade=1)
+            ), None),
+            ('cria_acao', self.requisicao(
+                client.post, 'cria_acao',
+                lambda: {'ticker': next(tickers), 'preco': '10.00'}
+            ), None),
+        ]
+        return [
+            dict(mede(funcao, repeticoes, prepara), medida=nome)
+            for nome, funcao, prepara in medidas
+        ]
+
+    def verifica_orcamento(self, resultados, arquivo):
+        with open(arquivo) as entrada:
+            orcamento = json.load(entrada)
+        chaves = {'consultas', 'ms_p50', 'ms_p95', 'ms_max'}
+        for medida, limites in orcamento.items():
+            if not set(limites) <= chaves:
+                raise CommandError(
+                    f'{medida}: limites devem ser de {", ".join(sorted(chaves))}'
+                )
+        violacoes = [
+            f"{resultado['medida']} ({resultado['movimentacoes_por_usuario']} "
+            f"movimentações por usuário): {chave} {resultado[chave]} > {limite}"
+            for resultado in resultados
+            for chave, limite in orcamento.get(resultado['medida'], {}).items()
+            if resultado[chave] > limite
+        ]
+        if violacoes:
+            raise CommandError(
+                'Orçamento ultrapassado:\n' + '\n'.join(violacoes)
+            )
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] > 1000:
+            raise CommandError('Use no máximo 1000 repetições')
+        fim = date.today()
+        resultados = []
+        # O Client usa o host testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for movimentacoes in sorted(options['movimentacoes']):
+                with transaction.atomic():
+                    remove_dados_carga()
+                    gerados = gera_dados_carga(
+                        usuarios=options['usuarios'],
+                        tickers=options['tickers'],
+                        movimentacoes=movimentacoes,
+                        anos=options['anos'],
+                        fim=fim,
+                        semente=options['semente'],
+                    )
+                    user = usuarios_carga().get(email=email_carga(0))
+                    # Os preços só mudam no cadastro de ações, depois das leituras
+                    versao = versao_precos()
+                    client = Client()
+                    client.force_login(user)
+                    for resultado in self.mede_views(
+                        client, user, fim, options['repeticoes']
+                    ):
+                        resultado['movimentacoes_por_usuario'] = movimentacoes
+                        resultado['movimentacoes_total'] = gerados['movimentacoes']
+                        resultados.append(resultado)
+                        self.stdout.write(
+                            f"{resultado['medida']}: {movimentacoes} movimentações "
+                            f"por usuário, {resultado['consultas']} consulta(s), "
+                            f"p50 {resultado['ms_p50']:.2f} ms, "
+                            f"p95 {resultado['ms_p95']:.2f} ms"
+                        )
+                    versao_inicial = user.versao_carteira
+                    user.refresh_from_db()
+                    self.remove_chaves(
+                        user,
+                        range(versao_inicial, user.versao_carteira + 1),
+                        versao, fim.year
+                    )
+                    transaction.set_rollback(True)
+
+        if options['saida']:
+            salva_resultados(resultados, options['saida'])
+        if options['orcamento']:
+            self.verifica_orcamento(resultados, options['orcamento'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from acoes.cache import INTERVALO_GRAVACAO, estatisticas, zera_estatisticas
+
+
+class Command(BaseCommand):
+    help = (
+        'Acertos e falhas do cache do dashboard por fragmento, somados de '
+        'todos os processos (cada processo grava os seus a cada '
+        f'{INTERVALO_GRAVACAO}s)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--zera', action='store_true', help='Zera os contadores após exibir'
+        )
+
+    def handle(self, *args, **options):
+        for nome, contadores in estatisticas().items():
+            self.stdout.write(
+                f"{nome}: {contadores['hits']} acertos, "
+                f"{contadores['misses']} falhas "
+                f"({contadores['taxa_acerto']:.1%})"
+            )
+        if options['zera']:
+            zera_estatisticas()
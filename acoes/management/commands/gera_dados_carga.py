@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from acoes.benchmark import Cronometro, por_segundo
+from acoes.carga import DOMINIO, gera_dados_carga, remove_dados_carga, usuarios_carga
+
+
+def converte_data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Data inválida: {valor} (use AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera usuários, ações e históricos de movimentações sintéticos, com '
+        'carteiras e resultados mensais consistentes, para testes de carga; '
+        f'os usuários gerados têm e-mail em @{DOMINIO}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=100)
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument(
+            '--movimentacoes', type=int, default=200,
+            help='Movimentações por usuário'
+        )
+        parser.add_argument('--anos', type=int, default=5)
+        parser.add_argument(
+            '--fim', type=converte_data,
+            help='Data da última movimentação possível (AAAA-MM-DD, padrão hoje)'
+        )
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument(
+            '--senha', default='carga', help='Senha de todos os usuários gerados'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Registros gravados por lote'
+        )
+        parser.add_argument(
+            '--limpa', action='store_true',
+            help='Remove antes os dados de carga de uma geração anterior'
+        )
+
+    def handle(self, *args, **options):
+        if options['limpa']:
+            remove_dados_carga()
+        elif usuarios_carga().exists():
+            raise CommandError(
+                'Já existem dados de carga no banco; use --limpa para refazer'
+            )
+
+        with Cronometro() as cronometro:
+            gerados = gera_dados_carga(
+                usuarios=options['usuarios'],
+                tickers=options['tickers'],
+                movimentacoes=options['movimentacoes'],
+                anos=options['anos'],
+                fim=options['fim'],
+                semente=options['semente'],
+                senha=options['senha'],
+                tamanho_lote=options['lote'],
+            )
+        self.stdout.write(
+            f"{gerados['usuarios']} usuários, {gerados['acoes']} ações, "
+            f"{gerados['movimentacoes']} movimentações, "
+            f"{gerados['carteiras']} carteiras, "
+            f"{gerados['resultados_mensais']} resultados mensais em "
+            f"{cronometro.segundos:.2f}s "
+            f"({por_segundo(gerados['movimentacoes'], cronometro.segundos):.0f} movimentações/s)"
+        )
@@ -0,0 +1,57 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from acoes.benchmark import Cronometro, por_segundo
+from acoes.cotahist import abre_linhas, le_cotacoes
+from acoes.models import Acao, AcaoPrecoHistorico
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa o histórico de preços de fechamento dos arquivos COTAHIST '
+        'da B3 para as ações cadastradas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivos', nargs='+')
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Quantidade de registros por bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        tickers = {
+            ticker.encode(): pk
+            for pk, ticker in Acao.objects.values_list('pk', 'ticker')
+        }
+        for caminho in options['arquivos']:
+            # O bulk_create com ignore_conflicts não informa quantas linhas
+            # foram inseridas: conta a tabela antes e depois
+            existentes = AcaoPrecoHistorico.objects.count()
+            with Cronometro() as cronometro, abre_linhas(caminho) as linhas:
+                lidos = self.importa(
+                    le_cotacoes(linhas, tickers), options['lote']
+                )
+            inseridos = AcaoPrecoHistorico.objects.count() - existentes
+            self.stdout.write(
+                f"{caminho}: {inseridos} registros inseridos de {lidos} lidos em "
+                f"{cronometro.segundos:.2f}s "
+                f"({por_segundo(inseridos, cronometro.segundos):.0f} registros/s)"
+            )
+
+    def importa(self, cotacoes, tamanho_lote):
+        """
+        Grava as cotações em lotes, ignorando dias já importados
+        Retorna a quantidade de cotações lidas
+        """
+        total = 0
+        while True:
+            lote = [
+                AcaoPrecoHistorico(acao_id=acao_id, data=data, preco=preco)
+                for acao_id, data, preco in islice(cotacoes, tamanho_lote)
+            ]
+            if not lote:
+                return total
+            AcaoPrecoHistorico.objects.bulk_create(lote, ignore_conflicts=True)
+            total += len(lote)
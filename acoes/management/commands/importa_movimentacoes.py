@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from acoes.benchmark import Cronometro, por_segundo
+from acoes.importacao import ErroImportacao, importa_movimentacoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa movimentações de um CSV (data, ticker, tipo, quantidade, '
+        'preco) para o usuário, reprocessando cada posição uma vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--usuario', required=True, help='E-mail do usuário')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument(
+            '--lote', type=int, default=5000,
+            help='Linhas validadas e gravadas por lote'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']} não encontrado")
+
+        with Cronometro() as cronometro, open(
+            options['arquivo'], encoding=options['encoding'], newline=''
+        ) as arquivo:
+            try:
+                importadas, posicoes = importa_movimentacoes(
+                    arquivo, user, options['lote']
+                )
+            except ErroImportacao as erro:
+                raise CommandError(str(erro))
+        self.stdout.write(
+            f"{importadas} movimentações, {posicoes} posições em "
+            f"{cronometro.segundos:.2f}s "
+            f"({por_segundo(importadas, cronometro.segundos):.0f} linhas/s)"
+        )
@@ -0,0 +1,29 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from acoes.benchmark import Cronometro, por_segundo
+from acoes.posicao import reconstroi_carteiras
+
+
+class Command(BaseCommand):
+    help = (
+        'Refaz todas as carteiras e as posições gravadas nas movimentações '
+        'em uma única passada pelo histórico, e depois os resultados mensais'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=2000,
+            help='Movimentações lidas e gravadas por lote'
+        )
+
+    def handle(self, *args, **options):
+        with Cronometro() as cronometro:
+            movimentacoes, carteiras = reconstroi_carteiras(options['lote'])
+        self.stdout.write(
+            f"{movimentacoes} movimentações, {carteiras} carteiras em "
+            f"{cronometro.segundos:.2f}s "
+            f"({por_segundo(movimentacoes, cronometro.segundos):.0f} movimentações/s)"
+        )
+        # O custo das vendas pode ter mudado
+        call_command('reconstroi_resultados_mensais', stdout=self.stdout)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from acoes.benchmark import Cronometro
+from acoes.resultados import reconstroi_resultados_mensais
+
+
+class Command(BaseCommand):
+    help = 'Refaz a tabela de resultados mensais a partir das vendas'
+
+    def handle(self, *args, **options):
+        with Cronometro() as cronometro:
+            linhas = reconstroi_resultados_mensais()
+        self.stdout.write(
+            f"{linhas} resultados mensais em {cronometro.segundos:.2f}s"
+        )
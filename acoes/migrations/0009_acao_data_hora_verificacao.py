@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0008_auto_20220117_1042'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acao',
+            name='data_hora_verificacao',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Última verificação'),
+        ),
+    ]
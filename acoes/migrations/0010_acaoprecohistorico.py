@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 09:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0009_acao_data_hora_verificacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcaoPrecoHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('preco', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Preço')),
+                ('acao', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='historico_precos', to='acoes.acao', verbose_name='Ação')),
+            ],
+            options={
+                'verbose_name': 'Preço histórico',
+                'verbose_name_plural': 'Histórico de preços',
+                'unique_together': {('acao', 'data')},
+            },
+        ),
+    ]
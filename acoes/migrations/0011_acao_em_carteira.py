@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 09:35
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def preenche_em_carteira(apps, schema_editor):
+    Acao = apps.get_model('acoes', 'Acao')
+    Carteira = apps.get_model('acoes', 'Carteira')
+    Acao.objects.update(
+        em_carteira=Exists(Carteira.objects.filter(acao=OuterRef('pk')))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0010_acaoprecohistorico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acao',
+            name='em_carteira',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Em carteira'),
+        ),
+        migrations.RunPython(preenche_em_carteira, migrations.RunPython.noop),
+    ]
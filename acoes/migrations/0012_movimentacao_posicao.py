@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0011_acao_em_carteira'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimentacao',
+            name='preco_medio_posicao',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Preço médio em carteira'),
+        ),
+        migrations.AddField(
+            model_name='movimentacao',
+            name='quantidade_posicao',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Quantidade em carteira'),
+        ),
+        migrations.AddField(
+            model_name='movimentacao',
+            name='valor_investido_posicao',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Valor investido em carteira'),
+        ),
+    ]
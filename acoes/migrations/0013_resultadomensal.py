@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 10:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('acoes', '0012_movimentacao_posicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês')),
+                ('lucro', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Lucro')),
+                ('prejuizo', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Prejuízo')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultados_mensais', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resultado mensal',
+                'verbose_name_plural': 'Resultados mensais',
+                'unique_together': {('user', 'mes')},
+            },
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 3.2 on 2026-10-18 10:14
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+CAMPOS_POSICAO = [
+    'preco_medio_venda', 'quantidade_posicao', 'valor_investido_posicao',
+    'preco_medio_posicao', 'custo_venda', 'resultado',
+]
+
+
+def centavos(valor):
+    return int(valor.scaleb(2))
+
+
+def decimal(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def divide_arredondando(numerador, denominador):
+    """ Divisão inteira com arredondamento half-even, como Decimal.quantize """
+    if numerador < 0:
+        return -divide_arredondando(-numerador, denominador)
+    quociente, resto = divmod(numerador, denominador)
+    if 2 * resto > denominador or (2 * resto == denominador and quociente % 2):
+        quociente += 1
+    return quociente
+
+
+def grava_posicoes(Movimentacao, cursor, alteradas):
+    """
+    Um UPDATE por id via executemany, como acoes.posicao.grava_posicoes;
+    o bulk_update monta um CASE por linha e fica lento em milhares delas
+    """
+    if not alteradas:
+        return
+    quote = cursor.db.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Movimentacao._meta.db_table),
+        ', '.join(
+            f'{quote(Movimentacao._meta.get_field(campo).column)} = %s'
+            for campo in CAMPOS_POSICAO
+        ),
+        quote(Movimentacao._meta.pk.column),
+    )
+    cursor.executemany(sql, alteradas)
+
+
+def preenche_posicoes(apps, schema_editor):
+    """
+    Grava a posição após cada movimentação e o custo e o resultado das
+    vendas, reaplicando o histórico em centavos, só nas linhas em que algum
+    valor muda; os resultados mensais são refeitos a partir do resultado
+    gravado
+    O cálculo fica copiado aqui para não depender da versão de acoes.posicao
+    """
+    Movimentacao = apps.get_model('acoes', 'Movimentacao')
+    ResultadoMensal = apps.get_model('acoes', 'ResultadoMensal')
+
+    linhas = Movimentacao.objects.order_by(
+        'user_id', 'acao_id', 'data_movimentacao', 'id'
+    ).values_list(
+        'id', 'user_id', 'acao_id', 'tipo', 'quantidade', 'valor_total',
+        *CAMPOS_POSICAO
+    )
+    chave_atual, alteradas = None, []
+    quantidade = valor_investido = preco_medio = 0
+    with schema_editor.connection.cursor() as cursor:
+        for (id, user_id, acao_id, tipo, movimentada, valor_total,
+             *gravados) in linhas.iterator(chunk_size=2000):
+            if (user_id, acao_id) != chave_atual:
+                chave_atual = (user_id, acao_id)
+                quantidade = valor_investido = preco_medio = 0
+            valor_total = centavos(valor_total)
+            if tipo == 'C':
+                preco_medio_venda = centavos(gravados[0])
+                custo_venda = resultado = 0
+                valor_investido += valor_total
+                quantidade += movimentada
+                preco_medio = divide_arredondando(valor_investido, quantidade)
+            else:
+                preco_medio_venda = preco_medio
+                custo_venda = preco_medio * movimentada
+                resultado = valor_total - custo_venda
+                vendida = min(movimentada, quantidade)
+                valor_investido -= preco_medio * vendida
+                quantidade -= vendida
+            if quantidade == 0:
+                valor_investido = preco_medio = 0
+
+            calculados = [
+                decimal(preco_medio_venda), quantidade,
+                decimal(valor_investido), decimal(preco_medio),
+                decimal(custo_venda), decimal(resultado),
+            ]
+            if calculados != gravados:
+                alteradas.append(calculados + [id])
+            if len(alteradas) >= 2000:
+                grava_posicoes(Movimentacao, cursor, alteradas)
+                alteradas = []
+        grava_posicoes(Movimentacao, cursor, alteradas)
+
+    meses = Movimentacao.objects.filter(tipo='V').annotate(
+        mes=TruncMonth('data_movimentacao'),
+    ).values('user_id', 'mes').annotate(
+        lucro=Sum('resultado', filter=Q(resultado__gt=0)),
+        prejuizo=Sum('resultado', filter=Q(resultado__lt=0)),
+    ).order_by()
+    ResultadoMensal.objects.all().delete()
+    ResultadoMensal.objects.bulk_create([
+        ResultadoMensal(
+            user_id=mes['user_id'], mes=mes['mes'], lucro=mes['lucro'] or 0,
+            prejuizo=-mes['prejuizo'] if mes['prejuizo'] else 0,
+        )
+        for mes in meses
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0013_resultadomensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimentacao',
+            name='custo_venda',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Custo da venda'),
+        ),
+        migrations.AddField(
+            model_name='movimentacao',
+            name='resultado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Resultado'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['user', 'tipo', 'data_movimentacao', 'resultado'], name='acoes_mov_user_tipo_data_idx'),
+        ),
+        migrations.RunPython(preenche_posicoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0014_movimentacao_resultado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['user', 'data_movimentacao', 'id'], name='acoes_mov_user_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2 on 2026-10-18 10:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('acoes', '0015_movimentacao_indice_listagem'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='carteira',
+            options={'verbose_name': 'Carteira', 'verbose_name_plural': 'Carteiras'},
+        ),
+        migrations.AlterField(
+            model_name='carteira',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='carteira_user', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='movimentacao',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimentacao_user', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='resultadomensal',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resultados_mensais', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacao',
+            index=models.Index(fields=['user', 'acao', 'data_movimentacao', 'id'], name='acoes_mov_user_acao_data_idx'),
+        ),
+    ]
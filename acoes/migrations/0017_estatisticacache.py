@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+def cria_fragmentos(apps, schema_editor):
+    """ Uma linha por fragmento, para os contadores serem só um UPDATE """
+    EstatisticaCache = apps.get_model('acoes', 'EstatisticaCache')
+    EstatisticaCache.objects.bulk_create([
+        EstatisticaCache(fragmento=fragmento)
+        for fragmento in ('header', 'carteira', 'alocacao', 'grafico')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0016_movimentacao_indice_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fragmento', models.CharField(max_length=20, unique=True, verbose_name='Fragmento')),
+                ('hits', models.PositiveBigIntegerField(default=0, verbose_name='Acertos')),
+                ('misses', models.PositiveBigIntegerField(default=0, verbose_name='Falhas')),
+            ],
+            options={
+                'verbose_name': 'Estatística do cache',
+                'verbose_name_plural': 'Estatísticas do cache',
+            },
+        ),
+        migrations.RunPython(cria_fragmentos, migrations.RunPython.noop),
+    ]
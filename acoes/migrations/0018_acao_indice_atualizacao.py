@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('acoes', '0017_estatisticacache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='acao',
+            name='data_hora_atualizacao',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última atualização'),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator
 
@@ -17,7 +18,13 @@ class Acao(models.Model):
         validators=[MinValueValidator(Decimal('0.01'))]
     )
     data_hora_atualizacao = models.DateTimeField(
-        'Última atualização', auto_now=True
+        'Última atualização', auto_now=True, db_index=True
+    )
+    data_hora_verificacao = models.DateTimeField(
+        'Última verificação', null=True, blank=True, editable=False
+    )
+    em_carteira = models.BooleanField(
+        'Em carteira', default=False, db_index=True, editable=False
     )
 
     class Meta:
@@ -27,10 +34,38 @@ class Acao(models.Model):
     def __str__(self):
         return self.ticker
 
+    @classmethod
+    def sincroniza_em_carteira(cls, acao_ids):
+        """ Marca se as ações informadas estão na carteira de algum usuário """
+        cls.objects.filter(pk__in=acao_ids).update(
+            em_carteira=Exists(Carteira.objects.filter(acao=OuterRef('pk')))
+        )
+
+
+class AcaoPrecoHistorico(models.Model):
+    """ Preço diário da ação, somente inclusão """
+    acao = models.ForeignKey(
+        Acao, verbose_name="Ação", on_delete=models.CASCADE,
+        related_name='historico_precos', db_index=False
+    )
+    data = models.DateField('Data')
+    preco = models.DecimalField('Preço', max_digits=8, decimal_places=2)
+
+    class Meta:
+        verbose_name_plural = "Histórico de preços"
+        verbose_name = "Preço histórico"
+        # Índice único (acao, data) também atende as consultas por período
+        unique_together = ('acao', 'data',)
+
+    def __str__(self):
+        return f'{self.acao} {self.data}: {self.preco}'
+
 
 class Carteira(models.Model):
+    # Coberto pelo índice único (user, acao)
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='carteira_user'
+        User, on_delete=models.CASCADE, related_name='carteira_user',
+        db_index=False
     )
     acao = models.ForeignKey(
         Acao, verbose_name="Ação", on_delete=models.PROTECT,
@@ -49,7 +84,6 @@ class Carteira(models.Model):
     class Meta:
         verbose_name_plural = "Carteiras"
         verbose_name = "Carteira"
-        ordering = ['acao__ticker']
         unique_together = ('user', 'acao',)
 
     def calcula_preco_medio_carteira(self, valor_total, quantidade, tipo):
@@ -73,6 +107,64 @@ class Carteira(models.Model):
         return 'CARTEIRA: ' + self.user.email + ' AÇÃO: ' + self.acao.ticker
 
 
+class ResultadoMensal(models.Model):
+    """
+    Resultado realizado das vendas do usuário no mês, mantido a cada
+    reprocessamento da posição (acoes.resultados)
+    """
+    # Coberto pelo índice único (user, mes)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='resultados_mensais',
+        db_index=False
+    )
+    mes = models.DateField('Mês')
+    lucro = models.DecimalField(
+        'Lucro', max_digits=12, decimal_places=2, default=0
+    )
+    prejuizo = models.DecimalField(
+        'Prejuízo', max_digits=12, decimal_places=2, default=0
+    )
+
+    class Meta:
+        verbose_name_plural = "Resultados mensais"
+        verbose_name = "Resultado mensal"
+        # Índice único (user, mes) também atende as consultas por período
+        unique_together = ('user', 'mes',)
+
+    def __str__(self):
+        return f'{self.user} {self.mes:%m/%Y}: {self.lucro} / -{self.prejuizo}'
+
+
+class EstatisticaCache(models.Model):
+    """
+    Acertos e falhas do cache do dashboard por fragmento, somados por todos
+    os processos (acoes.cache)
+    """
+    fragmento = models.CharField('Fragmento', max_length=20, unique=True)
+    hits = models.PositiveBigIntegerField('Acertos', default=0)
+    misses = models.PositiveBigIntegerField('Falhas', default=0)
+
+    class Meta:
+        verbose_name_plural = "Estatísticas do cache"
+        verbose_name = "Estatística do cache"
+
+    def __str__(self):
+        return f'{self.fragmento}: {self.hits} / {self.misses}'
+
+
+class MovimentacaoQuerySet(models.QuerySet):
+
+    def delete(self):
+        """
+        Reprocessa cada posição afetada uma única vez, e não a cada
+        movimentação removida (acoes.posicao.reprocessamento_agrupado)
+        """
+        from acoes.posicao import reprocessamento_agrupado
+
+        with reprocessamento_agrupado():
+            return super().delete()
+
+
 class Movimentacao(models.Model):
 
     TIPO_MOVIMENTACAO = (
@@ -104,13 +196,59 @@ class Movimentacao(models.Model):
         decimal_places=2, default=0, editable=False,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
+    # Coberto pelos índices compostos iniciados por user
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE,related_name='movimentacao_user'
+        User, on_delete=models.CASCADE,related_name='movimentacao_user',
+        db_index=False
+    )
+    # Posição do usuário na ação após esta movimentação, ponto de partida
+    # para reprocessar as movimentações seguintes
+    quantidade_posicao = models.PositiveIntegerField(
+        'Quantidade em carteira', default=0, editable=False
+    )
+    valor_investido_posicao = models.DecimalField(
+        'Valor investido em carteira', max_digits=8, decimal_places=2,
+        default=0, editable=False
+    )
+    preco_medio_posicao = models.DecimalField(
+        'Preço médio em carteira', max_digits=8, decimal_places=2,
+        default=0, editable=False
+    )
+    # Custo pelo preço médio e resultado realizado da venda (zero nas
+    # compras), gravados junto com a posição
+    custo_venda = models.DecimalField(
+        'Custo da venda', max_digits=10, decimal_places=2,
+        default=0, editable=False
+    )
+    resultado = models.DecimalField(
+        'Resultado', max_digits=10, decimal_places=2,
+        default=0, editable=False
     )
 
+    objects = MovimentacaoQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Movimentações"
         verbose_name = "Movimentação"
+        indexes = [
+            # Vendas do usuário por período (resultados mensais); com o
+            # resultado, a agregação por mês lê só o índice
+            models.Index(
+                fields=['user', 'tipo', 'data_movimentacao', 'resultado'],
+                name='acoes_mov_user_tipo_data_idx'
+            ),
+            # Listagem paginada por cursor (acoes.paginacao)
+            models.Index(
+                fields=['user', 'data_movimentacao', 'id'],
+                name='acoes_mov_user_data_id_idx'
+            ),
+            # Ledger do usuário em uma ação, na ordem de reprocessamento
+            # (acoes.posicao)
+            models.Index(
+                fields=['user', 'acao', 'data_movimentacao', 'id'],
+                name='acoes_mov_user_acao_data_idx'
+            ),
+        ]
 
     def __str__(self):
         items = [
@@ -122,39 +260,109 @@ class Movimentacao(models.Model):
         ]
         return ' '.join([str(i) for i in items])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Guarda a chave original, para reprocessar também a posição antiga """
+        instance = super().from_db(db, field_names, values)
+        instance.guarda_original()
+        return instance
+
+    def guarda_original(self):
+        self._original = (
+            self.__dict__.get('user_id'),
+            self.__dict__.get('acao_id'),
+            self._meta.get_field('data_movimentacao').to_python(
+                self.__dict__.get('data_movimentacao')
+            ),
+        )
+
+    def data_como_date(self):
+        return self._meta.get_field('data_movimentacao').to_python(
+            self.data_movimentacao
+        )
+
+    def save(self, *args, valida_posicao=False, **kwargs):
+        """
+        Grava a movimentação e atualiza a carteira na mesma transação
+        Com valida_posicao, se a venda (ou uma venda posterior) ficar maior
+        que a posição na sua data, gera PosicaoInsuficiente e nada é gravado
+        """
+        self._valida_posicao = valida_posicao
+        with transaction.atomic():
+            if self._state.adding and self.pk is None:
+                self.insere_na_carteira(*args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+
+    def insere_na_carteira(self, *args, **kwargs):
+        """
+        Insere a movimentação nova já com a posição resultante, calculada no
+        reprocessamento a partir da sua data, em vez de gravá-la zerada e
+        atualizá-la em seguida
+        """
+        from acoes.posicao import reprocessa_posicao
+
+        def insere():
+            self._posicao_calculada = True
+            try:
+                super(Movimentacao, self).save(*args, **kwargs)
+            finally:
+                self._posicao_calculada = False
+
+        reprocessa_posicao(
+            self.user_id, self.acao_id, self.data_como_date(),
+            estrito=self._valida_posicao, nova=self, insere=insere
+        )
+        self.guarda_original()
+
     def cria_atualiza_carteira(self):
-        """ Atualiza carteira após alteração """
-        try:
-            acao_carteira = Carteira.objects.get(
-                user=self.user, acao=self.acao
-            )
-        except Carteira.DoesNotExist:
-            acao_carteira = None
-        
-        if acao_carteira:
-            (novo_preco_medio,
-            nova_quantidade,
-            novo_valor_investido) = acao_carteira.calcula_preco_medio_carteira(
-                self.valor_total,
-                self.quantidade,
-                self.tipo,
+        """
+        Reprocessa a posição a partir da data da movimentação. Em uma
+        alteração, a partir da menor entre a data antiga e a nova; se mudou
+        a ação ou o usuário, a posição antiga também é reprocessada
+        """
+        from acoes.posicao import reprocessa_posicao
+
+        if getattr(self, '_posicao_calculada', False):
+            return
+        a_partir_de = self.data_como_date()
+        # Os meses das vendas com resultado alterado entram no
+        # reprocessamento; numa alteração, também os meses antigo e novo,
+        # dos quais a movimentação pode ter saído sem mudar de resultado
+        meses = set()
+        user_id, acao_id, data = getattr(self, '_original', (None, None, None))
+        estrito = getattr(self, '_valida_posicao', False)
+        with transaction.atomic(savepoint=False):
+            if data is not None:
+                meses.add(a_partir_de.replace(day=1))
+                if (user_id, acao_id) == (self.user_id, self.acao_id):
+                    a_partir_de = min(a_partir_de, data)
+                    meses.add(data.replace(day=1))
+                else:
+                    reprocessa_posicao(
+                        user_id, acao_id, data, estrito=estrito,
+                        meses={data.replace(day=1)}
+                    )
+            reprocessa_posicao(
+                self.user_id, self.acao_id, a_partir_de, estrito=estrito,
+                meses=meses
             )
-            if nova_quantidade == 0:
-                acao_carteira.delete()
-            else:
-                acao_carteira.preco_medio = novo_preco_medio
-                acao_carteira.quantidade = nova_quantidade
-                acao_carteira.valor_investido = novo_valor_investido
-                acao_carteira.save()
-        else:
-            Carteira.objects.create(
-                acao = self.acao,
-                user = self.user,
-                valor_investido = self.valor_total,
-                preco_medio = (
-                    self.valor_total / self.quantidade
-                ),
-                quantidade = self.quantidade
+        self.guarda_original()
+
+    def remove_da_carteira(self):
+        """
+        Reprocessa a posição sem a movimentação removida; numa remoção em
+        lote, uma vez por usuário e ação ao final (reprocessamento_agrupado)
+        """
+        from acoes.posicao import adia_reprocessamento, reprocessa_posicao
+
+        user_id, acao_id, data = getattr(
+            self, '_original', (self.user_id, self.acao_id, None)
+        )
+        data = data or self.data_como_date()
+        if not adia_reprocessamento(user_id, acao_id, data):
+            reprocessa_posicao(
+                user_id, acao_id, data, meses={data.replace(day=1)}
             )
 
 @receiver(post_save, sender=Movimentacao)
@@ -162,8 +370,13 @@ def after_created_movimentacao(sender, instance, created, **kwargs):
     """ Cria ou atualiza registro na Carteira """
     instance.cria_atualiza_carteira()
 
+@receiver(post_delete, sender=Movimentacao)
+def after_deleted_movimentacao(sender, instance, **kwargs):
+    """ Desfaz a movimentação removida na Carteira """
+    instance.remove_da_carteira()
+
 @receiver(pre_save, sender=Movimentacao)
 def before_created_movimentacao(sender, instance, **kwargs):
     """ Atualiza valor total caso alguma movimentação seja alterada """
     novo_valor_total = instance.quantidade * instance.preco
-    instance.valor_total = novo_valor_total
\ No newline at end of file
+    instance.valor_total = novo_valor_total
@@ -0,0 +1,40 @@
+"""
+Paginação por cursor (keyset) das movimentações, em ordem decrescente de
+(data_movimentacao, id): cada página continua depois da última linha da
+anterior, sem OFFSET, pelo índice (user, data_movimentacao, id)
+"""
+from datetime import date
+
+from django.db.models import Q
+
+
+TAMANHO_PAGINA = 50
+
+
+def codifica_cursor(movimentacao):
+    return f'{movimentacao.data_movimentacao:%Y-%m-%d}_{movimentacao.pk}'
+
+
+def decodifica_cursor(cursor):
+    """ AAAA-MM-DD_id para (data, id); ValueError se inválido """
+    data, _, pk = cursor.partition('_')
+    return date.fromisoformat(data), int(pk)
+
+
+def pagina_movimentacoes(movimentacoes, cursor=None, tamanho=TAMANHO_PAGINA):
+    """
+    Página de movimentações (com a ação) depois do cursor (data, id)
+    Retorna (movimentações, cursor da próxima página ou None)
+    """
+    if cursor is not None:
+        data, pk = cursor
+        movimentacoes = movimentacoes.filter(
+            Q(data_movimentacao__lt=data) | Q(data_movimentacao=data, pk__lt=pk)
+        )
+    itens = list(
+        movimentacoes.select_related('acao')
+        .order_by('-data_movimentacao', '-id')[:tamanho + 1]
+    )
+    if len(itens) > tamanho:
+        return itens[:tamanho], codifica_cursor(itens[tamanho - 1])
+    return itens, None
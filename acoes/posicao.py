@@ -0,0 +1,467 @@
+"""
+Motor de posição: as movimentações são o registro de origem e a carteira é
+o resultado de aplicá-las em ordem (data_movimentacao, id). Cada
+movimentação guarda a posição resultante, de onde um reprocessamento
+parcial pode recomeçar
+
+Os cálculos são feitos em centavos inteiros, já convertidos pelo banco,
+sobre registros com __slots__ lidos via values_list, com o mesmo resultado
+(2 casas, arredondamento half-even do DecimalField) de
+Carteira.calcula_preco_medio_carteira
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import DateField, F, IntegerField, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+from acoes.models import Acao, Carteira, Movimentacao
+from acoes.resultados import atualiza_resultados_mensais
+
+
+QUANTIZADOR = Decimal('0.01')
+
+CAMPOS_POSICAO = [
+    'preco_medio_venda', 'quantidade_posicao', 'valor_investido_posicao',
+    'preco_medio_posicao', 'custo_venda', 'resultado',
+]
+
+
+class PosicaoInsuficiente(Exception):
+    """ Venda maior que a posição na data da movimentação """
+
+    def __init__(self, movimentacao, disponivel):
+        self.movimentacao = movimentacao
+        self.disponivel = disponivel
+        super().__init__(
+            f"Venda de {movimentacao.quantidade} em "
+            f"{movimentacao.data_movimentacao:%d/%m/%Y} maior que a posição "
+            f"de {disponivel}"
+        )
+
+
+def centavos(valor):
+    """ Decimal de 2 casas para centavos inteiros """
+    return int(valor.scaleb(2))
+
+
+def em_centavos(campo):
+    """ Campo decimal de 2 casas lido como centavos inteiros pelo banco """
+    return Cast(Round(F(campo) * 100), IntegerField())
+
+
+def campos_registro():
+    """ Argumentos de values_list na ordem de RegistroMovimentacao """
+    return [
+        'id', 'data_movimentacao', 'tipo', 'quantidade',
+        em_centavos('valor_total'), em_centavos('preco_medio_venda'),
+        'quantidade_posicao', em_centavos('valor_investido_posicao'),
+        em_centavos('preco_medio_posicao'), em_centavos('custo_venda'),
+        em_centavos('resultado'),
+    ]
+
+
+def decimal(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def divide_arredondando(numerador, denominador):
+    """ Divisão inteira com arredondamento half-even, como Decimal.quantize """
+    if numerador < 0:
+        return -divide_arredondando(-numerador, denominador)
+    quociente, resto = divmod(numerador, denominador)
+    if 2 * resto > denominador or (2 * resto == denominador and quociente % 2):
+        quociente += 1
+    return quociente
+
+
+class RegistroMovimentacao:
+    """ Movimentação lida do ledger (campos_registro), valores em centavos """
+    __slots__ = (
+        'id', 'data_movimentacao', 'tipo', 'quantidade', 'valor_total',
+        'preco_medio_venda', 'quantidade_posicao', 'valor_investido_posicao',
+        'preco_medio_posicao', 'custo_venda', 'resultado',
+    )
+
+    def __init__(self, id, data_movimentacao, tipo, quantidade, valor_total,
+                 preco_medio_venda, quantidade_posicao,
+                 valor_investido_posicao, preco_medio_posicao, custo_venda,
+                 resultado):
+        self.id = id
+        self.data_movimentacao = data_movimentacao
+        self.tipo = tipo
+        self.quantidade = quantidade
+        self.valor_total = valor_total
+        self.preco_medio_venda = preco_medio_venda
+        self.quantidade_posicao = quantidade_posicao
+        self.valor_investido_posicao = valor_investido_posicao
+        self.preco_medio_posicao = preco_medio_posicao
+        self.custo_venda = custo_venda
+        self.resultado = resultado
+
+    def valores_posicao(self):
+        """ Valores de CAMPOS_POSICAO para gravação """
+        return [
+            decimal(self.preco_medio_venda),
+            self.quantidade_posicao,
+            decimal(self.valor_investido_posicao),
+            decimal(self.preco_medio_posicao),
+            decimal(self.custo_venda),
+            decimal(self.resultado),
+        ]
+
+
+class Posicao:
+    """ Posição de um usuário em uma ação, em centavos """
+    __slots__ = ('quantidade', 'valor_investido', 'preco_medio')
+
+    def __init__(self, quantidade=0, valor_investido=0, preco_medio=0):
+        self.quantidade = quantidade
+        self.valor_investido = valor_investido
+        self.preco_medio = preco_medio
+
+    @classmethod
+    def do_registro(cls, registro):
+        """ Posição registrada após a movimentação """
+        return cls(
+            registro.quantidade_posicao,
+            registro.valor_investido_posicao,
+            registro.preco_medio_posicao,
+        )
+
+    def aplica(self, registro, estrito=False):
+        """
+        Aplica a movimentação conforme Carteira.calcula_preco_medio_carteira
+        e grava no registro o preço médio de venda, o custo e o resultado
+        da venda e a posição resultante
+        Venda acima da posição zera a posição (a validação é do formulário),
+        ou gera PosicaoInsuficiente se estrito
+        Retorna True se algum campo do registro foi alterado
+        """
+        if registro.tipo == 'C':
+            preco_medio_venda = registro.preco_medio_venda
+            custo_venda = resultado = 0
+            self.valor_investido += registro.valor_total
+            self.quantidade += registro.quantidade
+            self.preco_medio = divide_arredondando(
+                self.valor_investido, self.quantidade
+            )
+        else:
+            if estrito and registro.quantidade > self.quantidade:
+                raise PosicaoInsuficiente(registro, self.quantidade)
+            preco_medio_venda = self.preco_medio
+            custo_venda = preco_medio_venda * registro.quantidade
+            resultado = registro.valor_total - custo_venda
+            quantidade = min(registro.quantidade, self.quantidade)
+            self.valor_investido -= self.preco_medio * quantidade
+            self.quantidade -= quantidade
+
+        if self.quantidade == 0:
+            self.valor_investido = 0
+            self.preco_medio = 0
+
+        if (registro.preco_medio_venda == preco_medio_venda
+                and registro.quantidade_posicao == self.quantidade
+                and registro.valor_investido_posicao == self.valor_investido
+                and registro.preco_medio_posicao == self.preco_medio
+                and registro.custo_venda == custo_venda
+                and registro.resultado == resultado):
+            return False
+        registro.preco_medio_venda = preco_medio_venda
+        registro.quantidade_posicao = self.quantidade
+        registro.valor_investido_posicao = self.valor_investido
+        registro.preco_medio_posicao = self.preco_medio
+        registro.custo_venda = custo_venda
+        registro.resultado = resultado
+        return True
+
+
+def aplica_decimal(carteira, tipo, quantidade, valor_total):
+    """
+    Referência em Decimal: mesmo fluxo da carteira gravada a cada
+    movimentação (Carteira.calcula_preco_medio_carteira, arredondando como o
+    DecimalField ao salvar). Retorna a carteira resultante, ou None se zerada
+    """
+    if carteira is None:
+        carteira = Carteira(
+            valor_investido=valor_total,
+            preco_medio=valor_total / quantidade,
+            quantidade=quantidade,
+        )
+    else:
+        (carteira.preco_medio,
+         carteira.quantidade,
+         carteira.valor_investido) = carteira.calcula_preco_medio_carteira(
+            valor_total, quantidade, tipo
+        )
+    if carteira.quantidade == 0:
+        return None
+    carteira.preco_medio = carteira.preco_medio.quantize(QUANTIZADOR)
+    carteira.valor_investido = carteira.valor_investido.quantize(QUANTIZADOR)
+    return carteira
+
+
+def grava_posicoes(registros):
+    """
+    Grava as posições calculadas com um UPDATE por id via executemany;
+    o bulk_update monta um CASE por linha e fica lento em milhares delas.
+    Os valores já saem com 2 casas e os drivers aceitam Decimal diretamente
+    """
+    if not registros:
+        return
+    conexao = transaction.get_connection()
+    quote = conexao.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Movimentacao._meta.db_table),
+        ', '.join(
+            f'{quote(Movimentacao._meta.get_field(campo).column)} = %s'
+            for campo in CAMPOS_POSICAO
+        ),
+        quote(Movimentacao._meta.pk.column),
+    )
+    with conexao.cursor() as cursor:
+        cursor.executemany(sql, [
+            registro.valores_posicao() + [registro.id] for registro in registros
+        ])
+
+
+def bloqueia_usuario(user_id):
+    """
+    Serializa as alterações de posição do usuário até o fim da transação
+    (inclusive a criação de carteiras que ainda não existem). O UPDATE que
+    bloqueia a linha também incrementa a versão da carteira, que invalida
+    o cache do dashboard
+    """
+    get_user_model().objects.filter(pk=user_id).update(
+        versao_carteira=F('versao_carteira') + 1
+    )
+
+
+def grava_carteira(user_id, acao_id, posicao):
+    """ Cria, atualiza ou remove a carteira conforme a posição """
+    carteira = Carteira.objects.filter(user_id=user_id, acao_id=acao_id)
+    if posicao.quantidade == 0:
+        if carteira.delete()[0]:
+            Acao.sincroniza_em_carteira([acao_id])
+        return
+
+    valores = {
+        'quantidade': posicao.quantidade,
+        'valor_investido': decimal(posicao.valor_investido),
+        'preco_medio': decimal(posicao.preco_medio),
+    }
+    if not carteira.update(**valores):
+        Carteira.objects.create(user_id=user_id, acao_id=acao_id, **valores)
+        Acao.objects.filter(
+            pk=acao_id, em_carteira=False
+        ).update(em_carteira=True)
+
+
+def registro_novo(movimentacao):
+    """ Registro da movimentação ainda não gravada, sem posição """
+    valor_total = Movimentacao._meta.get_field('valor_total').to_python(
+        movimentacao.quantidade * movimentacao.preco
+    )
+    preco_medio_venda = Movimentacao._meta.get_field(
+        'preco_medio_venda'
+    ).to_python(movimentacao.preco_medio_venda)
+    return RegistroMovimentacao(
+        None, movimentacao.data_como_date(), movimentacao.tipo,
+        movimentacao.quantidade, centavos(valor_total.quantize(QUANTIZADOR)),
+        centavos(preco_medio_venda.quantize(QUANTIZADOR)), 0, 0, 0, 0, 0,
+    )
+
+
+def reprocessa_posicao(user_id, acao_id, a_partir_de=None, estrito=False,
+                       meses=(), atualiza_resultados=True, nova=None,
+                       insere=None):
+    """
+    Reaplica as movimentações do usuário na ação a partir da data
+    (inclusive), partindo da posição registrada na última movimentação
+    anterior, e grava a carteira resultante
+    Os resultados mensais são recalculados nos meses das vendas cujo
+    resultado mudou e nos meses informados (da movimentação removida ou da
+    data antiga da alterada), que podem ter ficado sem vendas
+    nova é uma movimentação ainda não gravada, na data a_partir_de: é
+    aplicada depois das da mesma data e gravada por insere() já com a
+    posição calculada, sem um UPDATE logo após o INSERT
+    """
+    with transaction.atomic(savepoint=False):
+        bloqueia_usuario(user_id)
+
+        movimentacoes = Movimentacao.objects.filter(
+            user_id=user_id, acao_id=acao_id
+        )
+        posicao = Posicao()
+        if a_partir_de is not None:
+            a_partir_de = Movimentacao._meta.get_field(
+                'data_movimentacao'
+            ).to_python(a_partir_de)
+            # Na mesma leitura, as movimentações do último dia anterior: a
+            # última delas tem a posição de onde o reprocessamento recomeça
+            dia_anterior = movimentacoes.filter(
+                data_movimentacao__lt=a_partir_de
+            ).order_by('-data_movimentacao').values('data_movimentacao')[:1]
+            movimentacoes = movimentacoes.filter(
+                data_movimentacao__gte=Coalesce(
+                    Subquery(dia_anterior), Value(a_partir_de),
+                    output_field=DateField()
+                )
+            )
+
+        novo = registro_novo(nova) if nova is not None else None
+        pendente = novo
+        alteradas = []
+        for linha in movimentacoes.order_by(
+            'data_movimentacao', 'id'
+        ).values_list(*campos_registro()):
+            registro = RegistroMovimentacao(*linha)
+            if a_partir_de is not None and registro.data_movimentacao < a_partir_de:
+                posicao = Posicao.do_registro(registro)
+                continue
+            if (pendente is not None
+                    and registro.data_movimentacao > pendente.data_movimentacao):
+                posicao.aplica(pendente, estrito)
+                pendente = None
+            if posicao.aplica(registro, estrito):
+                alteradas.append(registro)
+        if pendente is not None:
+            posicao.aplica(pendente, estrito)
+
+        if novo is not None:
+            # A instância volta aos valores recebidos, como nas alterações,
+            # em que a posição só é gravada no banco
+            informados = [getattr(nova, campo) for campo in CAMPOS_POSICAO]
+            for campo, valor in zip(CAMPOS_POSICAO, novo.valores_posicao()):
+                setattr(nova, campo, valor)
+            try:
+                insere()
+            finally:
+                for campo, valor in zip(CAMPOS_POSICAO, informados):
+                    setattr(nova, campo, valor)
+        grava_posicoes(alteradas)
+        grava_carteira(user_id, acao_id, posicao)
+
+        if atualiza_resultados:
+            atualiza_resultados_mensais(user_id, {
+                registro.data_movimentacao.replace(day=1)
+                for registro in alteradas + [novo]
+                if registro is not None and registro.tipo == 'V'
+            }, removidos=meses)
+
+    return posicao
+
+
+_adiados = threading.local()
+
+
+@contextmanager
+def reprocessamento_agrupado():
+    """
+    Remoções em lote: dentro do bloco, cada movimentação removida não
+    reprocessa a posição (post_delete); ao final, cada usuário e ação é
+    reprocessado uma única vez, a partir da menor data removida. Usuários
+    removidos no bloco não são reprocessados, só a marcação em_carteira
+    das ações que tinham. Blocos aninhados reprocessam no mais externo
+    """
+    if getattr(_adiados, 'posicoes', None) is not None:
+        yield
+        return
+    _adiados.posicoes = posicoes = {}
+    try:
+        with transaction.atomic():
+            yield
+            _adiados.posicoes = None
+            reprocessa_adiados(posicoes)
+    finally:
+        _adiados.posicoes = None
+
+
+def adia_reprocessamento(user_id, acao_id, data):
+    """
+    Dentro de reprocessamento_agrupado, guarda a posição para reprocessar
+    ao final e retorna True; fora dele, retorna False
+    """
+    posicoes = getattr(_adiados, 'posicoes', None)
+    if posicoes is None:
+        return False
+    a_partir_de, meses = posicoes.get((user_id, acao_id), (data, set()))
+    meses.add(data.replace(day=1))
+    posicoes[user_id, acao_id] = (min(a_partir_de, data), meses)
+    return True
+
+
+def reprocessa_adiados(posicoes):
+    """ Reprocessa as posições guardadas, em ordem de usuário e ação """
+    existentes = set(get_user_model().objects.filter(
+        pk__in={user_id for user_id, _ in posicoes}
+    ).values_list('pk', flat=True))
+    for (user_id, acao_id), (a_partir_de, meses) in sorted(posicoes.items()):
+        if user_id in existentes:
+            reprocessa_posicao(user_id, acao_id, a_partir_de, meses=meses)
+    # As carteiras dos usuários removidos saíram em cascata
+    removidas = {
+        acao_id for user_id, acao_id in posicoes if user_id not in existentes
+    }
+    if removidas:
+        Acao.sincroniza_em_carteira(removidas)
+
+
+def reconstroi_carteiras(tamanho_lote=2000, user_ids=None):
+    """
+    Refaz todas as carteiras (ou só as dos usuários em user_ids, lista ou
+    subconsulta) em uma única passada ordenada pelo ledger, gravando as
+    posições das movimentações em lotes
+    Retorna (movimentações lidas, carteiras criadas)
+    """
+    carteiras = []
+    alteradas = []
+    chave_atual, posicao = None, None
+    lidas = 0
+
+    def fecha_posicao():
+        if chave_atual is not None and posicao.quantidade > 0:
+            carteiras.append(Carteira(
+                user_id=chave_atual[0],
+                acao_id=chave_atual[1],
+                quantidade=posicao.quantidade,
+                valor_investido=decimal(posicao.valor_investido),
+                preco_medio=decimal(posicao.preco_medio),
+            ))
+
+    movimentacoes = Movimentacao.objects.all()
+    existentes = Carteira.objects.all()
+    usuarios = get_user_model().objects.all()
+    if user_ids is not None:
+        movimentacoes = movimentacoes.filter(user_id__in=user_ids)
+        existentes = existentes.filter(user_id__in=user_ids)
+        usuarios = usuarios.filter(pk__in=user_ids)
+
+    with transaction.atomic():
+        linhas = movimentacoes.order_by(
+            'user_id', 'acao_id', 'data_movimentacao', 'id'
+        ).values_list('user_id', 'acao_id', *campos_registro())
+        for user_id, acao_id, *campos in linhas.iterator(chunk_size=tamanho_lote):
+            lidas += 1
+            chave = (user_id, acao_id)
+            if chave != chave_atual:
+                fecha_posicao()
+                chave_atual, posicao = chave, Posicao()
+            registro = RegistroMovimentacao(*campos)
+            if posicao.aplica(registro):
+                alteradas.append(registro)
+            if len(alteradas) >= tamanho_lote:
+                grava_posicoes(alteradas)
+                alteradas = []
+        fecha_posicao()
+        grava_posicoes(alteradas)
+
+        existentes.delete()
+        Carteira.objects.bulk_create(carteiras, batch_size=tamanho_lote)
+        Acao.sincroniza_em_carteira(Acao.objects.values('pk'))
+        usuarios.update(versao_carteira=F('versao_carteira') + 1)
+
+    return lidas, len(carteiras)
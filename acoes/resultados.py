@@ -0,0 +1,138 @@
+"""
+Resultado realizado (lucro/prejuízo) das vendas por mês. A tabela
+ResultadoMensal é atualizada nos meses afetados a cada reprocessamento de
+posição, e o gráfico lê no máximo uma linha por mês
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from acoes.models import Movimentacao, ResultadoMensal
+
+
+def agrega_vendas_por_mes(vendas, *agrupamento):
+    """
+    Vendas agrupadas por mês (e campos extras) com lucro e prejuízo,
+    somando o resultado gravado em cada venda
+    """
+    return vendas.filter(tipo='V').annotate(
+        mes=TruncMonth('data_movimentacao'),
+    ).values(*agrupamento, 'mes').annotate(
+        lucro=Sum('resultado', filter=Q(resultado__gt=0)),
+        prejuizo=Sum('resultado', filter=Q(resultado__lt=0)),
+    )
+
+
+def lucro_prejuizo_por_mes(user_id, inicio, fim):
+    """
+    Lucro e prejuízo das vendas entre as datas (inclusive) em uma única
+    consulta agrupada por mês: {primeiro dia do mês: (lucro, prejuizo)},
+    só com os meses que tiveram vendas; o prejuízo é positivo
+    """
+    meses = agrega_vendas_por_mes(Movimentacao.objects.filter(
+        user_id=user_id,
+        data_movimentacao__gte=inicio, data_movimentacao__lte=fim,
+    ))
+    return {
+        mes['mes']: (mes['lucro'] or 0, -mes['prejuizo'] if mes['prejuizo'] else 0)
+        for mes in meses
+    }
+
+
+def resultados_mensais(user_id, inicio, fim):
+    """ Mesmo formato de lucro_prejuizo_por_mes, lido de ResultadoMensal """
+    return {
+        mes: (lucro or 0, prejuizo or 0)
+        for mes, lucro, prejuizo in ResultadoMensal.objects.filter(
+            user_id=user_id, mes__gte=inicio.replace(day=1), mes__lte=fim
+        ).values_list('mes', 'lucro', 'prejuizo')
+    }
+
+
+def ultimo_dia_mes(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def atualiza_resultados_mensais(user_id, meses, removidos=()):
+    """
+    Regrava os meses informados (primeiro dia) a partir das vendas em um
+    único INSERT ... ON CONFLICT (SQLite e PostgreSQL), que agrega e grava
+    no banco sem trazer os valores
+    Dos meses em removidos (de uma movimentação removida ou que mudou de
+    data), que podem ter ficado sem vendas, apaga as linhas sem venda
+    """
+    meses = set(meses) | set(removidos)
+    if not meses:
+        return
+    if removidos:
+        ResultadoMensal.objects.filter(
+            user_id=user_id, mes__in=removidos
+        ).exclude(Exists(
+            agrega_vendas_por_mes(Movimentacao.objects.filter(
+                user_id=OuterRef('user_id')
+            )).filter(mes=OuterRef('mes'))
+        )).delete()
+
+    vendas = agrega_vendas_por_mes(Movimentacao.objects.filter(
+        user_id=user_id,
+        data_movimentacao__gte=min(meses),
+        data_movimentacao__lte=ultimo_dia_mes(max(meses)),
+    ), 'user_id').order_by()
+    sql, parametros = vendas.query.sql_with_params()
+    conexao = transaction.get_connection()
+    quote = conexao.ops.quote_name
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            # WHERE TRUE: no SQLite, ON após SELECT seria lido como junção
+            'INSERT INTO {tabela} ({user}, {mes}, {lucro}, {prejuizo}) '
+            'SELECT user_id, mes, COALESCE(lucro, 0), COALESCE(-prejuizo, 0) '
+            'FROM ({sql}) vendas WHERE TRUE '
+            'ON CONFLICT ({user}, {mes}) DO UPDATE SET '
+            '{lucro} = excluded.{lucro}, {prejuizo} = excluded.{prejuizo}'.format(
+                tabela=quote(ResultadoMensal._meta.db_table),
+                sql=sql,
+                **{
+                    campo: quote(ResultadoMensal._meta.get_field(campo).column)
+                    for campo in ('user', 'mes', 'lucro', 'prejuizo')
+                }
+            ),
+            parametros
+        )
+
+
+def reconstroi_resultados_mensais(user_id=None, user_ids=None):
+    """
+    Refaz a tabela inteira (ou só do usuário, ou dos usuários em user_ids,
+    lista ou subconsulta) a partir das vendas, em uma consulta agrupada por
+    usuário e mês. Retorna a quantidade de linhas
+    """
+    vendas = Movimentacao.objects.all()
+    resultados = ResultadoMensal.objects.all()
+    usuarios = get_user_model().objects.all()
+    if user_id is not None:
+        vendas = vendas.filter(user_id=user_id)
+        resultados = resultados.filter(user_id=user_id)
+        usuarios = usuarios.filter(pk=user_id)
+    if user_ids is not None:
+        vendas = vendas.filter(user_id__in=user_ids)
+        resultados = resultados.filter(user_id__in=user_ids)
+        usuarios = usuarios.filter(pk__in=user_ids)
+
+    linhas = [
+        ResultadoMensal(
+            user_id=mes['user_id'],
+            mes=mes['mes'],
+            lucro=mes['lucro'] or 0,
+            prejuizo=-mes['prejuizo'] if mes['prejuizo'] else 0,
+        )
+        for mes in agrega_vendas_por_mes(vendas, 'user_id').order_by()
+    ]
+    with transaction.atomic(savepoint=False):
+        resultados.delete()
+        ResultadoMensal.objects.bulk_create(linhas, batch_size=2000)
+        # Invalida o gráfico em cache
+        usuarios.update(versao_carteira=F('versao_carteira') + 1)
+    return len(linhas)
@@ -0,0 +1,3 @@
+from .backends import FalhaAcesso, HttpBackend, SeleniumBackend, get_backend
+from .parser import Cotacao, ElementoNaoEncontrado, extrai_cotacao, extrai_preco
+from .cache import CachePaginas, PaginaInalterada
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+from django.conf import settings
+
+from .cache import CachePaginas, EntradaCache, PaginaInalterada, hash_conteudo
+from .drivers import get_pool
+from .parser import ElementoNaoEncontrado, extrai_cotacao
+
+
+URL_DETALHES = "{url_base}/detalhes.php?papel={ticker}"
+
+
+class FalhaAcesso(Exception):
+    """ Página da ação não pôde ser acessada """
+
+
+class BaseBackend:
+    """
+    Backend de busca de preços
+    busca_precos retorna dict ticker -> Cotacao ou exceção da falha
+    """
+
+    def busca_precos(self, tickers):
+        raise NotImplementedError
+
+    def fecha(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fecha()
+
+
+class HttpBackend(BaseBackend):
+    """
+    Busca as páginas em paralelo via HTTP, com pool de conexões keep-alive
+    limitado pela concorrência configurada
+    """
+
+    def __init__(self, concorrencia=None, timeout=None, url_base=None,
+                 cache=None):
+        self.concorrencia = concorrencia or settings.SCRAPER_CONCORRENCIA
+        self.url_base = url_base or settings.SCRAPER_URL_BASE
+        self.cache = cache
+        self.http = urllib3.PoolManager(
+            num_pools=2,
+            maxsize=self.concorrencia,
+            block=True,
+            timeout=timeout or settings.SCRAPER_TIMEOUT,
+            retries=urllib3.Retry(total=2, backoff_factor=0.3),
+            headers={'User-Agent': 'Mozilla/5.0 (django_bolsa)'},
+        )
+
+    def requisita(self, ticker, cabecalhos=None):
+        """ GET da página de detalhes da ação """
+        try:
+            resposta = self.http.request(
+                'GET', URL_DETALHES.format(url_base=self.url_base, ticker=ticker),
+                headers=cabecalhos
+            )
+        except urllib3.exceptions.HTTPError as e:
+            raise FalhaAcesso(str(e)) from e
+        if resposta.status not in (200, 304):
+            raise FalhaAcesso(f"HTTP {resposta.status}")
+        return resposta
+
+    def busca_preco(self, ticker):
+        try:
+            if self.cache is not None:
+                return self.busca_preco_cache(ticker)
+            return extrai_cotacao(self.requisita(ticker).data.decode('latin-1'))
+        except (FalhaAcesso, ElementoNaoEncontrado) as e:
+            return e
+
+    def busca_preco_cache(self, ticker):
+        """
+        Requisição condicional com os validadores do cache; página não
+        modificada ou com o mesmo conteúdo não é processada novamente
+        """
+        entrada = self.cache.obtem(ticker)
+        resposta = self.requisita(
+            ticker, entrada.cabecalhos() if entrada is not None else None
+        )
+        if entrada is not None and (
+            resposta.status == 304 or hash_conteudo(resposta.data) == entrada.hash
+        ):
+            self.cache.usa(ticker)
+            self.cache.registra(hit=True)
+            cotacao = entrada.cotacao()
+            return PaginaInalterada(cotacao.preco, cotacao.data)
+        if resposta.status == 304:
+            raise FalhaAcesso("HTTP 304 sem página em cache")
+
+        self.cache.registra(hit=False)
+        cotacao = extrai_cotacao(resposta.data.decode('latin-1'))
+        self.cache.grava(ticker, EntradaCache.da_cotacao(
+            cotacao,
+            etag=resposta.headers.get('ETag'),
+            last_modified=resposta.headers.get('Last-Modified'),
+            hash=hash_conteudo(resposta.data),
+        ), resposta.data)
+        return cotacao
+
+    def busca_precos(self, tickers):
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            resultados = dict(zip(tickers, executor.map(self.busca_preco, tickers)))
+        if self.cache is not None:
+            self.cache.remove_excedente()
+        return resultados
+
+    def fecha(self):
+        self.http.clear()
+
+
+class SeleniumBackend(BaseBackend):
+    """
+    Busca as páginas uma a uma com o Firefox headless, usando um driver
+    emprestado do pool do processo
+    """
+
+    def __init__(self, url_base=None, pool=None):
+        self.url_base = url_base or settings.SCRAPER_URL_BASE
+        self.pool = pool
+
+    def busca_precos(self, tickers):
+        """
+        O HTML da página é lido de uma vez e o preço extraído localmente.
+        Falha do driver interrompe a busca: o ticker atual e os restantes
+        retornam FalhaAcesso para serem tentados novamente pela task
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        pool = self.pool or get_pool()
+        resultados = {}
+        try:
+            with pool.driver() as entrada:
+                for posicao, ticker in enumerate(tickers):
+                    try:
+                        entrada.get(
+                            URL_DETALHES.format(url_base=self.url_base, ticker=ticker)
+                        )
+                        resultados[ticker] = extrai_cotacao(entrada.driver.page_source)
+                    except ElementoNaoEncontrado as e:
+                        resultados[ticker] = e
+                    except WebDriverException as e:
+                        entrada.valido = False
+                        for restante in tickers[posicao:]:
+                            resultados[restante] = FalhaAcesso(e.msg or str(e))
+                        break
+        except WebDriverException as e:
+            # Driver não pôde ser iniciado
+            for ticker in tickers:
+                resultados[ticker] = FalhaAcesso(e.msg or str(e))
+        return resultados
+
+
+BACKENDS = {
+    'http': HttpBackend,
+    'selenium': SeleniumBackend,
+}
+
+
+def get_backend(nome=None, **kwargs):
+    """ Instancia o backend configurado em SCRAPER_BACKEND """
+    nome = nome or settings.SCRAPER_BACKEND
+    if nome == 'http' and 'cache' not in kwargs and settings.SCRAPER_CACHE_DIRETORIO:
+        kwargs['cache'] = CachePaginas(
+            settings.SCRAPER_CACHE_DIRETORIO,
+            settings.SCRAPER_CACHE_TAMANHO_MAXIMO,
+        )
+    return BACKENDS[nome](**kwargs)
@@ -0,0 +1,134 @@
+"""
+Cache em disco das páginas buscadas, por ticker, com os validadores HTTP
+(ETag/Last-Modified) e o hash do conteúdo para identificar páginas que não
+mudaram desde a última busca
+"""
+import hashlib
+import json
+from datetime import date
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from .parser import Cotacao
+
+
+class EntradaCache:
+    """ data: data da cotação em ISO (ausente nas entradas antigas) """
+    __slots__ = ('etag', 'last_modified', 'hash', 'preco', 'data')
+
+    def __init__(self, etag=None, last_modified=None, hash=None, preco=None,
+                 data=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.hash = hash
+        self.preco = preco
+        self.data = data
+
+    @classmethod
+    def da_cotacao(cls, cotacao, **validadores):
+        return cls(
+            preco=cotacao.preco,
+            data=cotacao.data.isoformat() if cotacao.data else None,
+            **validadores
+        )
+
+    def cotacao(self):
+        try:
+            data = date.fromisoformat(self.data) if self.data else None
+        except (TypeError, ValueError):
+            data = None
+        return Cotacao(self.preco, data)
+
+    def cabecalhos(self):
+        """ Cabeçalhos da requisição condicional """
+        cabecalhos = {}
+        if self.etag:
+            cabecalhos['If-None-Match'] = self.etag
+        if self.last_modified:
+            cabecalhos['If-Modified-Since'] = self.last_modified
+        return cabecalhos
+
+
+class PaginaInalterada(Cotacao):
+    """
+    Cotação de página igual à do cache, que não precisa ser processada
+    """
+    __slots__ = ()
+
+
+def hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class CachePaginas:
+    """
+    Um arquivo por ticker: linha com os metadados em JSON seguida do corpo
+    da página. O tamanho total é limitado removendo os menos usados
+    """
+
+    def __init__(self, diretorio, tamanho_maximo):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def caminho(self, ticker):
+        return self.diretorio / f'{ticker}.cache'
+
+    def obtem(self, ticker):
+        try:
+            with open(self.caminho(ticker), 'rb') as arquivo:
+                return EntradaCache(**json.loads(arquivo.readline()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def grava(self, ticker, entrada, conteudo):
+        """ Grava de forma atômica, para processos concorrentes """
+        metadados = json.dumps({
+            campo: getattr(entrada, campo) for campo in EntradaCache.__slots__
+        }).encode()
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio)
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(metadados + b'\n' + conteudo)
+        os.replace(temporario, self.caminho(ticker))
+
+    def usa(self, ticker):
+        """ Atualiza data de uso da entrada para a remoção dos menos usados """
+        try:
+            os.utime(self.caminho(ticker))
+        except OSError:
+            pass
+
+    def registra(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def estatisticas(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def remove_excedente(self):
+        """ Remove as entradas usadas há mais tempo até caber no limite """
+        arquivos = []
+        for caminho in self.diretorio.glob('*.cache'):
+            try:
+                estado = caminho.stat()
+            except OSError:
+                continue
+            arquivos.append((estado.st_mtime, estado.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.tamanho_maximo:
+                break
+            try:
+                caminho.unlink()
+            except OSError:
+                pass
+            total -= tamanho
@@ -0,0 +1,148 @@
+"""
+Pool de drivers do Firefox headless reaproveitados entre as tasks de um
+mesmo processo do worker
+"""
+import queue
+import threading
+from contextlib import contextmanager
+
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.conf import settings
+
+
+def cria_driver_firefox():
+    """ Inicia o Firefox headless configurado no settings """
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+
+    options = Options()
+    options.headless = True
+    binary = FirefoxBinary(settings.PATH_BINARY_FIREFOX)
+
+    return webdriver.Firefox(
+        firefox_binary=binary,
+        executable_path=settings.PATH_DRIVER_FIREFOX,
+        options=options
+    )
+
+
+class DriverPooled:
+    """ Driver emprestado pelo pool, com contagem de páginas acessadas """
+    __slots__ = ('driver', 'paginas', 'valido')
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.paginas = 0
+        self.valido = True
+
+    def get(self, url):
+        self.paginas += 1
+        self.driver.get(url)
+
+
+class DriverPool:
+    """
+    Drivers criados sob demanda até `tamanho`, verificados antes de cada
+    empréstimo e reciclados após `max_paginas` páginas ou em caso de erro
+    """
+
+    def __init__(self, fabrica=cria_driver_firefox, tamanho=1, max_paginas=200,
+                 espera=300):
+        self.fabrica = fabrica
+        self.tamanho = tamanho
+        self.max_paginas = max_paginas
+        self.espera = espera
+        self.livres = queue.LifoQueue()
+        self.criados = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def driver(self):
+        entrada = self.obtem()
+        try:
+            yield entrada
+        except Exception:
+            entrada.valido = False
+            raise
+        finally:
+            self.devolve(entrada)
+
+    def obtem(self):
+        while True:
+            try:
+                entrada = self.livres.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    pode_criar = self.criados < self.tamanho
+                    if pode_criar:
+                        self.criados += 1
+                if not pode_criar:
+                    entrada = self.livres.get(timeout=self.espera)
+                else:
+                    try:
+                        return DriverPooled(self.fabrica())
+                    except Exception:
+                        with self.lock:
+                            self.criados -= 1
+                        raise
+            if self.saudavel(entrada):
+                return entrada
+            self.descarta(entrada)
+
+    def devolve(self, entrada):
+        if entrada.valido and entrada.paginas < self.max_paginas:
+            self.livres.put(entrada)
+        else:
+            self.descarta(entrada)
+
+    def saudavel(self, entrada):
+        """ Verifica se o navegador ainda responde """
+        try:
+            entrada.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def descarta(self, entrada):
+        with self.lock:
+            self.criados -= 1
+        try:
+            entrada.driver.quit()
+        except Exception:
+            pass
+
+    def encerra(self):
+        """ Fecha todos os drivers livres """
+        while True:
+            try:
+                self.descarta(self.livres.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Pool do processo atual, criado no primeiro uso """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool(
+                tamanho=settings.SCRAPER_DRIVERS_POR_PROCESSO,
+                max_paginas=settings.SCRAPER_DRIVER_MAX_PAGINAS,
+            )
+        return _pool
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def encerra_pool(**kwargs):
+    """ Fecha os navegadores quando o processo do worker é finalizado """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.encerra()
+            _pool = None
@@ -0,0 +1,141 @@
+"""
+Extração do preço a partir do HTML da página de detalhes do fundamentus,
+independente do backend que obteve a página
+"""
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+
+CLASSES_CELULA_PRECO = {'data', 'destaque', 'w3'}
+
+# Ao menos um dígito: "," ou "." sozinhos não são preço
+REGEX_VALOR = re.compile(r'\d[\d.,]*')
+
+REGEX_PRECO = re.compile(
+    r'<td class="data destaque w3">\s*<span class="txt">(\d[\d.,]*)</span>'
+)
+
+
+# Data do pregão da cotação, na célula seguinte ao rótulo "Data últ cot"
+REGEX_DATA_COTACAO = re.compile(
+    r'Data .lt cot</span></td>\s*<td[^>]*>\s*<span[^>]*>\s*(\d{2}/\d{2}/\d{4})'
+)
+
+
+class ElementoNaoEncontrado(Exception):
+    """ Página acessada, mas sem o elemento com o preço da ação """
+
+
+class Cotacao:
+    """
+    Preço tratado extraído da página e a data do pregão a que se refere
+    (None se a página não a informar)
+    """
+    __slots__ = ('preco', 'data')
+
+    def __init__(self, preco, data=None):
+        self.preco = preco
+        self.data = data
+
+    def __str__(self):
+        return str(self.preco)
+
+
+def trata_valor(valor):
+    """ Converte valor no formato brasileiro (1.234,56) para 1234.56 """
+    return valor.strip().replace('.', '').replace(',', '.')
+
+
+class _Encontrado(Exception):
+    pass
+
+
+class PrecoParser(HTMLParser):
+    """
+    Percorre o HTML até o <span> da célula de cotação dentro da tabela w728
+    e interrompe a leitura assim que o valor é encontrado
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.na_tabela = False
+        self.na_celula = False
+        self.no_valor = False
+        self.texto = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.na_tabela = 'w728' in classes(attrs)
+        elif tag == 'td' and self.na_tabela:
+            self.na_celula = CLASSES_CELULA_PRECO <= classes(attrs)
+        elif tag == 'span' and self.na_celula:
+            self.no_valor = True
+
+    def handle_data(self, data):
+        if self.no_valor:
+            self.texto.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'span' and self.no_valor:
+            raise _Encontrado()
+        if tag == 'td':
+            self.na_celula = False
+        elif tag == 'table':
+            self.na_tabela = False
+
+
+def classes(attrs):
+    for nome, valor in attrs:
+        if nome == 'class':
+            return set((valor or '').split())
+    return set()
+
+
+def extrai_preco_html(html):
+    """ Extrai o preço com o parser de HTML da biblioteca padrão """
+    parser = PrecoParser()
+    try:
+        parser.feed(html)
+    except _Encontrado:
+        valor = ''.join(parser.texto).strip()
+        if REGEX_VALOR.fullmatch(valor):
+            return trata_valor(valor)
+    raise ElementoNaoEncontrado()
+
+
+def extrai_preco_regex(html):
+    """ Extrai o preço por expressão regular sobre o layout atual da página """
+    encontrado = REGEX_PRECO.search(html)
+    if encontrado is None:
+        raise ElementoNaoEncontrado()
+    return trata_valor(encontrado.group(1))
+
+
+PARSERS = {
+    'html': extrai_preco_html,
+    'regex': extrai_preco_regex,
+}
+
+
+def extrai_preco(html):
+    """ Extrai o preço com o parser configurado em SCRAPER_PARSER """
+    return PARSERS[settings.SCRAPER_PARSER](html)
+
+
+def extrai_data_cotacao(html):
+    """ Data da última cotação informada na página, ou None """
+    encontrada = REGEX_DATA_COTACAO.search(html)
+    if encontrada is None:
+        return None
+    try:
+        return datetime.strptime(encontrada.group(1), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+def extrai_cotacao(html):
+    """ Preço (pelo parser configurado) e data da cotação da página """
+    return Cotacao(extrai_preco(html), extrai_data_cotacao(html))
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from acoes.models import Acao, AcaoPrecoHistorico
+
+
+TAMANHO_LOTE = 500
+
+
+def converte_preco(preco):
+    """ Preço tratado como Decimal, ou None se não for um número """
+    try:
+        preco = Decimal(preco)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return preco if preco.is_finite() else None
+
+
+def pregao_anterior(data):
+    """
+    Último dia útil antes da data (sem considerar feriados): a data da
+    cotação quando a página não a informa, já que as buscas rodam antes do
+    fechamento nos dias úteis e na varredura de sábado
+    """
+    data -= timedelta(days=1)
+    while data.weekday() >= 5:
+        data -= timedelta(days=1)
+    return data
+
+
+def salva_precos(acoes, cotacoes):
+    """
+    Grava em lote somente os preços que mudaram, marca todas as ações
+    consultadas como verificadas e registra o preço no histórico na data
+    da cotação (ou no pregão anterior, se a página não a informar)
+    Preço alterado muda data_hora_atualizacao, a versão dos preços do
+    cache do dashboard
+    acoes: dict ticker -> Acao, cotacoes: dict ticker -> Cotacao
+    Preço que não é um número não interrompe o lote: o ticker fica fora da
+    gravação e é devolvido entre os inválidos
+    Retorna (tickers com preço alterado, tickers com preço inválido)
+    """
+    agora = timezone.now()
+    sem_data = pregao_anterior(timezone.localdate())
+    alteradas = []
+    invalidos = set()
+    historico = defaultdict(dict)
+    for ticker, cotacao in cotacoes.items():
+        acao = acoes[ticker]
+        preco = converte_preco(cotacao.preco)
+        if preco is None:
+            invalidos.add(ticker)
+            continue
+        if acao.preco != preco:
+            acao.preco = preco
+            acao.data_hora_atualizacao = agora
+            alteradas.append(acao)
+        historico[cotacao.data or sem_data][acao.pk] = acao.preco
+
+    with transaction.atomic():
+        if alteradas:
+            Acao.objects.bulk_update(
+                alteradas, ['preco', 'data_hora_atualizacao'],
+                batch_size=TAMANHO_LOTE
+            )
+        if historico:
+            Acao.objects.filter(pk__in=[
+                acao_id for precos in historico.values() for acao_id in precos
+            ]).update(data_hora_verificacao=agora)
+            for data, precos in historico.items():
+                registra_historico(precos, data)
+
+    return {acao.ticker for acao in alteradas}, invalidos
+
+
+def registra_historico(precos, data):
+    """
+    Upsert em lote do preço do dia no histórico
+    precos: dict acao_id -> preço
+    """
+    existentes = {
+        acao_id: (pk, preco) for pk, acao_id, preco in
+        AcaoPrecoHistorico.objects.filter(
+            data=data, acao_id__in=list(precos)
+        ).values_list('pk', 'acao_id', 'preco')
+    }
+
+    novos, alterados = [], []
+    for acao_id, preco in precos.items():
+        if acao_id not in existentes:
+            novos.append(
+                AcaoPrecoHistorico(acao_id=acao_id, data=data, preco=preco)
+            )
+        elif existentes[acao_id][1] != preco:
+            alterados.append(
+                AcaoPrecoHistorico(pk=existentes[acao_id][0], preco=preco)
+            )
+
+    AcaoPrecoHistorico.objects.bulk_create(
+        novos, batch_size=TAMANHO_LOTE, ignore_conflicts=True
+    )
+    AcaoPrecoHistorico.objects.bulk_update(
+        alterados, ['preco'], batch_size=TAMANHO_LOTE
+    )
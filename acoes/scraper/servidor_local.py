@@ -0,0 +1,97 @@
+"""
+Servidor HTTP local que simula o fundamentus servindo páginas gravadas,
+usado nos testes e benchmarks do scraper
+"""
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from .parser import REGEX_PRECO
+
+
+DIRETORIO_PAGINAS = Path(__file__).resolve().parent / 'paginas'
+PAGINA_MODELO = 'COGN3'
+
+
+class PaginasHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        ticker = parse_qs(url.query).get('papel', [''])[0].upper()
+        if url.path != '/detalhes.php' or not ticker:
+            return self.responde(404, b'')
+
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+
+        corpo = self.server.pagina(ticker)
+        if corpo is None:
+            return self.responde(404, b'')
+        self.server.requisicoes += 1
+
+        if not self.server.etag:
+            return self.responde(200, corpo)
+        etag = f'"{zlib.crc32(corpo):08x}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.responde(304, b'', etag=etag)
+        return self.responde(200, corpo, etag=etag)
+
+    def responde(self, status, corpo, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=ISO-8859-1')
+        self.send_header('Content-Length', str(len(corpo)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorPaginas(ThreadingHTTPServer):
+    """
+    Serve <diretorio>/<TICKER>.html; com sintetico=True gera páginas para
+    tickers sem gravação a partir de uma página modelo com preço determinístico
+    e com etag=True responde requisições condicionais (If-None-Match)
+    """
+    daemon_threads = True
+
+    def __init__(self, endereco, diretorio=None, latencia=0, sintetico=False,
+                 etag=False):
+        super().__init__(endereco, PaginasHandler)
+        self.diretorio = Path(diretorio or DIRETORIO_PAGINAS)
+        self.latencia = latencia
+        self.sintetico = sintetico
+        self.etag = etag
+        self.requisicoes = 0
+        self.modelo = (self.diretorio / f'{PAGINA_MODELO}.html').read_bytes()
+
+    def pagina(self, ticker):
+        arquivo = self.diretorio / f'{ticker}.html'
+        if arquivo.exists():
+            return arquivo.read_bytes()
+        if not self.sintetico:
+            return None
+        centavos = zlib.crc32(ticker.encode()) % 10000 + 100
+        preco = f'{centavos // 100},{centavos % 100:02d}'
+        modelo = self.modelo.decode('latin-1').replace(PAGINA_MODELO, ticker)
+        inicio, fim = REGEX_PRECO.search(modelo).span(1)
+        return (modelo[:inicio] + preco + modelo[fim:]).encode('latin-1')
+
+    @property
+    def url_base(self):
+        host, porta = self.server_address[:2]
+        return f'http://{host}:{porta}'
+
+
+def inicia_servidor(porta=0, **kwargs):
+    """ Inicia o servidor em uma thread e retorna a instância """
+    servidor = ServidorPaginas(('127.0.0.1', porta), **kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
@@ -1,56 +1,132 @@
-from celery import shared_task
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import (
-    NoSuchElementException, WebDriverException
-)
-from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+from celery import chord, group, shared_task
+from django.conf import settings
 
 from acoes.models import Acao
-from setup.settings import PATH_DRIVER_FIREFOX, PATH_BINARY_FIREFOX
+from acoes.scraper import (
+    Cotacao, ElementoNaoEncontrado, FalhaAcesso, PaginaInalterada,
+    SeleniumBackend, get_backend,
+)
+from acoes.scraper.persistencia import salva_precos
 
 
-@shared_task(bind=True, max_retries=3)
-def task_scrap_acoes_dia_anterior(self):
-    """ Busca ações cadastradas e atualiza seu preço """
-    options = Options()
-    options.headless = True
-    binary = FirefoxBinary(PATH_BINARY_FIREFOX)
-
-    driver = webdriver.Firefox(
-        firefox_binary=binary,
-        executable_path=PATH_DRIVER_FIREFOX,
-        options=options
-    )
+MODO_EM_CARTEIRA = 'em_carteira'
+MODO_TODAS = 'todas'
+
+# Chave do feedback com os acertos/erros do cache de páginas
+CHAVE_CACHE = 'cache'
+
+
+def divide_em_lotes(itens, tamanho):
+    """ Divide lista em lotes de até `tamanho` itens """
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
 
+def tickers_com_falha(resultados):
+    """ Tickers cuja página não pôde ser acessada """
+    return [
+        ticker for ticker, resultado in resultados.items()
+        if isinstance(resultado, FalhaAcesso)
+    ]
+
+
+def soma_estatisticas(*estatisticas):
+    """ Soma contadores de hits/misses do cache """
+    return {
+        chave: sum(e.get(chave, 0) for e in estatisticas)
+        for chave in ('hits', 'misses')
+    }
+
+
+@shared_task
+def task_scrap_acoes_dia_anterior(modo=MODO_EM_CARTEIRA):
+    """
+    Coordenador: divide os tickers em lotes, processados em paralelo por
+    qualquer worker, e consolida o feedback ao final
+    modo 'em_carteira' busca somente ações que algum usuário possui e
+    'todas' faz a varredura completa das ações cadastradas
+    """
     acoes = Acao.objects.all()
+    if modo == MODO_EM_CARTEIRA:
+        acoes = acoes.filter(em_carteira=True)
+    tickers = list(acoes.order_by('ticker').values_list('ticker', flat=True))
+    lotes = divide_em_lotes(tickers, settings.SCRAPER_TAMANHO_LOTE)
+    if lotes:
+        chord(
+            group(task_scrap_lote.s(lote) for lote in lotes)
+        )(task_consolida_feedback.s())
 
-    feedback = {}
-    for acao in acoes:
-        try:
-            driver.get(
-                f"https://www.fundamentus.com.br/detalhes.php?papel={acao}"
-            )
-            row = driver.find_element(
-                By.XPATH,
-                "//table[@class='w728']/tbody/tr//td[@class='data destaque w3']/span"
-            )
-            valor_acao = row.text
-            
-            # Trata e salva novo valor
-            valor_tratado = valor_acao.replace(',','.')
-            acao.preco = valor_tratado
-            acao.save()
-            mensagem = f"atualizada para: {valor_tratado}"
-            feedback[acao.ticker]= mensagem
-        except NoSuchElementException:
+    return {'tickers': len(tickers), 'lotes': len(lotes)}
+
+
+@shared_task(bind=True, max_retries=3)
+def task_scrap_lote(self, tickers, feedback=None):
+    """
+    Busca ações do lote e atualiza seu preço
+    O feedback dos tickers já atualizados é repassado no retry, que processa
+    somente os tickers que falharam, com espera exponencial
+    """
+    feedback = feedback or {}
+    acoes = {acao.ticker: acao for acao in Acao.objects.filter(ticker__in=tickers)}
+
+    with get_backend() as backend:
+        resultados = backend.busca_precos(list(acoes))
+
+    # Selenium somente como fallback das páginas que o backend não acessou
+    falhas = tickers_com_falha(resultados)
+    if (falhas and settings.SCRAPER_FALLBACK_SELENIUM
+            and not isinstance(backend, SeleniumBackend)):
+        with SeleniumBackend() as fallback:
+            resultados.update(fallback.busca_precos(falhas))
+        falhas = tickers_com_falha(resultados)
+
+    # Página inalterada não é processada de novo, mas o preço do cache
+    # ainda é conferido com o do banco e a ação é marcada como verificada
+    cotacoes = {
+        ticker: resultado for ticker, resultado in resultados.items()
+        if isinstance(resultado, Cotacao)
+    }
+    alteradas, invalidos = salva_precos(acoes, cotacoes)
+
+    for ticker, resultado in resultados.items():
+        if isinstance(resultado, ElementoNaoEncontrado):
             mensagem = f"Elemento não encontrado para ação"
-            feedback[acao.ticker]= mensagem
-        except WebDriverException as e:
-            self.retry(exc=e, countdown=15)
-            return 'Erro ao acessar a página'
-    driver.quit()
-            
+        elif isinstance(resultado, FalhaAcesso):
+            mensagem = f"Erro ao acessar a página: {resultado}"
+        elif ticker in invalidos:
+            mensagem = f"Preço inválido: {resultado}"
+        elif ticker in alteradas:
+            mensagem = f"atualizada para: {resultado}"
+        elif isinstance(resultado, PaginaInalterada):
+            mensagem = f"página sem alteração: {resultado}"
+        else:
+            mensagem = f"sem alteração: {resultado}"
+        feedback[ticker] = mensagem
+
+    cache = getattr(backend, 'cache', None)
+    if cache is not None:
+        feedback[CHAVE_CACHE] = soma_estatisticas(
+            feedback.get(CHAVE_CACHE, {}), cache.estatisticas()
+        )
+
+    if falhas and self.request.retries < self.max_retries:
+        raise self.retry(
+            args=(falhas,),
+            kwargs={'feedback': feedback},
+            countdown=settings.SCRAPER_RETRY_ESPERA * 2 ** self.request.retries,
+        )
+
     return feedback
 
+
+@shared_task
+def task_consolida_feedback(feedbacks):
+    """ Junta o feedback por ticker de todos os lotes """
+    feedback = {}
+    for feedback_lote in feedbacks:
+        feedback_lote = dict(feedback_lote)
+        if CHAVE_CACHE in feedback_lote:
+            feedback[CHAVE_CACHE] = soma_estatisticas(
+                feedback.get(CHAVE_CACHE, {}), feedback_lote.pop(CHAVE_CACHE)
+            )
+        feedback.update(feedback_lote)
+    return feedback
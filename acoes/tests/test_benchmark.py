@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from io import StringIO
+import json
+import os
+import tempfile
+
+from acoes.benchmark import mede, percentil
+
+
+# Consultas por requisição das views, em qualquer tamanho de base; um
+# aumento aqui costuma ser uma consulta por linha (N+1). Com a variável
+# BENCHMARK_ORCAMENTO apontando para um JSON no mesmo formato, os limites
+# (inclusive de latência, ms_p95) são lidos dele
+ORCAMENTO = {
+    'dashboard': {'consultas': 4},
+    'dashboard_cache': {'consultas': 3},
+    'lucro_prejuizo_mes_chart': {'consultas': 3},
+    'movimentacoes': {'consultas': 3},
+    'cria_movimentacao_compra': {'consultas': 10},
+    'cria_movimentacao_venda': {'consultas': 12},
+    'cria_acao': {'consultas': 4},
+}
+
+
+class BenchmarkViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+
+    def arquivo(self, nome, conteudo=None):
+        caminho = os.path.join(self.diretorio.name, nome)
+        if conteudo is not None:
+            with open(caminho, 'w') as saida:
+                json.dump(conteudo, saida)
+        return caminho
+
+    def executa(self, orcamento):
+        call_command(
+            'benchmark_views', '--movimentacoes', '20', '200',
+            '--usuarios', '3', '--tickers', '10', '--repeticoes', '3',
+            '--saida', self.arquivo('resultados.json'),
+            '--orcamento', orcamento, stdout=StringIO()
+        )
+
+    def test_orcamento(self):
+        """ Todas as views dentro do orçamento, nas duas bases """
+        orcamento = os.environ.get('BENCHMARK_ORCAMENTO') or self.arquivo(
+            'orcamento.json', ORCAMENTO
+        )
+        self.executa(orcamento)
+
+        with open(self.arquivo('resultados.json')) as entrada:
+            resultados = json.load(entrada)
+        self.assertEqual(len(resultados), 2 * len(ORCAMENTO))
+        self.assertEqual(
+            {resultado['medida'] for resultado in resultados}, set(ORCAMENTO)
+        )
+        self.assertEqual(
+            sorted({resultado['movimentacoes_total'] for resultado in resultados}),
+            [60, 600]
+        )
+        for resultado in resultados:
+            self.assertLessEqual(resultado['ms_p50'], resultado['ms_p95'])
+
+    def test_preserva_cache(self):
+        """ Só as chaves do usuário de carga saem do cache """
+        cache.set('outra_chave', 1)
+        self.addCleanup(cache.delete, 'outra_chave')
+        self.executa(self.arquivo('orcamento.json', ORCAMENTO))
+        self.assertEqual(cache.get('outra_chave'), 1)
+
+    def test_orcamento_ultrapassado(self):
+        orcamento = self.arquivo('orcamento.json', {'dashboard': {'consultas': 1}})
+        with self.assertRaisesMessage(
+            CommandError, 'dashboard (20 movimentações por usuário): consultas 4 > 1'
+        ):
+            self.executa(orcamento)
+
+    def test_orcamento_invalido(self):
+        orcamento = self.arquivo('orcamento.json', {'dashboard': {'ms_p99': 1}})
+        with self.assertRaisesMessage(CommandError, 'limites devem ser de'):
+            self.executa(orcamento)
+
+
+class MedidaTestCase(TestCase):
+
+    def test_percentil(self):
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50.5)
+        self.assertAlmostEqual(percentil(valores, 95), 95.05)
+        self.assertEqual(percentil([7], 95), 7)
+
+    def test_mede(self):
+        preparos = []
+        resultado = mede(lambda: None, 5, prepara=lambda: preparos.append(1))
+        self.assertEqual(len(preparos), 5)
+        self.assertEqual(resultado['consultas'], 0)
+        self.assertLessEqual(resultado['ms_p95'], resultado['ms_max'])
@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.test import TestCase
+
+from datetime import date
+from io import StringIO
+
+from acoes.carga import gera_dados_carga, remove_dados_carga, ticker_carga
+from acoes.models import Acao, Carteira, Movimentacao, ResultadoMensal
+
+
+User = get_user_model()
+
+
+class DadosCargaTestCase(TestCase):
+
+    def gera(self, semente=1):
+        return gera_dados_carga(
+            usuarios=4, tickers=8, movimentacoes=120, anos=3,
+            fim=date(2022, 12, 31), semente=semente
+        )
+
+    def ledger(self):
+        return list(Movimentacao.objects.order_by(
+            'user__email', 'data_movimentacao', 'id'
+        ).values_list(
+            'user__email', 'acao__ticker', 'data_movimentacao', 'tipo',
+            'quantidade', 'preco'
+        ))
+
+    def test_gera_dados(self):
+        gerados = self.gera()
+        self.assertEqual(gerados['usuarios'], 4)
+        self.assertEqual(gerados['acoes'], 8)
+        self.assertEqual(gerados['movimentacoes'], 480)
+        self.assertEqual(Movimentacao.objects.count(), 480)
+        self.assertEqual(Carteira.objects.count(), gerados['carteiras'])
+        self.assertEqual(
+            ResultadoMensal.objects.count(), gerados['resultados_mensais']
+        )
+        user = User.objects.get(email='carga000000@carga.teste')
+        self.assertTrue(user.check_password('carga'))
+
+        datas = Movimentacao.objects.dates('data_movimentacao', 'year')
+        self.assertEqual(
+            [data.year for data in datas], [2019, 2020, 2021, 2022]
+        )
+        vendas = Movimentacao.objects.filter(tipo='V')
+        # Vendas parciais e vendas que zeram a posição
+        self.assertTrue(vendas.filter(quantidade_posicao=0).exists())
+        self.assertTrue(vendas.filter(quantidade_posicao__gt=0).exists())
+
+    def test_carteiras_consistentes(self):
+        """ Carteira = compras - vendas, com a posição gravada na última movimentação """
+        self.gera()
+        saldos = Movimentacao.objects.values('user_id', 'acao_id').annotate(
+            saldo=Sum('quantidade', filter=Q(tipo='C'))
+            - Coalesce(Sum('quantidade', filter=Q(tipo='V')), 0),
+        )
+        for saldo in saldos:
+            carteira = Carteira.objects.filter(
+                user_id=saldo['user_id'], acao_id=saldo['acao_id']
+            ).first()
+            self.assertEqual(carteira.quantidade if carteira else 0, saldo['saldo'])
+            ultima = Movimentacao.objects.filter(
+                user_id=saldo['user_id'], acao_id=saldo['acao_id']
+            ).latest('data_movimentacao', 'id')
+            self.assertEqual(ultima.quantidade_posicao, saldo['saldo'])
+        self.assertEqual(
+            set(Acao.objects.filter(em_carteira=True).values_list('pk', flat=True)),
+            set(Carteira.objects.values_list('acao_id', flat=True))
+        )
+
+    def test_deterministico(self):
+        self.gera()
+        ledger = self.ledger()
+        remove_dados_carga()
+        self.assertFalse(Movimentacao.objects.exists())
+        self.assertFalse(Acao.objects.exists())
+        self.gera()
+        self.assertEqual(self.ledger(), ledger)
+        remove_dados_carga()
+        self.gera(semente=2)
+        self.assertNotEqual(self.ledger(), ledger)
+
+    def test_remove_preserva_outros_dados(self):
+        acao = Acao.objects.create(ticker='COGN3', preco=10)
+        # Recibo de subscrição, sem movimentações: não é ação de carga
+        recibo = Acao.objects.create(ticker='AAAA9', preco=1)
+        user = User.objects.create_user(email='teste@teste.com', password='senha')
+        Movimentacao.objects.create(
+            acao=acao, user=user, data_movimentacao='2022-01-10', tipo='C',
+            preco=10, quantidade=100
+        )
+        self.gera()
+        remove_dados_carga()
+        self.assertEqual(list(User.objects.all()), [user])
+        self.assertEqual(list(Acao.objects.order_by('pk')), [acao, recibo])
+        self.assertEqual(Carteira.objects.get().quantidade, 100)
+
+    def test_gera_preserva_outros_usuarios(self):
+        """ Resultados mensais e versão da carteira de outros usuários intactos """
+        user = User.objects.create_user(email='teste@teste.com', password='senha')
+        resultado = ResultadoMensal.objects.create(
+            user=user, mes=date(2021, 1, 1), lucro=1
+        )
+        self.gera()
+        self.assertTrue(ResultadoMensal.objects.filter(pk=resultado.pk).exists())
+        user.refresh_from_db()
+        self.assertEqual(user.versao_carteira, 0)
+
+    def test_ticker_carga(self):
+        self.assertEqual(ticker_carga(0), '_AAAA')
+        self.assertEqual(ticker_carga(27), '_AABB')
+
+    def test_comando(self):
+        argumentos = [
+            'gera_dados_carga', '--usuarios', '2', '--tickers', '5',
+            '--movimentacoes', '50', '--fim', '2022-12-31',
+        ]
+        saida = StringIO()
+        call_command(*argumentos, stdout=saida)
+        self.assertIn('2 usuários, 5 ações, 100 movimentações', saida.getvalue())
+
+        with self.assertRaisesMessage(CommandError, '--limpa'):
+            call_command(*argumentos, stdout=StringIO())
+        call_command(*argumentos, '--limpa', stdout=StringIO())
+        self.assertEqual(Movimentacao.objects.count(), 100)
+        self.assertEqual(User.objects.count(), 2)
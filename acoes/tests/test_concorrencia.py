@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import os
+import random
+import sys
+import time
+
+from acoes.models import Acao, Carteira, Movimentacao
+
+
+User = get_user_model()
+
+
+class CarteiraConcorrenciaTestCase(TransactionTestCase):
+    """
+    Movimentações simultâneas na mesma carteira, cada uma em sua conexão.
+    O SQLite recusa escritas concorrentes com OperationalError em vez de
+    aguardar o lock, então a operação é repetida até ser gravada
+    Com a variável BENCHMARK_CONCORRENCIA definida, a vazão (movimentações
+    por segundo) de cada teste é informada
+    """
+    THREADS = 4
+    OPERACOES_POR_THREAD = 20
+
+    def setUp(self):
+        self.acao = Acao.objects.create(ticker='COGN3', preco=10.00)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+
+    def movimenta(self, tipo, preco, quantidade):
+        while True:
+            try:
+                return Movimentacao.objects.create(
+                    acao=self.acao, user=self.user, data_movimentacao='2022-01-17',
+                    tipo=tipo, preco=preco, preco_medio_venda=preco,
+                    quantidade=quantidade
+                )
+            except OperationalError:
+                time.sleep(random.uniform(0, 0.005))
+
+    def executa(self, operacoes):
+        def trabalho(lote):
+            try:
+                for operacao in lote:
+                    self.movimenta(*operacao)
+            finally:
+                connection.close()
+
+        lotes = [operacoes[i::self.THREADS] for i in range(self.THREADS)]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            list(executor.map(trabalho, lotes))
+        segundos = time.perf_counter() - inicio
+        if os.environ.get('BENCHMARK_CONCORRENCIA'):
+            sys.stderr.write(
+                f"\n{self._testMethodName}: {len(operacoes)} movimentações em "
+                f"{segundos:.2f}s ({len(operacoes) / segundos:.0f}/s)\n"
+            )
+
+    def test_compras_simultaneas(self):
+        """ Compras simultâneas não perdem atualização da carteira """
+        operacoes = [
+            ('C', Decimal('10.00') + i % 7, 10)
+            for i in range(self.THREADS * self.OPERACOES_POR_THREAD)
+        ]
+        self.executa(operacoes)
+
+        carteira = Carteira.objects.get(user=self.user, acao=self.acao)
+        valor_investido = sum(preco * quantidade for _, preco, quantidade in operacoes)
+        quantidade = sum(quantidade for _, _, quantidade in operacoes)
+        self.assertEqual(carteira.quantidade, quantidade)
+        self.assertEqual(carteira.valor_investido, valor_investido)
+        self.assertEqual(
+            carteira.preco_medio,
+            (valor_investido / quantidade).quantize(Decimal('0.01'))
+        )
+        self.assertEqual(
+            Movimentacao.objects.count(), len(operacoes)
+        )
+
+    def test_compras_e_vendas_simultaneas(self):
+        """ Compras e vendas simultâneas terminam com a quantidade correta """
+        self.movimenta('C', Decimal('10.00'), 1000)
+        operacoes = [
+            ('C', Decimal('10.00'), 10) if i % 2 else ('V', Decimal('12.00'), 5)
+            for i in range(self.THREADS * self.OPERACOES_POR_THREAD)
+        ]
+        self.executa(operacoes)
+
+        carteira = Carteira.objects.get(user=self.user, acao=self.acao)
+        quantidade = 1000 + sum(
+            quantidade if tipo == 'C' else -quantidade
+            for tipo, _, quantidade in operacoes
+        )
+        self.assertEqual(carteira.quantidade, quantidade)
+        self.assertEqual(carteira.preco_medio, Decimal('10.00'))
+        self.assertEqual(carteira.valor_investido, quantidade * Decimal('10.00'))
@@ -0,0 +1,90 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+import os
+import tempfile
+import zipfile
+
+from acoes.models import Acao, AcaoPrecoHistorico
+
+
+def linha_cotahist(ticker, data, preco, tipo_mercado='010', tipo_registro='01'):
+    """ Monta registro de cotação no layout de posições fixas da B3 """
+    centavos = int(round(preco * 100))
+    linha = (
+        tipo_registro + data + '02' + ticker.ljust(12) + tipo_mercado
+        + 'EMPRESA'.ljust(12) + 'ON NM'.ljust(10) + ' ' * 3 + 'R$'.ljust(4)
+        + f'{centavos:013d}' * 5
+    )
+    return linha.ljust(245) + '\r\n'
+
+
+class ImportaCotahistTestCase(TestCase):
+
+    def setUp(self):
+        self.acao = Acao.objects.create(ticker='COGN3', preco=2.14)
+        self.linhas = [
+            '00COTAHIST.2022BOVESPA 20220131'.ljust(245) + '\r\n',
+            linha_cotahist('COGN3', '20220117', 2.14),
+            linha_cotahist('COGN3', '20220118', 2.20),
+            linha_cotahist('COGN3', '20220118', 2.99, tipo_mercado='070'),
+            linha_cotahist('PETR4', '20220117', 32.35),
+            '99COTAHIST.2022BOVESPA 20220131'.ljust(245) + '\r\n',
+        ]
+        self.diretorio = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.diretorio.cleanup()
+
+    def grava_txt(self):
+        caminho = os.path.join(self.diretorio.name, 'COTAHIST_A2022.TXT')
+        with open(caminho, 'w', encoding='latin-1') as arquivo:
+            arquivo.writelines(self.linhas)
+        return caminho
+
+    def importa(self, caminho):
+        saida = StringIO()
+        call_command('importa_cotahist', caminho, '--lote', '1', stdout=saida)
+        return saida.getvalue()
+
+    def assertHistorico(self):
+        historico = AcaoPrecoHistorico.objects.filter(
+            acao=self.acao
+        ).order_by('data').values_list('data', 'preco')
+        self.assertEqual(list(historico), [
+            (date(2022, 1, 17), Decimal('2.14')),
+            (date(2022, 1, 18), Decimal('2.20')),
+        ])
+
+    def test_importa_txt(self):
+        """ Importa somente cotações à vista de ações cadastradas """
+        saida = self.importa(self.grava_txt())
+        self.assertIn('2 registros inseridos de 2 lidos', saida)
+        self.assertIn('registros/s', saida)
+        self.assertHistorico()
+
+    def test_importa_zip(self):
+        """ Arquivo compactado é lido em streaming """
+        caminho = os.path.join(self.diretorio.name, 'COTAHIST_A2022.ZIP')
+        with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+            arquivo_zip.write(self.grava_txt(), 'COTAHIST_A2022.TXT')
+        self.importa(caminho)
+        self.assertHistorico()
+
+    def test_reimportacao_ignora_existentes(self):
+        """ Importar o mesmo arquivo novamente não duplica registros """
+        caminho = self.grava_txt()
+        self.importa(caminho)
+        saida = self.importa(caminho)
+        self.assertIn('0 registros inseridos de 2 lidos', saida)
+        self.assertHistorico()
+
+    def test_arquivo_vazio(self):
+        """ Arquivo vazio não tem cotações """
+        self.linhas = []
+        saida = self.importa(self.grava_txt())
+        self.assertIn('0 registros inseridos de 0 lidos', saida)
+        self.assertFalse(AcaoPrecoHistorico.objects.exists())
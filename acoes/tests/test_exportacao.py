@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.urls import reverse
+
+from decimal import Decimal
+from io import BytesIO, StringIO
+import csv
+import zipfile
+
+from acoes.exportacao import COLUNAS_EXPORTACAO, gera_csv, linhas_movimentacoes
+from acoes.importacao import importa_movimentacoes
+from acoes.models import Acao, Movimentacao
+
+
+User = get_user_model()
+
+
+class ExportacaoTestCase(TestCase):
+
+    def setUp(self):
+        self.acao = Acao.objects.create(ticker='COGN3', preco=10.00)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+        self.outro = User.objects.create_user(
+            email='outro@teste.com', password='senha_secreta'
+        )
+        for user, data, tipo, preco, quantidade in (
+            (self.user, '2022-01-10', 'C', '10.00', 100),
+            (self.user, '2022-01-20', 'V', '15.00', 40),
+            (self.outro, '2022-01-15', 'C', '1.00', 1),
+        ):
+            Movimentacao.objects.create(
+                acao=self.acao, user=user, data_movimentacao=data, tipo=tipo,
+                preco=Decimal(preco), quantidade=quantidade
+            )
+        self.url = reverse('exporta_movimentacoes')
+        self.client.login(email=self.user.email, password='senha_secreta')
+
+    def conteudo(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content)
+
+    def test_exporta_csv(self):
+        """ Histórico do usuário em ordem, só do usuário """
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = list(csv.reader(StringIO(self.conteudo(response).decode())))
+        self.assertEqual(linhas, [
+            list(COLUNAS_EXPORTACAO),
+            ['2022-01-10', 'COGN3', 'C', '100', '10.00', '1000.00', '0.00', '0.00', '0.00'],
+            ['2022-01-20', 'COGN3', 'V', '40', '15.00', '600.00', '10.00', '400.00', '200.00'],
+        ])
+
+    def test_csv_pode_ser_importado(self):
+        """ O CSV exportado é aceito pela importação """
+        conteudo = self.conteudo(self.client.get(self.url)).decode()
+        Movimentacao.objects.filter(user=self.user).delete()
+        importadas, _ = importa_movimentacoes(StringIO(conteudo), self.user)
+        self.assertEqual(importadas, 2)
+        self.assertEqual(
+            Movimentacao.objects.get(user=self.user, tipo='V').resultado,
+            Decimal('200.00')
+        )
+
+    def test_exporta_xlsx(self):
+        """ Planilha válida com cabeçalho, datas e valores """
+        response = self.client.get(self.url, {'formato': 'xlsx'})
+        arquivo = zipfile.ZipFile(BytesIO(self.conteudo(response)))
+        self.assertIsNone(arquivo.testzip())
+        planilha = arquivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(planilha.count('<row>'), 3)
+        # 2022-01-10 no calendário do Excel
+        self.assertIn('<c s="1"><v>44571</v></c>', planilha)
+        self.assertIn('<t>COGN3</t>', planilha)
+        self.assertIn('<v>200.00</v>', planilha)
+
+    def test_formato_invalido(self):
+        response = self.client.get(self.url, {'formato': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_csv_em_pedacos(self):
+        """ Um pedaço por lote de linhas, sem montar o arquivo inteiro """
+        pedacos = list(gera_csv(linhas_movimentacoes(self.user.pk), tamanho_lote=1))
+        self.assertEqual(len(pedacos), 3)
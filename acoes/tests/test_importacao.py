@@ -0,0 +1,164 @@
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from decimal import Decimal
+from io import StringIO
+import tempfile
+
+from acoes.importacao import ErroImportacao, importa_movimentacoes
+from acoes.models import Acao, Carteira, Movimentacao
+
+
+User = get_user_model()
+
+
+def monta_csv(linhas, cabecalho='data,ticker,tipo,quantidade,preco'):
+    return StringIO('\n'.join([cabecalho, *linhas]) + '\n')
+
+
+class ImportacaoTestCase(TestCase):
+
+    def setUp(self):
+        self.cogn = Acao.objects.create(ticker='COGN3', preco=2.14)
+        self.viia = Acao.objects.create(ticker='VIIA3', preco=4.00)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+
+    def test_importa_e_atualiza_carteira(self):
+        """ Importação grava movimentações e recalcula cada carteira """
+        arquivo = monta_csv([
+            '2022-01-10,COGN3,C,100,2.00',
+            '2022-01-11,viia3,Compra,50,4.00',
+            '2022-01-12,COGN3,C,100,3.00',
+            '2022-01-20,COGN3,V,50,4.00',
+        ])
+        importadas, posicoes = importa_movimentacoes(arquivo, self.user)
+
+        self.assertEqual((importadas, posicoes), (4, 2))
+        carteira = Carteira.objects.get(user=self.user, acao=self.cogn)
+        self.assertEqual(carteira.quantidade, 150)
+        self.assertEqual(carteira.preco_medio, Decimal('2.50'))
+        self.assertEqual(carteira.valor_investido, Decimal('375.00'))
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.valor_total, Decimal('200.00'))
+        self.assertEqual(venda.preco_medio_venda, Decimal('2.50'))
+        self.assertEqual(
+            Carteira.objects.get(user=self.user, acao=self.viia).quantidade, 50
+        )
+
+    def test_formato_corretora(self):
+        """ Aceita ponto e vírgula, datas dd/mm/aaaa e decimais com vírgula """
+        arquivo = monta_csv(
+            ['17/01/2022;COGN3;C;100;1.234,50'],
+            cabecalho='Data;Ticker;Tipo;Quantidade;Preco;Corretagem'
+        )
+        importa_movimentacoes(arquivo, self.user)
+        movimentacao = Movimentacao.objects.get()
+        self.assertEqual(str(movimentacao.data_movimentacao), '2022-01-17')
+        self.assertEqual(movimentacao.preco, Decimal('1234.50'))
+
+    def test_consultas_nao_crescem_com_linhas(self):
+        """ Tickers validados em uma consulta por lote e carteira recalculada uma vez """
+        linhas = [f'2022-01-{dia:02d},COGN3,C,10,2.00' for dia in range(1, 29)]
+        linhas += [f'2022-01-{dia:02d},VIIA3,C,10,4.00' for dia in range(1, 29)]
+        with self.assertNumQueries(19):
+            importa_movimentacoes(monta_csv(linhas[:4] + linhas[28:32]), self.user)
+        Movimentacao.objects.all().delete()
+        with self.assertNumQueries(19):
+            importa_movimentacoes(monta_csv(linhas), self.user)
+
+    def test_erros_nao_gravam_nada(self):
+        """ Linhas inválidas são reportadas e nenhuma movimentação é gravada """
+        arquivo = monta_csv([
+            '2022-01-10,COGN3,C,100,2.00',
+            '2022-01-11,XXXX3,C,100,2.00',
+            '2022-13-11,COGN3,C,100,2.00',
+            '2022-01-11,COGN3,X,100,2.00',
+            '2022-01-11,COGN3,C,0,2.00',
+            '2022-01-11,COGN3,C,10,abc',
+        ])
+        with self.assertRaises(ErroImportacao) as contexto:
+            importa_movimentacoes(arquivo, self.user)
+
+        self.assertEqual(contexto.exception.erros, [
+            "Linha 3: Ação não cadastrada: 'XXXX3'",
+            "Linha 4: Data inválida: '2022-13-11'",
+            "Linha 5: Tipo inválido: 'X'",
+            "Linha 6: Quantidade deve ser maior que zero",
+            "Linha 7: Preço inválido: 'abc'",
+        ])
+        self.assertFalse(Movimentacao.objects.exists())
+        self.assertFalse(Carteira.objects.exists())
+
+    def test_venda_maior_que_posicao(self):
+        """ Venda acima da posição na data cancela a importação """
+        arquivo = monta_csv([
+            '2022-01-10,COGN3,C,100,2.00',
+            '2022-01-09,COGN3,V,50,2.00',
+        ])
+        with self.assertRaisesMessage(ErroImportacao, 'COGN3: Venda de 50 em 09/01/2022'):
+            importa_movimentacoes(arquivo, self.user)
+        self.assertFalse(Movimentacao.objects.exists())
+
+    def test_cabecalho_incompleto(self):
+        """ Arquivo sem as colunas obrigatórias """
+        with self.assertRaisesMessage(ErroImportacao, 'quantidade, preco'):
+            importa_movimentacoes(monta_csv([], cabecalho='data,ticker,tipo'), self.user)
+
+    def test_comando(self):
+        """ Comando importa o arquivo para o usuário informado """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as arquivo:
+            arquivo.write('data,ticker,tipo,quantidade,preco\n2022-01-10,COGN3,C,100,2.00\n')
+            arquivo.flush()
+            saida = StringIO()
+            call_command(
+                'importa_movimentacoes', arquivo.name,
+                usuario=self.user.email, stdout=saida
+            )
+        self.assertIn('1 movimentações, 1 posições', saida.getvalue())
+        self.assertEqual(Carteira.objects.get().quantidade, 100)
+
+
+class ImportacaoViewTestCase(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('importa_movimentacoes')
+        Acao.objects.create(ticker='COGN3', preco=2.14)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+        self.client.login(email=self.user.email, password='senha_secreta')
+
+    def envia(self, conteudo):
+        arquivo = SimpleUploadedFile('movimentacoes.csv', conteudo.encode())
+        return self.client.post(self.url, {'arquivo': arquivo})
+
+    def test_view_autenticado(self):
+        """ Formulário de importação """
+        response = self.client.get(self.url)
+        self.assertEquals(response.status_code, 200)
+        self.assertTemplateUsed(response, 'movimentacao/_importacao.html')
+
+    def test_importa_arquivo(self):
+        """ Upload do CSV importa as movimentações """
+        response = self.envia(
+            'data,ticker,tipo,quantidade,preco\n2022-01-10,COGN3,C,100,2.00\n'
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json(), {'importadas': 1, 'posicoes': 1})
+        self.assertEquals(Carteira.objects.get(user=self.user).quantidade, 100)
+
+    def test_importa_arquivo_com_erro(self):
+        """ Erros do arquivo voltam no formulário """
+        response = self.envia(
+            'data,ticker,tipo,quantidade,preco\n2022-01-10,XXXX3,C,100,2.00\n'
+        )
+        self.assertEquals(response.status_code, 400)
+        self.assertFormError(
+            response, 'form', 'arquivo', "Linha 2: Ação não cadastrada: 'XXXX3'"
+        )
@@ -0,0 +1,200 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import re
+
+from acoes.cache import versao_precos
+from acoes.models import Acao, Movimentacao
+from acoes.posicao import reconstroi_carteiras
+from acoes.resultados import (
+    atualiza_resultados_mensais, reconstroi_resultados_mensais
+)
+
+
+User = get_user_model()
+
+# Tabelas que não podem ser lidas por inteiro nos caminhos críticos
+TABELAS = ('acoes_movimentacao', 'acoes_carteira', 'acoes_resultadomensal')
+
+
+def plano(sql):
+    """ Linhas do plano de execução da consulta """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [linha[-1] for linha in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def varreduras(linhas_plano):
+    """ Tabelas de TABELAS lidas por inteiro, sem índice """
+    if connection.vendor == 'sqlite':
+        padrao = re.compile(r'\bSCAN (\w+)$')
+    else:
+        padrao = re.compile(r'Seq Scan on (\w+)')
+    return {
+        encontrado.group(1)
+        for linha in linhas_plano
+        for encontrado in [padrao.search(linha.strip())]
+        if encontrado and encontrado.group(1) in TABELAS
+    }
+
+
+class PlanoConsultasTestCase(TestCase):
+    """
+    Executa os caminhos críticos (dashboard, gráfico, listagem, exportação
+    e gravação de movimentações) sobre uma base com milhares de
+    movimentações e confere, pelo EXPLAIN de cada SELECT executado, que
+    nenhum lê Movimentacao, Carteira ou ResultadoMensal por inteiro
+    No PostgreSQL a varredura sequencial é desligada na sessão: com poucas
+    linhas ela pode ser a escolha mais barata, mas sem um índice utilizável
+    continua aparecendo no plano
+    """
+    USUARIOS = 20
+    MOVIMENTACOES_POR_USUARIO = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        aleatorio = random.Random(7)
+        acoes = Acao.objects.bulk_create([
+            Acao(ticker=f'IX{i:03d}', preco=10) for i in range(40)
+        ])
+        acoes = list(Acao.objects.all())
+        usuarios = User.objects.bulk_create([
+            User(email=f'indice{i}@teste.com') for i in range(cls.USUARIOS)
+        ])
+        usuarios = list(User.objects.all())
+
+        movimentacoes = []
+        for user in usuarios:
+            posicoes = {}
+            for i in range(cls.MOVIMENTACOES_POR_USUARIO):
+                acao = aleatorio.choice(acoes)
+                data = date(2019, 1, 1) + timedelta(days=i * 3)
+                preco = Decimal(aleatorio.randint(100, 3000)).scaleb(-2)
+                quantidade = posicoes.get(acao.pk, 0)
+                if quantidade >= 20 and aleatorio.random() < 0.4:
+                    tipo, quantidade = 'V', aleatorio.randint(1, quantidade)
+                    posicoes[acao.pk] -= quantidade
+                else:
+                    tipo, quantidade = 'C', aleatorio.randint(1, 10) * 10
+                    posicoes[acao.pk] = posicoes.get(acao.pk, 0) + quantidade
+                movimentacoes.append(Movimentacao(
+                    user=user, acao=acao, data_movimentacao=data, tipo=tipo,
+                    preco=preco, quantidade=quantidade,
+                    valor_total=preco * quantidade,
+                ))
+        Movimentacao.objects.bulk_create(movimentacoes, batch_size=2000)
+        reconstroi_carteiras()
+        reconstroi_resultados_mensais()
+
+        cls.user = usuarios[0]
+        cls.user.set_password('senha_secreta')
+        cls.user.save()
+        cls.acao = Movimentacao.objects.filter(user=cls.user).first().acao
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        self.client.login(email=self.user.email, password='senha_secreta')
+
+    def assertSemVarredura(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            funcao()
+        # Inclusive os INSERT ... SELECT dos resultados mensais
+        selects = [
+            consulta['sql'] for consulta in consultas.captured_queries
+            if consulta['sql'].startswith('SELECT') or (
+                consulta['sql'].startswith('INSERT')
+                and ' SELECT ' in consulta['sql']
+            )
+        ]
+        self.assertTrue(selects)
+        planos = []
+        for sql in selects:
+            linhas_plano = plano(sql)
+            self.assertFalse(
+                varreduras(linhas_plano),
+                f"Varredura completa em:\n{sql}\n" + '\n'.join(linhas_plano)
+            )
+            planos.extend(linhas_plano)
+        return '\n'.join(planos)
+
+    def test_dashboard(self):
+        self.assertSemVarredura(lambda: self.client.get(reverse('dashboard')))
+
+    def test_grafico(self):
+        url = reverse('lucro_prejuizo_mes_chart')
+        self.assertSemVarredura(lambda: self.client.get(url, {'ano': 2020}))
+        self.assertSemVarredura(
+            lambda: self.client.get(url, {'inicio': '2019-06', 'fim': '2020-05'})
+        )
+
+    def test_listagem(self):
+        url = reverse('movimentacoes')
+        response = self.client.get(url)
+        self.assertSemVarredura(
+            lambda: self.client.get(response.context['proxima_pagina'])
+        )
+        for filtros in (
+            {'ticker': self.acao.ticker},
+            {'tipo': 'V'},
+            {'inicio': '2020-01-01', 'fim': '2020-03-31'},
+            {'tipo': 'C', 'inicio': '2020-01-01'},
+        ):
+            self.assertSemVarredura(lambda: self.client.get(url, filtros))
+
+    def test_exportacao(self):
+        url = reverse('exporta_movimentacoes')
+        self.assertSemVarredura(
+            lambda: b''.join(self.client.get(url).streaming_content)
+        )
+
+    def test_gravacao_movimentacoes(self):
+        """ Validação da venda, reprocessamento da posição e resultados mensais """
+        url = reverse('cria_movimentacao')
+        self.assertSemVarredura(lambda: self.client.post(url, {
+            'acao': self.acao.pk, 'data_movimentacao': '2019-06-10',
+            'tipo': 'C', 'preco': '10.00', 'quantidade': 100,
+        }))
+        planos = self.assertSemVarredura(lambda: self.client.post(url, {
+            'acao': self.acao.pk, 'data_movimentacao': '2019-06-11',
+            'tipo': 'V', 'preco': '12.00', 'quantidade': 10,
+        }))
+        # O ledger da ação é lido pelo índice (user, acao, data), e não
+        # pelo do usuário inteiro filtrando a ação depois
+        self.assertIn('acoes_mov_user_acao_data_idx', planos)
+        movimentacao = Movimentacao.objects.filter(
+            user=self.user, acao=self.acao
+        ).earliest('data_movimentacao', 'id')
+        self.assertIn(
+            'acoes_mov_user_acao_data_idx',
+            self.assertSemVarredura(movimentacao.delete)
+        )
+
+    def test_resultados_mensais(self):
+        """ Agregação das vendas por mês lida só do índice (user, tipo, data, resultado) """
+        planos = self.assertSemVarredura(lambda: atualiza_resultados_mensais(
+            self.user.pk, {date(2019, 6, 1), date(2020, 5, 1)}
+        ))
+        self.assertIn('acoes_mov_user_tipo_data_idx', planos)
+        if connection.vendor == 'sqlite':
+            self.assertIn('COVERING INDEX acoes_mov_user_tipo_data_idx', planos)
+
+    def test_versao_precos(self):
+        """ Última atualização de preço, lida a cada acesso ao cache, pelo índice """
+        planos = self.assertSemVarredura(versao_precos)
+        self.assertNotRegex(planos, r'\bSCAN acoes_acao\b|Seq Scan on acoes_acao')
+        self.assertIn('data_hora_atualizacao', planos)
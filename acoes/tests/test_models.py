@@ -75,6 +75,23 @@ class MovimentacaoTestCase(TestCase):
         self.assertEqual(movimentacao.valor_total, 450.00)
         self.assertEqual(movimentacao.user, self.user)
         self.assertEqual(Movimentacao.objects.count(), 1)
+
+    def test_acao_em_carteira(self):
+        """ Ação fica marcada em carteira enquanto algum usuário a possuir """
+        Movimentacao.objects.create(
+            acao=self.acao, data_movimentacao='2022-01-17', tipo='C',
+            preco=10.00, quantidade=100, user=self.user
+        )
+        self.acao.refresh_from_db()
+        self.assertTrue(self.acao.em_carteira)
+
+        Movimentacao.objects.create(
+            acao=self.acao, data_movimentacao='2022-01-18', tipo='V',
+            preco=11.00, preco_medio_venda=10.00, quantidade=100,
+            user=self.user
+        )
+        self.acao.refresh_from_db()
+        self.assertFalse(self.acao.em_carteira)
     
 
 class CarteiraTestCase(TestCase):
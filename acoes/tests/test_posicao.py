@@ -0,0 +1,292 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from acoes.management.commands.benchmark_calculadora import (
+    calcula_decimal, gera_movimentacoes
+)
+from acoes.models import Acao, Carteira, Movimentacao, ResultadoMensal
+from acoes.posicao import (
+    Posicao, RegistroMovimentacao, centavos, decimal, divide_arredondando,
+    reprocessa_posicao
+)
+
+
+User = get_user_model()
+
+
+class PosicaoTestCase(TestCase):
+
+    def setUp(self):
+        self.acao = Acao.objects.create(ticker='COGN3', preco=10.00)
+        self.outra_acao = Acao.objects.create(ticker='VIIA3', preco=5.00)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+
+    def movimenta(self, data, tipo, preco, quantidade, acao=None):
+        return Movimentacao.objects.create(
+            acao=acao or self.acao, user=self.user, data_movimentacao=data,
+            tipo=tipo, preco=Decimal(preco), quantidade=quantidade
+        )
+
+    def carteira(self, acao=None):
+        return Carteira.objects.get(user=self.user, acao=acao or self.acao)
+
+    def test_edicao_nao_reaplica_movimentacao(self):
+        """ Salvar de novo uma movimentação não soma outra vez na carteira """
+        compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+        compra.save()
+        self.assertEqual(self.carteira().quantidade, 100)
+        self.assertEqual(self.carteira().valor_investido, Decimal('1000.00'))
+
+    def test_edicao_reprocessa_vendas_seguintes(self):
+        """ Alterar uma compra corrige o preço médio das vendas posteriores """
+        compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 50)
+
+        compra = Movimentacao.objects.get(pk=compra.pk)
+        compra.preco = Decimal('12.00')
+        compra.save()
+
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.preco_medio_venda, Decimal('12.00'))
+        carteira = self.carteira()
+        self.assertEqual(carteira.quantidade, 50)
+        self.assertEqual(carteira.valor_investido, Decimal('600.00'))
+        self.assertEqual(carteira.preco_medio, Decimal('12.00'))
+
+    def test_venda_grava_custo_e_resultado(self):
+        """ Custo pelo preço médio e resultado gravados na venda, e corrigidos na edição """
+        compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+        venda = self.movimenta('2022-01-20', 'V', '15.00', 40)
+        venda = Movimentacao.objects.get(pk=venda.pk)
+        self.assertEqual(venda.custo_venda, Decimal('400.00'))
+        self.assertEqual(venda.resultado, Decimal('200.00'))
+
+        venda.preco = Decimal('8.00')
+        venda.save()
+        venda = Movimentacao.objects.get(pk=venda.pk)
+        self.assertEqual(venda.custo_venda, Decimal('400.00'))
+        self.assertEqual(venda.resultado, Decimal('-80.00'))
+
+        compra = Movimentacao.objects.get(pk=compra.pk)
+        self.assertEqual((compra.custo_venda, compra.resultado), (0, 0))
+
+    def test_edicao_data_para_depois(self):
+        """ Mover uma compra para depois de uma venda reprocessa desde a data antiga """
+        self.movimenta('2022-01-05', 'C', '10.00', 100)
+        compra = self.movimenta('2022-01-10', 'C', '20.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 50)
+
+        compra = Movimentacao.objects.get(pk=compra.pk)
+        compra.data_movimentacao = '2022-01-25'
+        compra.save()
+
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.preco_medio_venda, Decimal('10.00'))
+        carteira = self.carteira()
+        self.assertEqual(carteira.quantidade, 150)
+        self.assertEqual(carteira.valor_investido, Decimal('2500.00'))
+        self.assertEqual(carteira.preco_medio, Decimal('16.67'))
+
+    def test_edicao_troca_acao(self):
+        """ Trocar a ação da movimentação desfaz a posição na ação antiga """
+        compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+
+        compra = Movimentacao.objects.get(pk=compra.pk)
+        compra.acao = self.outra_acao
+        compra.save()
+
+        self.assertFalse(
+            Carteira.objects.filter(user=self.user, acao=self.acao).exists()
+        )
+        self.assertEqual(self.carteira(self.outra_acao).quantidade, 100)
+        self.acao.refresh_from_db()
+        self.outra_acao.refresh_from_db()
+        self.assertFalse(self.acao.em_carteira)
+        self.assertTrue(self.outra_acao.em_carteira)
+
+    def test_remocao_desfaz_movimentacao(self):
+        """ Remover uma movimentação a desfaz na carteira """
+        self.movimenta('2022-01-10', 'C', '10.00', 100)
+        compra = self.movimenta('2022-01-15', 'C', '20.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 50)
+
+        compra.delete()
+
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.preco_medio_venda, Decimal('10.00'))
+        carteira = self.carteira()
+        self.assertEqual(carteira.quantidade, 50)
+        self.assertEqual(carteira.valor_investido, Decimal('500.00'))
+
+    def test_remocao_ultima_movimentacao(self):
+        """ Remover a única compra remove a ação da carteira """
+        compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+        compra.delete()
+        self.assertFalse(Carteira.objects.exists())
+        self.acao.refresh_from_db()
+        self.assertFalse(self.acao.em_carteira)
+
+    def test_remocao_em_lote_reprocessa_uma_vez(self):
+        """ Remoção em lote reprocessa cada ação uma vez, da menor data removida """
+        self.movimenta('2022-01-05', 'C', '10.00', 100)
+        for dia in range(10, 20):
+            self.movimenta(f'2022-01-{dia}', 'C', '20.00', 10)
+        self.movimenta('2022-02-01', 'V', '15.00', 50)
+        self.movimenta('2022-01-10', 'C', '5.00', 30, acao=self.outra_acao)
+
+        with mock.patch(
+            'acoes.posicao.reprocessa_posicao', wraps=reprocessa_posicao
+        ) as reprocessa:
+            Movimentacao.objects.filter(preco=Decimal('20.00')).delete()
+        reprocessa.assert_called_once_with(
+            self.user.pk, self.acao.pk, date(2022, 1, 10),
+            meses={date(2022, 1, 1)}
+        )
+
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.preco_medio_venda, Decimal('10.00'))
+        self.assertEqual(self.carteira().quantidade, 50)
+        self.assertEqual(self.carteira(self.outra_acao).quantidade, 30)
+        self.assertEqual(
+            ResultadoMensal.objects.get(user=self.user).lucro, Decimal('250.00')
+        )
+
+    def test_remocao_usuario_nao_reprocessa(self):
+        """ Usuário removido leva o ledger sem reprocessar as posições """
+        self.movimenta('2022-01-10', 'C', '10.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 40)
+        self.movimenta('2022-01-10', 'C', '5.00', 30, acao=self.outra_acao)
+
+        with mock.patch('acoes.posicao.reprocessa_posicao') as reprocessa:
+            self.user.delete()
+        reprocessa.assert_not_called()
+
+        self.assertFalse(Movimentacao.objects.exists())
+        self.assertFalse(Carteira.objects.exists())
+        self.assertFalse(Acao.objects.filter(em_carteira=True).exists())
+
+    def test_movimentacao_retroativa(self):
+        """ Compra com data anterior é encaixada antes das vendas existentes """
+        self.movimenta('2022-01-10', 'C', '10.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 100)
+        self.movimenta('2022-01-15', 'C', '20.00', 100)
+
+        venda = Movimentacao.objects.get(tipo='V')
+        self.assertEqual(venda.preco_medio_venda, Decimal('15.00'))
+        carteira = self.carteira()
+        self.assertEqual(carteira.quantidade, 100)
+        self.assertEqual(carteira.valor_investido, Decimal('1500.00'))
+        compra = Movimentacao.objects.get(data_movimentacao='2022-01-15')
+        self.assertEqual(
+            (compra.quantidade_posicao, compra.valor_investido_posicao,
+             compra.preco_medio_posicao),
+            (200, Decimal('3000.00'), Decimal('15.00'))
+        )
+
+    def test_insercao_grava_posicao(self):
+        """
+        Movimentação nova é inserida já com a posição, depois das da mesma
+        data, sem UPDATE na própria linha
+        """
+        self.movimenta('2022-01-10', 'C', '10.00', 100)
+        with CaptureQueriesContext(connection) as consultas:
+            venda = self.movimenta('2022-01-10', 'V', '12.50', 40)
+        self.assertFalse([
+            consulta['sql'] for consulta in consultas.captured_queries
+            if consulta['sql'].startswith('UPDATE "acoes_movimentacao"')
+        ])
+        self.assertEqual(venda.preco_medio_venda, 0)
+        venda = Movimentacao.objects.get(pk=venda.pk)
+        self.assertEqual(
+            (venda.preco_medio_venda, venda.quantidade_posicao,
+             venda.valor_investido_posicao, venda.preco_medio_posicao,
+             venda.custo_venda, venda.resultado),
+            (Decimal('10.00'), 60, Decimal('600.00'), Decimal('10.00'),
+             Decimal('400.00'), Decimal('100.00'))
+        )
+        self.assertEqual(
+            ResultadoMensal.objects.get(user=self.user).lucro, Decimal('100.00')
+        )
+
+    def test_reprocessa_somente_a_partir_da_data(self):
+        """ Reprocessamento parcial lê, em uma consulta, só o dia anterior e as seguintes """
+        for dia in range(1, 21):
+            self.movimenta(f'2022-01-{dia:02d}', 'C', '10.00', 10)
+        with self.assertNumQueries(3):
+            posicao = reprocessa_posicao(self.user.pk, self.acao.pk, '2022-01-20')
+        self.assertEqual(posicao.quantidade, 200)
+
+    def test_reconstroi_carteiras(self):
+        """ Comando refaz carteiras corrompidas a partir das movimentações """
+        self.movimenta('2022-01-10', 'C', '10.00', 100)
+        self.movimenta('2022-01-20', 'V', '15.00', 40)
+        self.movimenta('2022-01-10', 'C', '5.00', 30, acao=self.outra_acao)
+        self.movimenta('2022-01-11', 'V', '6.00', 30, acao=self.outra_acao)
+        Carteira.objects.filter(acao=self.acao).update(quantidade=999)
+        Carteira.objects.create(
+            user=self.user, acao=self.outra_acao, quantidade=1,
+            valor_investido=1, preco_medio=1
+        )
+        Movimentacao.objects.update(quantidade_posicao=0)
+
+        saida = StringIO()
+        call_command('reconstroi_carteiras', stdout=saida)
+
+        self.assertIn('4 movimentações, 1 carteiras', saida.getvalue())
+        carteira = self.carteira()
+        self.assertEqual(carteira.quantidade, 60)
+        self.assertEqual(carteira.valor_investido, Decimal('600.00'))
+        self.assertFalse(
+            Carteira.objects.filter(acao=self.outra_acao).exists()
+        )
+        self.assertEqual(
+            list(Movimentacao.objects.order_by('acao', 'data_movimentacao')
+                 .values_list('quantidade_posicao', flat=True)),
+            [100, 60, 30, 0]
+        )
+
+
+class CalculadoraCentavosTestCase(TestCase):
+
+    def test_divide_arredondando(self):
+        """ Empates arredondam para o par, como o Decimal.quantize """
+        for numerador, denominador in [
+            (5, 2), (7, 2), (1, 4), (3, 4), (-5, 2), (-7, 2), (2, 3), (200, 3)
+        ]:
+            esperado = (
+                Decimal(numerador) / Decimal(denominador)
+            ).quantize(Decimal('1'))
+            self.assertEqual(
+                divide_arredondando(numerador, denominador), esperado,
+                f'{numerador}/{denominador}'
+            )
+
+    def test_mesmo_resultado_da_carteira_decimal(self):
+        """ Cálculo em centavos confere com Carteira.calcula_preco_medio_carteira """
+        movimentacoes = gera_movimentacoes(20000, 40, semente=7)
+        referencia = calcula_decimal(movimentacoes)
+
+        posicao, atual = None, None
+        for (chave, tipo, quantidade, valor_total), esperado in zip(
+            movimentacoes, referencia
+        ):
+            if chave != atual:
+                posicao, atual = Posicao(), chave
+            posicao.aplica(RegistroMovimentacao(
+                0, None, tipo, quantidade, centavos(valor_total), 0, 0, 0, 0, 0, 0
+            ))
+            self.assertEqual(
+                (posicao.quantidade, decimal(posicao.valor_investido),
+                 decimal(posicao.preco_medio)),
+                esperado
+            )
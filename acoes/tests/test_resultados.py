@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from acoes.models import Acao, Movimentacao, ResultadoMensal
+
+
+User = get_user_model()
+
+
+class ResultadoMensalTestCase(TestCase):
+
+    def setUp(self):
+        self.acao = Acao.objects.create(ticker='COGN3', preco=10.00)
+        self.user = User.objects.create_user(
+            email='teste@teste.com', password='senha_secreta'
+        )
+        self.compra = self.movimenta('2022-01-10', 'C', '10.00', 100)
+
+    def movimenta(self, data, tipo, preco, quantidade):
+        return Movimentacao.objects.create(
+            acao=self.acao, user=self.user, data_movimentacao=data,
+            tipo=tipo, preco=Decimal(preco), quantidade=quantidade
+        )
+
+    def resultados(self):
+        return {
+            mes: (lucro, prejuizo)
+            for mes, lucro, prejuizo in ResultadoMensal.objects.filter(
+                user=self.user
+            ).values_list('mes', 'lucro', 'prejuizo')
+        }
+
+    def test_venda_grava_resultado_do_mes(self):
+        """ Cada venda soma o resultado na linha do mês """
+        self.movimenta('2022-01-20', 'V', '15.00', 20)
+        self.movimenta('2022-01-25', 'V', '8.00', 10)
+        self.movimenta('2022-01-26', 'V', '12.00', 10)
+        self.assertEqual(self.resultados(), {
+            date(2022, 1, 1): (Decimal('120.00'), Decimal('20.00')),
+        })
+
+    def test_compra_nao_grava_resultado(self):
+        self.assertEqual(self.resultados(), {})
+
+    def test_alteracao_de_mes_atualiza_os_dois_meses(self):
+        venda = self.movimenta('2022-01-20', 'V', '15.00', 20)
+        venda = Movimentacao.objects.get(pk=venda.pk)
+        venda.data_movimentacao = date(2022, 3, 5)
+        venda.save()
+        self.assertEqual(self.resultados(), {
+            date(2022, 3, 1): (Decimal('100.00'), Decimal('0.00')),
+        })
+
+    def test_exclusao_remove_o_mes(self):
+        venda = self.movimenta('2022-02-20', 'V', '15.00', 20)
+        Movimentacao.objects.get(pk=venda.pk).delete()
+        self.assertEqual(self.resultados(), {})
+
+    def test_alteracao_de_compra_atualiza_vendas_seguintes(self):
+        """ O custo das vendas posteriores muda, e o mês delas também """
+        self.movimenta('2022-02-20', 'V', '15.00', 20)
+        compra = Movimentacao.objects.get(pk=self.compra.pk)
+        compra.preco = Decimal('20.00')
+        compra.save()
+        self.assertEqual(self.resultados(), {
+            date(2022, 2, 1): (Decimal('0.00'), Decimal('100.00')),
+        })
+
+    def test_reconstroi_resultados_mensais(self):
+        """ Comando refaz a tabela a partir das vendas """
+        self.movimenta('2022-01-20', 'V', '15.00', 20)
+        self.movimenta('2022-02-20', 'V', '5.00', 20)
+        esperado = self.resultados()
+        ResultadoMensal.objects.all().delete()
+        ResultadoMensal.objects.create(user=self.user, mes=date(2021, 1, 1), lucro=1)
+
+        call_command('reconstroi_resultados_mensais', stdout=StringIO())
+        self.assertEqual(self.resultados(), esperado)
+        self.assertEqual(len(esperado), 2)
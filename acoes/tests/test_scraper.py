@@ -0,0 +1,544 @@
+from django.test import TestCase, override_settings
+
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+import os
+import shutil
+import tempfile
+
+from celery.exceptions import Retry
+from selenium.common.exceptions import WebDriverException
+
+from acoes.models import Acao, AcaoPrecoHistorico
+from acoes.scraper import (
+    Cotacao, ElementoNaoEncontrado, FalhaAcesso, HttpBackend, SeleniumBackend
+)
+from acoes.cache import versao_precos
+from acoes.scraper.cache import CachePaginas, EntradaCache, PaginaInalterada
+from acoes.scraper.drivers import DriverPool
+from acoes.scraper.persistencia import pregao_anterior, salva_precos
+from acoes.scraper.parser import PARSERS, extrai_data_cotacao
+from acoes.scraper.servidor_local import DIRETORIO_PAGINAS, inicia_servidor
+from acoes.tasks import (
+    MODO_TODAS, divide_em_lotes, task_consolida_feedback, task_scrap_acoes_dia_anterior,
+    task_scrap_lote,
+)
+from setup.celery import app
+
+
+def cotacoes(data=None, **precos):
+    return {ticker: Cotacao(preco, data) for ticker, preco in precos.items()}
+
+
+class ServidorLocalMixin:
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = inicia_servidor()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+
+class HttpBackendTestCase(ServidorLocalMixin, TestCase):
+
+    def test_busca_precos(self):
+        """ Busca preços das páginas gravadas em paralelo """
+        with HttpBackend(concorrencia=2, url_base=self.servidor.url_base) as backend:
+            precos = backend.busca_precos(['COGN3', 'VIIA3', 'PETR4'])
+        self.assertEqual(
+            {ticker: (cotacao.preco, cotacao.data) for ticker, cotacao in precos.items()},
+            {
+                'COGN3': ('2.14', date(2022, 1, 17)),
+                'VIIA3': ('4.00', date(2022, 1, 17)),
+                'PETR4': ('32.35', date(2022, 1, 17)),
+            }
+        )
+
+    def test_elemento_nao_encontrado(self):
+        """ Página sem o preço da ação """
+        with HttpBackend(url_base=self.servidor.url_base) as backend:
+            precos = backend.busca_precos(['ZZZZ3'])
+        self.assertIsInstance(precos['ZZZZ3'], ElementoNaoEncontrado)
+
+    def test_falha_acesso(self):
+        """ Página inexistente retorna a falha sem interromper os demais """
+        with HttpBackend(url_base=self.servidor.url_base) as backend:
+            precos = backend.busca_precos(['XXXX3', 'COGN3'])
+        self.assertIsInstance(precos['XXXX3'], FalhaAcesso)
+        self.assertEqual(str(precos['COGN3']), '2.14')
+
+
+class CachePaginasTestCase(TestCase):
+
+    def setUp(self):
+        self.diretorio_cache = tempfile.TemporaryDirectory()
+        self.diretorio_paginas = tempfile.TemporaryDirectory()
+        for ticker in ('COGN3', 'VIIA3'):
+            shutil.copy(
+                DIRETORIO_PAGINAS / f'{ticker}.html', self.diretorio_paginas.name
+            )
+
+    def tearDown(self):
+        self.diretorio_cache.cleanup()
+        self.diretorio_paginas.cleanup()
+
+    def busca(self, servidor, tickers=('COGN3', 'VIIA3')):
+        cache = CachePaginas(self.diretorio_cache.name, 1024 * 1024)
+        with HttpBackend(url_base=servidor.url_base, cache=cache) as backend:
+            return backend.busca_precos(list(tickers)), cache.estatisticas()
+
+    def servidor(self, **kwargs):
+        servidor = inicia_servidor(diretorio=self.diretorio_paginas.name, **kwargs)
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return servidor
+
+    def test_requisicao_condicional(self):
+        """ Página não modificada (304) não é processada novamente """
+        servidor = self.servidor(etag=True)
+        precos, estatisticas = self.busca(servidor)
+        self.assertEqual(
+            {ticker: str(cotacao) for ticker, cotacao in precos.items()},
+            {'COGN3': '2.14', 'VIIA3': '4.00'}
+        )
+        self.assertEqual(estatisticas, {'hits': 0, 'misses': 2})
+
+        precos, estatisticas = self.busca(servidor)
+        self.assertIsInstance(precos['COGN3'], PaginaInalterada)
+        self.assertEqual(str(precos['COGN3']), '2.14')
+        # Data da cotação guardada com a página
+        self.assertEqual(precos['COGN3'].data, date(2022, 1, 17))
+        self.assertEqual(estatisticas, {'hits': 2, 'misses': 0})
+
+    def test_hash_conteudo(self):
+        """ Sem validadores HTTP, conteúdo igual ao do cache é um hit """
+        servidor = self.servidor()
+        self.busca(servidor)
+
+        caminho = os.path.join(self.diretorio_paginas.name, 'VIIA3.html')
+        with open(caminho, 'rb') as arquivo:
+            html = arquivo.read().replace(b'4,00', b'4,25')
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(html)
+
+        precos, estatisticas = self.busca(servidor)
+        self.assertIsInstance(precos['COGN3'], PaginaInalterada)
+        self.assertEqual(str(precos['VIIA3']), '4.25')
+        self.assertEqual(estatisticas, {'hits': 1, 'misses': 1})
+
+    def test_remove_excedente(self):
+        """ Entradas usadas há mais tempo são removidas acima do limite """
+        cache = CachePaginas(self.diretorio_cache.name, 250)
+        for indice, ticker in enumerate(['COGN3', 'VIIA3', 'PETR4']):
+            cache.grava(ticker, EntradaCache(preco='1.00'), b'x' * 100)
+            os.utime(cache.caminho(ticker), (indice, indice))
+        cache.remove_excedente()
+        self.assertIsNone(cache.obtem('COGN3'))
+        self.assertEqual(cache.obtem('PETR4').preco, '1.00')
+
+    def test_entrada_sem_data(self):
+        """ Entrada gravada antes da data da cotação é lida sem data """
+        cache = CachePaginas(self.diretorio_cache.name, 1024)
+        with open(cache.caminho('COGN3'), 'wb') as arquivo:
+            arquivo.write(b'{"etag": null, "last_modified": null, "hash": "x", "preco": "2.14"}\nx')
+        cotacao = cache.obtem('COGN3').cotacao()
+        self.assertEqual((cotacao.preco, cotacao.data), ('2.14', None))
+
+
+class ParserTestCase(TestCase):
+
+    def test_parsers_corpus(self):
+        """ Todos os parsers extraem o mesmo preço das páginas gravadas """
+        esperados = {
+            'COGN3': '2.14', 'VIIA3': '4.00', 'PETR4': '32.35', 'MGLU3': '7.26'
+        }
+        for nome, extrai in PARSERS.items():
+            for ticker, preco in esperados.items():
+                html = (DIRETORIO_PAGINAS / f'{ticker}.html').read_text('latin-1')
+                with self.subTest(parser=nome, ticker=ticker):
+                    self.assertEqual(extrai(html), preco)
+            with self.subTest(parser=nome, ticker='ZZZZ3'):
+                html = (DIRETORIO_PAGINAS / 'ZZZZ3.html').read_text('latin-1')
+                with self.assertRaises(ElementoNaoEncontrado):
+                    extrai(html)
+
+    def test_data_cotacao(self):
+        """ Data do pregão da cotação, lida da página """
+        html = (DIRETORIO_PAGINAS / 'COGN3.html').read_text('latin-1')
+        self.assertEqual(extrai_data_cotacao(html), date(2022, 1, 17))
+        html_sem_data = (DIRETORIO_PAGINAS / 'ZZZZ3.html').read_text('latin-1')
+        self.assertIsNone(extrai_data_cotacao(html_sem_data))
+
+    def test_parser_html_estrutural(self):
+        """ Parser HTML não depende da ordem das classes nem de espaços """
+        html = (
+            '<table class="w728"><tbody><tr><td class="label">x</td>'
+            '<td class="w3 destaque data">\n <span class="txt"> 1.234,56 </span></td>'
+            '</tr></tbody></table>'
+        )
+        self.assertEqual(PARSERS['html'](html), '1234.56')
+
+    def test_parser_html_valor_invalido(self):
+        """ Célula sem valor numérico """
+        html = '<table class="w728"><tr><td class="data destaque w3"><span>-</span></td></tr></table>'
+        with self.assertRaises(ElementoNaoEncontrado):
+            PARSERS['html'](html)
+
+    def test_parsers_separador_sem_digito(self):
+        """ "," ou "." sozinhos na célula não são preço """
+        for valor in (',', '.', ',.'):
+            html = (
+                '<table class="w728"><tr><td class="data destaque w3">'
+                f'<span class="txt">{valor}</span></td></tr></table>'
+            )
+            for nome, extrai in PARSERS.items():
+                with self.subTest(parser=nome, valor=valor):
+                    with self.assertRaises(ElementoNaoEncontrado):
+                        extrai(html)
+
+
+class SeleniumBackendTestCase(TestCase):
+
+    def test_falha_driver_preserva_resultados(self):
+        """ Falha do driver marca somente os tickers restantes e descarta o driver """
+        driver = mock.Mock()
+        driver.page_source = (DIRETORIO_PAGINAS / 'COGN3.html').read_text('latin-1')
+        driver.get.side_effect = [None, WebDriverException('conexão perdida')]
+        pool = DriverPool(fabrica=lambda: driver)
+        backend = SeleniumBackend(url_base='http://localhost', pool=pool)
+
+        with backend:
+            precos = backend.busca_precos(['COGN3', 'VIIA3', 'PETR4'])
+
+        self.assertEqual(str(precos['COGN3']), '2.14')
+        self.assertIsInstance(precos['VIIA3'], FalhaAcesso)
+        self.assertIsInstance(precos['PETR4'], FalhaAcesso)
+        driver.quit.assert_called_once()
+        self.assertEqual(pool.criados, 0)
+
+    def test_driver_nao_iniciado(self):
+        """ Falha ao iniciar o navegador retorna FalhaAcesso para todos """
+        pool = DriverPool(fabrica=mock.Mock(side_effect=WebDriverException('sem firefox')))
+        backend = SeleniumBackend(url_base='http://localhost', pool=pool)
+        precos = backend.busca_precos(['COGN3', 'VIIA3'])
+        self.assertIsInstance(precos['COGN3'], FalhaAcesso)
+        self.assertIsInstance(precos['VIIA3'], FalhaAcesso)
+
+
+class DriverPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.fabrica = mock.Mock(side_effect=lambda: mock.Mock())
+
+    def test_reaproveita_driver(self):
+        """ Driver é criado sob demanda e reaproveitado """
+        pool = DriverPool(fabrica=self.fabrica)
+        with pool.driver() as primeiro:
+            pass
+        with pool.driver() as segundo:
+            pass
+        self.assertIs(primeiro.driver, segundo.driver)
+        self.assertEqual(self.fabrica.call_count, 1)
+
+    def test_recicla_apos_max_paginas(self):
+        """ Driver é substituído ao atingir o limite de páginas """
+        pool = DriverPool(fabrica=self.fabrica, max_paginas=2)
+        with pool.driver() as entrada:
+            entrada.get('http://localhost/1')
+            entrada.get('http://localhost/2')
+        with pool.driver() as nova:
+            pass
+        self.assertIsNot(entrada.driver, nova.driver)
+        entrada.driver.quit.assert_called_once()
+
+    def test_descarta_em_erro(self):
+        """ Exceção durante o uso descarta o driver """
+        pool = DriverPool(fabrica=self.fabrica)
+        with self.assertRaises(RuntimeError):
+            with pool.driver() as entrada:
+                raise RuntimeError()
+        entrada.driver.quit.assert_called_once()
+        self.assertEqual(pool.criados, 0)
+
+    def test_verifica_saude(self):
+        """ Driver que não responde é substituído no próximo empréstimo """
+        pool = DriverPool(fabrica=self.fabrica)
+        with pool.driver() as entrada:
+            type(entrada.driver).current_url = mock.PropertyMock(
+                side_effect=WebDriverException()
+            )
+        with pool.driver() as nova:
+            pass
+        self.assertIsNot(entrada.driver, nova.driver)
+        self.assertEqual(self.fabrica.call_count, 2)
+
+    def test_encerra(self):
+        """ Encerramento fecha os drivers livres """
+        pool = DriverPool(fabrica=self.fabrica)
+        with pool.driver() as entrada:
+            pass
+        pool.encerra()
+        entrada.driver.quit.assert_called_once()
+        self.assertEqual(pool.criados, 0)
+
+
+class SalvaPrecosTestCase(TestCase):
+
+    def setUp(self):
+        self.acoes = {
+            ticker: Acao.objects.create(ticker=ticker, preco=preco)
+            for ticker, preco in [('COGN3', 2.14), ('VIIA3', 4.00), ('PETR4', 30.00)]
+        }
+        self.atualizacao_cogn3 = self.acoes['COGN3'].data_hora_atualizacao
+
+    def test_salva_somente_alterados(self):
+        """ Preços iguais não são regravados, mas ficam como verificados """
+        acoes = {acao.ticker: acao for acao in Acao.objects.all()}
+        versao = versao_precos()
+        with self.assertNumQueries(6):
+            alteradas, invalidos = salva_precos(acoes, cotacoes(
+                date(2022, 1, 17), COGN3='2.14', VIIA3='4.10', PETR4='32.35'
+            ))
+
+        self.assertEqual(alteradas, {'VIIA3', 'PETR4'})
+        self.assertEqual(invalidos, set())
+        self.assertNotEqual(versao_precos(), versao)
+        cogn3 = Acao.objects.get(ticker='COGN3')
+        self.assertEqual(cogn3.data_hora_atualizacao, self.atualizacao_cogn3)
+        self.assertIsNotNone(cogn3.data_hora_verificacao)
+        self.assertEqual(Acao.objects.get(ticker='VIIA3').preco, Decimal('4.10'))
+        self.assertEqual(Acao.objects.get(ticker='PETR4').preco, Decimal('32.35'))
+
+    def test_preco_invalido_nao_interrompe_lote(self):
+        """ Preço que não é número fica de fora, os demais são gravados """
+        acoes = {acao.ticker: acao for acao in Acao.objects.all()}
+        alteradas, invalidos = salva_precos(acoes, cotacoes(
+            date(2022, 1, 17), COGN3=',', VIIA3='4.10', PETR4='1.2.3'
+        ))
+
+        self.assertEqual(alteradas, {'VIIA3'})
+        self.assertEqual(invalidos, {'COGN3', 'PETR4'})
+        self.assertEqual(Acao.objects.get(ticker='VIIA3').preco, Decimal('4.10'))
+        cogn3 = Acao.objects.get(ticker='COGN3')
+        self.assertEqual(cogn3.preco, Decimal('2.14'))
+        self.assertIsNone(cogn3.data_hora_verificacao)
+        self.assertEqual(
+            list(AcaoPrecoHistorico.objects.values_list('acao__ticker', flat=True)),
+            ['VIIA3']
+        )
+
+    def test_historico_upsert_por_dia(self):
+        """ Histórico tem um registro por ação e dia, atualizado no mesmo dia """
+        acoes = {acao.ticker: acao for acao in Acao.objects.all()}
+        salva_precos(acoes, cotacoes(date(2022, 1, 17), COGN3='2.14', VIIA3='4.10'))
+        salva_precos(acoes, cotacoes(date(2022, 1, 17), COGN3='2.20', VIIA3='4.10'))
+        salva_precos(acoes, cotacoes(date(2022, 1, 18), COGN3='2.30'))
+
+        historico = AcaoPrecoHistorico.objects.filter(
+            acao__ticker='COGN3'
+        ).order_by('data').values_list('data', 'preco')
+        self.assertEqual(list(historico), [
+            (date(2022, 1, 17), Decimal('2.20')),
+            (date(2022, 1, 18), Decimal('2.30')),
+        ])
+        self.assertEqual(AcaoPrecoHistorico.objects.count(), 3)
+
+    def test_historico_sem_data_no_pregao_anterior(self):
+        """ Sem a data na página, o preço fica no pregão anterior à busca """
+        acoes = {acao.ticker: acao for acao in Acao.objects.all()}
+        segunda = date(2022, 1, 17)
+        with mock.patch('django.utils.timezone.localdate', return_value=segunda):
+            salva_precos(acoes, cotacoes(COGN3='2.14'))
+        self.assertEqual(
+            AcaoPrecoHistorico.objects.get().data, date(2022, 1, 14)
+        )
+
+    def test_pregao_anterior(self):
+        self.assertEqual(pregao_anterior(date(2022, 1, 18)), date(2022, 1, 17))
+        # Segunda, sábado e domingo: sexta-feira
+        for dia in (17, 15, 16):
+            self.assertEqual(pregao_anterior(date(2022, 1, dia)), date(2022, 1, 14))
+
+
+class TaskScrapTestCase(ServidorLocalMixin, TestCase):
+
+    def setUp(self):
+        Acao.objects.create(ticker='COGN3', preco=1.00)
+        Acao.objects.create(ticker='ZZZZ3', preco=1.00)
+
+    def configuracao(self, **kwargs):
+        return override_settings(**{
+            'SCRAPER_BACKEND': 'http',
+            'SCRAPER_URL_BASE': self.servidor.url_base,
+            'SCRAPER_FALLBACK_SELENIUM': False,
+            **kwargs
+        })
+
+    def test_task_lote_atualiza_precos(self):
+        """ Task do lote atualiza preços pelo backend HTTP """
+        with self.configuracao():
+            feedback = task_scrap_lote.apply(args=(['COGN3', 'ZZZZ3'],)).get()
+
+        self.assertEqual(feedback['COGN3'], 'atualizada para: 2.14')
+        self.assertEqual(feedback['ZZZZ3'], 'Elemento não encontrado para ação')
+        self.assertEqual(
+            Acao.objects.get(ticker='COGN3').preco, Decimal('2.14')
+        )
+
+    def test_task_lote_historico_na_data_da_cotacao(self):
+        """
+        Busca na segunda com a cotação de sexta na página: o histórico fica
+        na sexta, onde a importação do COTAHIST encontraria o mesmo pregão
+        """
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        html = (DIRETORIO_PAGINAS / 'COGN3.html').read_bytes()
+        with open(os.path.join(diretorio.name, 'COGN3.html'), 'wb') as arquivo:
+            arquivo.write(html.replace(b'17/01/2022', b'14/01/2022'))
+        servidor = inicia_servidor(diretorio=diretorio.name)
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+
+        segunda = date(2022, 1, 17)
+        with self.configuracao(SCRAPER_URL_BASE=servidor.url_base), mock.patch(
+            'django.utils.timezone.localdate', return_value=segunda
+        ):
+            task_scrap_lote.apply(args=(['COGN3'],)).get()
+
+        self.assertEqual(
+            list(AcaoPrecoHistorico.objects.values_list('data', 'preco')),
+            [(date(2022, 1, 14), Decimal('2.14'))]
+        )
+
+    def test_task_lote_preco_invalido(self):
+        """ Preço inválido de um ticker é informado sem perder o lote """
+        Acao.objects.create(ticker='VIIA3', preco=1.00)
+        precos = cotacoes(COGN3='2.14', VIIA3='1,2,3')
+        with self.configuracao(), mock.patch(
+            'acoes.scraper.backends.HttpBackend.busca_precos', return_value=precos
+        ):
+            feedback = task_scrap_lote.apply(args=(['COGN3', 'VIIA3'],)).get()
+
+        self.assertEqual(feedback['COGN3'], 'atualizada para: 2.14')
+        self.assertEqual(feedback['VIIA3'], 'Preço inválido: 1,2,3')
+        self.assertEqual(Acao.objects.get(ticker='VIIA3').preco, Decimal('1.00'))
+
+    def test_task_lote_preco_sem_alteracao(self):
+        """ Preço igual ao atual não é regravado """
+        Acao.objects.filter(ticker='COGN3').update(preco=2.14)
+        with self.configuracao():
+            feedback = task_scrap_lote.apply(args=(['COGN3'],)).get()
+        self.assertEqual(feedback['COGN3'], 'sem alteração: 2.14')
+
+    def test_coordenador_distribui_lotes(self):
+        """ Coordenador divide os tickers em lotes e consolida o feedback """
+        Acao.objects.create(ticker='VIIA3', preco=1.00)
+        app.conf.task_always_eager = True
+        try:
+            with self.configuracao(SCRAPER_TAMANHO_LOTE=2):
+                resumo = task_scrap_acoes_dia_anterior.apply(
+                    args=(MODO_TODAS,)
+                ).get()
+        finally:
+            app.conf.task_always_eager = False
+
+        self.assertEqual(resumo, {'tickers': 3, 'lotes': 2})
+        self.assertEqual(
+            Acao.objects.get(ticker='VIIA3').preco, Decimal('4.00')
+        )
+
+    def test_coordenador_somente_em_carteira(self):
+        """ Modo padrão busca somente ações que estão em alguma carteira """
+        Acao.objects.filter(ticker='COGN3').update(em_carteira=True)
+        with mock.patch('acoes.tasks.chord') as chord:
+            resumo = task_scrap_acoes_dia_anterior.apply().get()
+
+        self.assertEqual(resumo, {'tickers': 1, 'lotes': 1})
+        lotes = [assinatura.args for assinatura in chord.call_args.args[0].tasks]
+        self.assertEqual(lotes, [(['COGN3'],)])
+
+    def test_divide_em_lotes(self):
+        """ Divisão dos tickers em lotes """
+        self.assertEqual(
+            divide_em_lotes(['A', 'B', 'C'], 2), [['A', 'B'], ['C']]
+        )
+        self.assertEqual(divide_em_lotes([], 2), [])
+
+    def test_consolida_feedback(self):
+        """ Feedback dos lotes é unido em um único dict """
+        feedback = task_consolida_feedback.apply(args=([
+            {'COGN3': 'a', 'cache': {'hits': 1, 'misses': 0}},
+            {'VIIA3': 'b', 'cache': {'hits': 2, 'misses': 3}},
+        ],)).get()
+        self.assertEqual(feedback, {
+            'COGN3': 'a', 'VIIA3': 'b', 'cache': {'hits': 3, 'misses': 3}
+        })
+
+    def test_task_lote_cache(self):
+        """
+        Página inalterada é marcada como verificada e o feedback traz os
+        hits do cache
+        """
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        with self.configuracao(SCRAPER_CACHE_DIRETORIO=diretorio.name):
+            task_scrap_lote.apply(args=(['COGN3'],)).get()
+            Acao.objects.filter(ticker='COGN3').update(data_hora_verificacao=None)
+            AcaoPrecoHistorico.objects.all().delete()
+            feedback = task_scrap_lote.apply(args=(['COGN3'],)).get()
+
+        self.assertEqual(feedback['COGN3'], 'página sem alteração: 2.14')
+        self.assertEqual(feedback['cache'], {'hits': 1, 'misses': 0})
+        acao = Acao.objects.get(ticker='COGN3')
+        self.assertIsNotNone(acao.data_hora_verificacao)
+        self.assertEqual(
+            list(AcaoPrecoHistorico.objects.values_list('acao', 'preco')),
+            [(acao.pk, Decimal('2.14'))]
+        )
+
+    def test_task_lote_cache_preco_divergente(self):
+        """ Preço do cache diferente do banco (ex.: gravação perdida) é regravado """
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        with self.configuracao(SCRAPER_CACHE_DIRETORIO=diretorio.name):
+            task_scrap_lote.apply(args=(['COGN3'],)).get()
+            Acao.objects.filter(ticker='COGN3').update(preco=1)
+            feedback = task_scrap_lote.apply(args=(['COGN3'],)).get()
+
+        self.assertEqual(feedback['COGN3'], 'atualizada para: 2.14')
+        self.assertEqual(feedback['cache'], {'hits': 1, 'misses': 0})
+        self.assertEqual(Acao.objects.get(ticker='COGN3').preco, Decimal('2.14'))
+
+    def test_retry_somente_tickers_com_falha(self):
+        """ Retry do lote processa somente os tickers que falharam """
+        Acao.objects.create(ticker='XXXX3', preco=1.00)
+        with self.configuracao(), mock.patch.object(
+            task_scrap_lote, 'retry', side_effect=Retry
+        ) as retry:
+            with self.assertRaises(Retry):
+                task_scrap_lote.run(['COGN3', 'XXXX3'])
+
+        kwargs = retry.call_args.kwargs
+        self.assertEqual(kwargs['args'], (['XXXX3'],))
+        self.assertEqual(
+            kwargs['kwargs']['feedback']['COGN3'], 'atualizada para: 2.14'
+        )
+        self.assertEqual(kwargs['countdown'], 15)
+
+    def test_retry_reaproveita_feedback(self):
+        """ Execução do retry mantém o feedback dos tickers já atualizados """
+        with self.configuracao():
+            feedback = task_scrap_lote.apply(
+                args=(['ZZZZ3'],),
+                kwargs={'feedback': {'COGN3': 'atualizada para: 2.14'}},
+            ).get()
+        self.assertEqual(feedback, {
+            'COGN3': 'atualizada para: 2.14',
+            'ZZZZ3': 'Elemento não encontrado para ação',
+        })
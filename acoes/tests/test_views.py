@@ -1,13 +1,19 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
+from datetime import date, timedelta
 from decimal import Decimal
 import json
+from unittest import mock
 
 
-from acoes.models import Acao, Carteira, Movimentacao
+from acoes.cache import estatisticas, grava_estatisticas, zera_estatisticas
+from acoes.models import Acao, Carteira, EstatisticaCache, Movimentacao
+from acoes.paginacao import TAMANHO_PAGINA
 
 
 User = get_user_model()
@@ -259,6 +265,77 @@ class MovimentacaoCadastroTestCase(TestCase):
         ).exists()
         self.assertFalse(carteira)
 
+    def test_cadastrar_venda_retroativa_sem_posicao(self):
+        """ Venda anterior à compra é recusada, sem alterar a carteira """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        compra = {
+            'acao': self.acao.id,
+            'data_movimentacao': '2022-01-18',
+            'tipo': 'C',
+            'preco': 2.00,
+            'quantidade': 300
+        }
+        self.client.post(self.url_cadastro_movimentacao, compra)
+
+        venda = dict(compra, data_movimentacao='2022-01-17', tipo='V', quantidade=100)
+        response = self.client.post(self.url_cadastro_movimentacao, venda)
+        self.assertEquals(response.status_code, 400)
+        self.assertFormError(response, 'form', 'quantidade',
+            'Venda de 100 em 17/01/2022 maior que a posição de 0'
+        )
+        self.assertFalse(
+            Movimentacao.objects.filter(acao=self.acao, tipo='V').exists()
+        )
+        carteira = Carteira.objects.get(user=self.user, acao=self.acao)
+        self.assertEquals(carteira.quantidade, 300)
+
+    def test_cadastrar_venda_retroativa_descobre_venda_posterior(self):
+        """ Venda coberta na sua data, mas que deixa uma venda posterior sem posição """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        for data_movimentacao, tipo, quantidade in (
+            ('2022-01-20', 'V', 80), ('2022-01-25', 'C', 100),
+        ):
+            response = self.client.post(self.url_cadastro_movimentacao, {
+                'acao': self.acao_extra.id,
+                'data_movimentacao': data_movimentacao,
+                'tipo': tipo,
+                'preco': 5.00,
+                'quantidade': quantidade
+            })
+            self.assertEquals(response.status_code, 200)
+
+        response = self.client.post(self.url_cadastro_movimentacao, {
+            'acao': self.acao_extra.id,
+            'data_movimentacao': '2022-01-18',
+            'tipo': 'V',
+            'preco': 5.00,
+            'quantidade': 50
+        })
+        self.assertEquals(response.status_code, 400)
+        self.assertFormError(response, 'form', 'quantidade',
+            'Venda de 80 em 20/01/2022 maior que a posição de 50'
+        )
+        self.assertEquals(
+            Carteira.objects.get(user=self.user, acao=self.acao_extra).quantidade,
+            120
+        )
+
+    def test_cadastrar_venda_numero_consultas(self):
+        """
+        Venda lê a posição uma única vez (validação e preço médio de venda)
+        """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        data = {
+            'acao': self.acao_extra.id,
+            'data_movimentacao': '2022-01-17',
+            'tipo': 'V',
+            'preco': 6.50,
+            'quantidade': 50
+        }
+        with self.assertNumQueries(12):
+            response = self.client.post(self.url_cadastro_movimentacao, data)
+        self.assertEquals(response.status_code, 200)
+
 class ListaMovimentacaoTestCase(TestCase):
 
     def setUp(self):
@@ -312,7 +389,71 @@ class ListaMovimentacaoTestCase(TestCase):
         self.assertEquals(response.status_code, 200)
         self.assertTemplateUsed(response, 'movimentacao/_lista.html')
         lista_movimentacoes = response.context['movimentacoes']
-        self.assertEquals(lista_movimentacoes.count(), 2)
+        self.assertEquals(len(lista_movimentacoes), 2)
+
+    def cria_movimentacoes_lista(self, total):
+        """ Movimentações extras, várias no mesmo dia, sem recalcular a carteira """
+        Movimentacao.objects.bulk_create([
+            Movimentacao(
+                acao=self.acao, user=self.user, tipo='C', preco=1, quantidade=1,
+                valor_total=1,
+                data_movimentacao=date(2021, 1, 1) + timedelta(days=i // 3),
+            )
+            for i in range(total)
+        ])
+
+    def test_paginacao_por_cursor(self):
+        """ Páginas seguem pelo cursor, sem repetir nem pular linhas """
+        self.cria_movimentacoes_lista(2 * TAMANHO_PAGINA)
+        self.client.login(email=self.user.email, password='senha_secreta')
+        esperadas = list(
+            Movimentacao.objects.filter(user=self.user)
+            .order_by('-data_movimentacao', '-id').values_list('pk', flat=True)
+        )
+
+        lidas = []
+        response = self.client.get(self.url_movimentacoes)
+        while True:
+            lidas += [item.pk for item in response.context['movimentacoes']]
+            proxima_pagina = response.context['proxima_pagina']
+            if proxima_pagina is None:
+                break
+            with self.assertNumQueries(3):
+                response = self.client.get(proxima_pagina)
+            self.assertTemplateUsed(response, 'movimentacao/_linhas.html')
+            self.assertTemplateNotUsed(response, 'movimentacao/_lista.html')
+        self.assertEquals(lidas, esperadas)
+
+    def test_lista_numero_consultas(self):
+        """ Ações das linhas lidas na mesma consulta da página """
+        self.cria_movimentacoes_lista(TAMANHO_PAGINA)
+        self.client.login(email=self.user.email, password='senha_secreta')
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url_movimentacoes)
+        self.assertEquals(len(response.context['movimentacoes']), TAMANHO_PAGINA)
+        self.assertContains(response, 'class="proxima-pagina"')
+
+    def test_filtros(self):
+        """ Filtros por ticker, tipo e período """
+        Movimentacao.objects.create(
+            acao=self.acao, data_movimentacao='2022-01-20', preco=2.50,
+            tipo='V', quantidade=50, user=self.user
+        )
+        self.client.login(email=self.user.email, password='senha_secreta')
+        for filtros, esperadas in (
+            ({'ticker': 'cogn3'}, 2),
+            ({'tipo': 'V'}, 1),
+            ({'inicio': '2022-01-18', 'fim': '2022-01-19'}, 1),
+            ({'ticker': 'VIIA3', 'tipo': 'V'}, 0),
+        ):
+            response = self.client.get(self.url_movimentacoes, filtros)
+            self.assertEquals(len(response.context['movimentacoes']), esperadas)
+
+    def test_filtros_invalidos(self):
+        self.client.login(email=self.user.email, password='senha_secreta')
+        for filtros in ({'cursor': 'x'}, {'inicio': '2022-13-01'}, {'tipo': 'X'}):
+            response = self.client.get(self.url_movimentacoes, filtros)
+            self.assertEquals(response.status_code, 400)
 
 
 class DashboardTestCase(TestCase):
@@ -320,6 +461,8 @@ class DashboardTestCase(TestCase):
     maxDiff = None
 
     def setUp(self):
+        cache.clear()
+        zera_estatisticas()
         self.client = Client()
         self.url_dashboard = reverse('dashboard')
         self.url_grafico = reverse('lucro_prejuizo_mes_chart')
@@ -389,14 +532,103 @@ class DashboardTestCase(TestCase):
         self.client.login(email=self.user.email, password='senha_secreta')
         response = self.client.get(self.url_dashboard)
         carteira_atual = response.context['carteira']
-        self.assertEquals(carteira_atual.count(), 2)
+        self.assertEquals(len(carteira_atual), 2)
 
     def test_alocacao(self):
         """ Teste alocacao carteira por acao """
         self.client.login(email=self.user.email, password='senha_secreta')
         response = self.client.get(self.url_dashboard)
         carteira_alocacao = response.context['carteira_alocacao']
-        self.assertEquals(carteira_alocacao.count(), 2)
+        self.assertEquals(len(carteira_alocacao), 2)
+        # Ordenada pelo valor atual: VIIA3 (1200.00) e COGN3 (428.00)
+        self.assertEquals(
+            [item.acao.ticker for item in carteira_alocacao], ['VIIA3', 'COGN3']
+        )
+        self.assertEquals(
+            [round(item.alocacao, 2) for item in carteira_alocacao],
+            [Decimal('73.71'), Decimal('26.29')]
+        )
+
+    def test_dashboard_numero_consultas(self):
+        """
+        Carteira, totais e alocação saem de uma única consulta; as demais
+        são sessão, usuário e versão dos preços
+        """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url_dashboard)
+        self.assertContains(response, '73,71%')
+        item = response.context['carteira'][0]
+        self.assertEquals(item.acao.ticker, 'COGN3')
+        self.assertEquals(item.lucro, Decimal('-6.00'))
+        self.assertEquals(round(item.percentual_lucro, 2), Decimal('-1.38'))
+
+    def test_dashboard_cache(self):
+        """ Fragmentos em cache até a próxima movimentação ou atualização de preços """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        self.client.get(self.url_dashboard)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url_dashboard)
+        self.assertContains(response, '73,71%')
+        self.assertEquals(estatisticas()['carteira'], {
+            'hits': 1, 'misses': 1, 'taxa_acerto': 0.5
+        })
+
+        Movimentacao.objects.create(
+            acao=self.acao, data_movimentacao='2022-01-20', preco=2.17,
+            tipo='V', quantidade=200, user=self.user
+        )
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url_dashboard)
+        self.assertContains(response, '100,00%')
+        # A falha não grava os contadores; ficam pendentes até o intervalo
+        contadores = EstatisticaCache.objects.values_list('hits', 'misses')
+        self.assertEqual(contadores.get(fragmento='carteira'), (0, 0))
+        grava_estatisticas()
+        self.assertEqual(contadores.get(fragmento='carteira'), (1, 2))
+
+        # Como o scraper grava: preço e data de atualização
+        Acao.objects.filter(pk=self.acao_extra.pk).update(
+            preco=5.00, data_hora_atualizacao=timezone.now()
+        )
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url_dashboard)
+        self.assertContains(response, 'R$ 1.500,00')
+
+    def test_dashboard_cache_intervalo_gravacao(self):
+        """ Contadores gravados em um UPDATE passado o intervalo, acerto ou falha """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        self.client.get(self.url_dashboard)
+        with mock.patch('acoes.cache.INTERVALO_GRAVACAO', 0):
+            with self.assertNumQueries(4):
+                self.client.get(self.url_dashboard)
+        self.assertEqual(
+            EstatisticaCache.objects.values_list('hits', 'misses').get(
+                fragmento='carteira'
+            ),
+            (1, 1)
+        )
+        with self.assertNumQueries(3):
+            self.client.get(self.url_dashboard)
+
+    def test_grafico_lucro_cache(self):
+        """ JSON do gráfico em cache até a próxima movimentação """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        self.client.get(self.url_grafico, {'ano': 2022})
+        with self.assertNumQueries(2):
+            self.client.get(self.url_grafico, {'ano': 2022})
+        Acao.objects.filter(pk=self.acao.pk).update(
+            preco=3.00, data_hora_atualizacao=timezone.now()
+        )
+        with self.assertNumQueries(2):
+            self.client.get(self.url_grafico, {'ano': 2022})
+
+        Movimentacao.objects.create(
+            acao=self.acao, data_movimentacao='2022-01-20', preco=3.17,
+            tipo='V', quantidade=100, user=self.user
+        )
+        response = self.client.get(self.url_grafico, {'ano': 2022})
+        self.assertEqual(response.json()['data']['1']['lucro'], '100')
 
     def test_grafico_lucro(self):
         """ Teste dados json grafico lucro mensal """
@@ -410,6 +642,10 @@ class DashboardTestCase(TestCase):
             'preco': 5.00,
             'quantidade': 100
         }
+        response = self.client.post(reverse('cria_movimentacao'), data)
+        # Anterior à compra de 18/01: sem posição na data da venda
+        self.assertEqual(response.status_code, 400)
+        data['data_movimentacao'] = '2022-01-18'
         self.client.post(reverse('cria_movimentacao'), data)  
 
         data = {
@@ -422,7 +658,7 @@ class DashboardTestCase(TestCase):
         self.client.post(reverse('cria_movimentacao'), data)  
 
         # Faz request com os resultados
-        response = self.client.get(self.url_grafico)
+        response = self.client.get(self.url_grafico, {'ano': 2022})
         self.assertEqual(response.status_code, 200)
 
         dados =  {'data':{
@@ -442,3 +678,36 @@ class DashboardTestCase(TestCase):
         dados = json.dumps(dados)
         self.assertJSONEqual(str(response.content, encoding='utf8'), dados)
 
+    def test_grafico_lucro_periodo(self):
+        """ Gráfico por período agrupa os meses em uma única consulta """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        for data_movimentacao, tipo, preco in (
+            ('2021-12-01', 'C', 4.00), ('2021-12-20', 'V', 5.00),
+            ('2022-02-18', 'V', 2.00),
+        ):
+            Movimentacao.objects.create(
+                acao=self.acao_extra, data_movimentacao=data_movimentacao,
+                preco=preco, tipo=tipo, quantidade=10, user=self.user
+            )
+
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                self.url_grafico, {'inicio': '2021-12', 'fim': '2022-02'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(str(response.content, encoding='utf8'), {'data': {
+            '2021-12': {'lucro': '10', 'prejuizo': 0},
+            '2022-01': {'lucro': 0, 'prejuizo': 0},
+            '2022-02': {'lucro': 0, 'prejuizo': '20'},
+        }})
+
+    def test_grafico_lucro_periodo_invalido(self):
+        """ Parâmetros inválidos """
+        self.client.login(email=self.user.email, password='senha_secreta')
+        for parametros in ({'ano': 'x'}, {'inicio': '2022-13'},
+                           {'inicio': '2022-05', 'fim': '2022-01'},
+                           {'inicio': '0001-01', 'fim': '9999-11'},
+                           {'inicio': '2017-01', 'fim': '2022-01'}):
+            response = self.client.get(self.url_grafico, parametros)
+            self.assertEqual(response.status_code, 400)
+
@@ -1,12 +1,15 @@
 from django.urls import path
 
 from .views import (cria_movimentacao, movimentacoes, cria_acao,
-dashboard, lucro_prejuizo_mes_chart)
+dashboard, lucro_prejuizo_mes_chart, importa_movimentacoes_csv,
+exporta_movimentacoes)
 
 
 urlpatterns = [
     path('movimentacao/criar', cria_movimentacao, name="cria_movimentacao"),
+    path('movimentacao/importar', importa_movimentacoes_csv, name="importa_movimentacoes"),
     path('movimentacoes/', movimentacoes, name="movimentacoes"),
+    path('movimentacoes/exportar', exporta_movimentacoes, name="exporta_movimentacoes"),
     path('acao/criar', cria_acao, name="cria_acao"),
     path('dashboard/', dashboard, name="dashboard"),
     path('lucro_prejuizo_mes_chart/', lucro_prejuizo_mes_chart, name="lucro_prejuizo_mes_chart"),
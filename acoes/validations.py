@@ -1,23 +1,19 @@
 from .models import Carteira
 
 
-def valida_acao_existe_carteira(acao, usuario, campos_com_erro):
+def busca_carteira(acao, usuario):
+    """ Posição do usuário na ação, ou None (sem o join da ordenação padrão) """
+    return Carteira.objects.filter(acao=acao, user=usuario).first()
+
+def valida_acao_existe_carteira(carteira, campos_com_erro):
     """ Valida ação em carteira """
-    try:
-        Carteira.objects.get(
-            acao=acao, user=usuario
-        )
-    except Carteira.DoesNotExist:
+    if carteira is None:
         campos_com_erro['acao'] = "Não existe a ação em carteira para venda!"
 
-def valida_quantidade_carteira(acao, usuario, quantidade, campos_com_erro):
-    try:
-        carteira = Carteira.objects.get(
-            acao=acao, user=usuario
-        )
+def valida_quantidade_carteira(carteira, quantidade, campos_com_erro):
+    """ Valida quantidade em carteira suficiente para a venda """
+    if carteira is not None and quantidade is not None:
         if quantidade > carteira.quantidade:
             campos_com_erro['quantidade'] = (
                 "Quantidade em carteira e menor que a de venda!"
             )
-    except:
-        pass
\ No newline at end of file
@@ -1,8 +1,18 @@
 from django.shortcuts import render, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from acoes.models import Carteira, Movimentacao
-from acoes.forms import MovimentacaoForm, AcaoForm
+from acoes.models import Movimentacao
+from acoes.forms import (
+    MovimentacaoForm, AcaoForm, ImportacaoMovimentacoesForm,
+    FiltroMovimentacoesForm
+)
+from acoes.exportacao import FORMATOS, linhas_movimentacoes
+from acoes.importacao import ErroImportacao, importa_movimentacoes
+from acoes.paginacao import pagina_movimentacoes
+from acoes.posicao import PosicaoInsuficiente
+
+import io
 
 
 @login_required
@@ -16,19 +26,48 @@ def cria_movimentacao(request):
             movimentacao = form.save(commit=False)
             movimentacao.user = request.user
             if movimentacao.tipo == 'V':
-                acao_carteira_user = Carteira.objects.get(
-                    user=request.user, acao=movimentacao.acao
-                )
-                movimentacao.preco_medio_venda = acao_carteira_user.preco_medio
-            movimentacao.save()
-            return HttpResponse('ok')
-        else:
-            return render(
-                request, 'movimentacao/_form.html', {'form': form}, status=400
-            )
+                movimentacao.preco_medio_venda = form.carteira.preco_medio
+            try:
+                # A carteira atual não basta: a venda é validada contra a
+                # posição na sua data, e as vendas posteriores também
+                movimentacao.save(valida_posicao=True)
+            except PosicaoInsuficiente as erro:
+                form.add_error('quantidade', str(erro))
+            else:
+                return HttpResponse('ok')
+        return render(
+            request, 'movimentacao/_form.html', {'form': form}, status=400
+        )
 
     return render(request, 'movimentacao/_form.html', {'form': form})
 
+@login_required
+@csrf_exempt
+def importa_movimentacoes_csv(request):
+    """ Importa movimentações de um arquivo CSV """
+    form = ImportacaoMovimentacoesForm(request.POST or None, request.FILES or None)
+
+    if request.method == 'POST':
+        if form.is_valid():
+            arquivo = io.TextIOWrapper(
+                form.cleaned_data['arquivo'].file, encoding='utf-8-sig',
+                newline=''
+            )
+            try:
+                importadas, posicoes = importa_movimentacoes(arquivo, request.user)
+            except (ErroImportacao, UnicodeDecodeError) as erro:
+                erros = getattr(erro, 'erros', ['Arquivo deve estar em UTF-8'])
+                form.add_error('arquivo', erros)
+            else:
+                return JsonResponse({
+                    'importadas': importadas, 'posicoes': posicoes
+                })
+        return render(
+            request, 'movimentacao/_importacao.html', {'form': form}, status=400
+        )
+
+    return render(request, 'movimentacao/_importacao.html', {'form': form})
+
 @login_required
 @csrf_exempt
 def cria_acao(request):
@@ -49,9 +88,49 @@ def cria_acao(request):
 @login_required
 @csrf_exempt
 def movimentacoes(request):
-    """ Lista movimentações do usuário """
-    movimentacoes = Movimentacao.objects.filter(user=request.user).order_by('-data_movimentacao')
+    """
+    Lista movimentações do usuário, filtradas e paginadas por cursor; com
+    cursor devolve só as linhas da página seguinte (rolagem infinita)
+    """
+    form = FiltroMovimentacoesForm(request.GET)
+    if not form.is_valid():
+        return render(request, 'movimentacao/_lista.html', {
+            'form': form, 'movimentacoes': []
+        }, status=400)
+
+    cursor = form.cleaned_data['cursor']
+    movimentacoes, proximo_cursor = pagina_movimentacoes(
+        form.filtra(Movimentacao.objects.filter(user=request.user)), cursor
+    )
+    proxima_pagina = None
+    if proximo_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = proximo_cursor
+        proxima_pagina = f'{request.path}?{parametros.urlencode()}'
+
     dados = {
-        'movimentacoes': movimentacoes
+        'form': form,
+        'movimentacoes': movimentacoes,
+        'proxima_pagina': proxima_pagina,
     }
+    if cursor:
+        return render(request, 'movimentacao/_linhas.html', dados)
     return render(request, 'movimentacao/_lista.html', dados)
+
+@login_required
+def exporta_movimentacoes(request):
+    """ Histórico completo de movimentações em CSV (padrão) ou XLSX, em streaming """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return JsonResponse(
+            data={'erro': f"Formato inválido: {formato}"}, status=400
+        )
+
+    gera, content_type = FORMATOS[formato]
+    response = StreamingHttpResponse(
+        gera(linhas_movimentacoes(request.user.pk)), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="movimentacoes.{formato}"'
+    )
+    return response
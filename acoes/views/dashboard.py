@@ -1,62 +1,136 @@
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.db.models import F, Sum
 from django.http import JsonResponse
 
-from datetime import date
+from datetime import date, timedelta
 
-from acoes.models import Carteira, Movimentacao
+from acoes.cache import busca_fragmentos, chave_usuario, versao_precos
+from acoes.carteira import ResumoCarteira
+from acoes.resultados import resultados_mensais
+
+
+def converte_mes(valor, ultimo_dia=False):
+    """ AAAA-MM ou AAAA-MM-DD; AAAA-MM vira o primeiro ou o último dia do mês """
+    try:
+        if len(valor) == 7:
+            ano, mes = map(int, valor.split('-'))
+            if ultimo_dia:
+                return proximo_mes(date(ano, mes, 1)) - timedelta(days=1)
+            return date(ano, mes, 1)
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"Data inválida: {valor}")
+
+
+# Limite do período por requisição (os meses são montados e guardados em cache)
+MESES_MAXIMOS_GRAFICO = 60
+
+
+def proximo_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def periodo_grafico(parametros):
+    """
+    Período do gráfico: ?ano=AAAA (padrão ano atual) ou ?inicio=...&fim=...
+    Retorna (inicio, fim, ano informado ou None)
+    """
+    if 'inicio' in parametros or 'fim' in parametros:
+        hoje = date.today()
+        inicio = converte_mes(parametros.get('inicio') or f'{hoje.year}-01')
+        fim = converte_mes(parametros.get('fim') or hoje.isoformat(), True)
+        if fim < inicio:
+            raise ValueError("Data final anterior à inicial")
+        meses = (fim.year - inicio.year) * 12 + fim.month - inicio.month + 1
+        if meses > MESES_MAXIMOS_GRAFICO:
+            raise ValueError(
+                f"Período de {meses} meses; o máximo é {MESES_MAXIMOS_GRAFICO}"
+            )
+        return inicio, fim, None
+
+    try:
+        ano = int(parametros.get('ano', date.today().year))
+        return date(ano, 1, 1), date(ano, 12, 31), ano
+    except ValueError:
+        raise ValueError(f"Ano inválido: {parametros.get('ano')}")
+
+
+def valor_grafico(valor):
+    """ Valor sem zeros à direita ('100', '12.5'), como o gráfico sempre devolveu """
+    if not valor:
+        return 0
+    if valor == valor.to_integral_value():
+        return valor.quantize(1)
+    return valor.normalize()
 
 
 @login_required
 def lucro_prejuizo_mes_chart(request):
-    """ Lucro x Prejuizo por mes no ano atual """
-    movimentacoes = Movimentacao.objects.filter(
-        user=request.user, data_movimentacao__year=date.today().year, tipo='V'
-    )
+    """
+    Lucro x Prejuizo por mes, lido da tabela de resultados mensais e
+    guardado em cache até a próxima alteração da carteira do usuário
+    Com ?ano= as chaves são os meses 1 a 12; com ?inicio=&fim= são AAAA-MM
+    """
+    try:
+        inicio, fim, ano = periodo_grafico(request.GET)
+    except ValueError as erro:
+        return JsonResponse(data={'erro': str(erro)}, status=400)
 
-    resultados_por_mes = {}
-    for mes in range(1,13):
-        resultados_por_mes[mes] = {}
-        resultados_por_mes[mes]['lucro'] = 0
-        resultados_por_mes[mes]['prejuizo'] = 0
-
-        resultado = movimentacoes.filter(data_movimentacao__month=mes).annotate(
-            resultado_venda=F('valor_total')-(Sum(F('preco_medio_venda')*F('quantidade')))
-        )
-
-        for i in resultado:
-            if i.resultado_venda > 0:
-                resultados_por_mes[mes]['lucro'] += i.resultado_venda
-            else:
-                resultados_por_mes[mes]['prejuizo'] -= i.resultado_venda
+    def gera(nomes):
+        resultados = resultados_mensais(request.user.pk, inicio, fim)
+        resultados_por_mes = {}
+        mes = inicio.replace(day=1)
+        while mes <= fim:
+            lucro, prejuizo = resultados.get(mes, (0, 0))
+            chave = mes.month if ano else f'{mes:%Y-%m}'
+            resultados_por_mes[chave] = {
+                'lucro': valor_grafico(lucro),
+                'prejuizo': valor_grafico(prejuizo),
+            }
+            mes = proximo_mes(mes)
+        return {'grafico': resultados_por_mes}
+
+    # Só depende das vendas do usuário, não dos preços
+    fragmentos = busca_fragmentos(
+        {'grafico': chave_usuario('grafico', request.user, inicio, fim, bool(ano))},
+        gera
+    )
     return JsonResponse(data={
-        'data': resultados_por_mes,
+        'data': fragmentos['grafico'],
     })
 
 
-@login_required
-def dashboard(request):
-    """ Items do Dashboard """
+FRAGMENTOS_DASHBOARD = {
+    'header': 'dashboard/_header.html',
+    'carteira': 'dashboard/_carteira.html',
+    'alocacao': 'dashboard/_alocacao.html',
+}
 
-    # Carteira
-    carteira = Carteira.objects.filter(
-        user=request.user
-    )
 
-    acoes_carteira = carteira.annotate(
-        lucro=((F('acao__preco')-F('preco_medio'))*F('quantidade')),
-        valor_atual=(F('acao__preco')*F('quantidade'))
-    )
-
-    totais = carteira.aggregate(
-        total_investido=Sum('valor_investido'),
-        total_atual=Sum(F('acao__preco')*F('quantidade'))
-    )
+@login_required
+def dashboard(request):
+    """
+    Items do Dashboard, com os fragmentos em cache até a próxima alteração
+    da carteira do usuário ou dos preços
+    """
+    def gera(nomes):
+        resumo = ResumoCarteira.do_usuario(request.user.pk)
+        dados = {
+            'carteira': resumo.posicoes,
+            'carteira_alocacao': resumo.alocacao,
+            'totais': resumo.totais,
+        }
+        return {
+            nome: render_to_string(FRAGMENTOS_DASHBOARD[nome], dados, request)
+            for nome in nomes
+        }
 
-    dados = {
-        'carteira': acoes_carteira,
-        'carteira_alocacao': acoes_carteira.order_by('-valor_atual'),
-        'totais': totais,
-    }
-    return render(request, 'dashboard/dashboard.html', dados)
+    versao = versao_precos()
+    fragmentos = busca_fragmentos({
+        nome: chave_usuario(nome, request.user, versao)
+        for nome in FRAGMENTOS_DASHBOARD
+    }, gera)
+    return render(request, 'dashboard/dashboard.html', {
+        'fragmentos': fragmentos,
+    })
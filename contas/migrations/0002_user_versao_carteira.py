@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='versao_carteira',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Versão da carteira'),
+        ),
+    ]
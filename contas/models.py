@@ -6,7 +6,20 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+
+    def delete(self):
+        """
+        As movimentações removidas em cascata não reprocessam a posição
+        uma a uma (acoes.posicao.reprocessamento_agrupado)
+        """
+        from acoes.posicao import reprocessamento_agrupado
+
+        with reprocessamento_agrupado():
+            return super().delete()
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Define model manager para model User sem o campo username."""
     use_in_migrations = True
 
@@ -42,12 +55,23 @@ class UserManager(BaseUserManager):
 class User(AbstractUser):
     username = None
     email = models.EmailField(verbose_name=(_('email address')), max_length=255, unique=True)
+    # Incrementada a cada reprocessamento das posições do usuário; compõe
+    # a chave do cache do dashboard (acoes.cache)
+    versao_carteira = models.PositiveIntegerField(
+        'Versão da carteira', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
     objects = UserManager()
 
+    def delete(self, *args, **kwargs):
+        from acoes.posicao import reprocessamento_agrupado
+
+        with reprocessamento_agrupado():
+            return super().delete(*args, **kwargs)
+
     @property
     def get_full_name(self):
         return self.first_name + ' ' + self.last_name
\ No newline at end of file
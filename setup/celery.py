@@ -18,9 +18,16 @@ app.conf.task_routes = [
 
 ]
 app.conf.beat_schedule = {
+    # Coordenador que distribui o scrap em lotes entre os workers
     'chama_schedule1': {
         'task': 'acoes.tasks.task_scrap_acoes_dia_anterior',
         'schedule': crontab(hour=11, minute=0, day_of_week='1-5'),
-        'args': ()
+        'args': ('em_carteira',)
+    },
+    # Varredura completa, inclusive das ações que ninguém possui
+    'varredura_completa': {
+        'task': 'acoes.tasks.task_scrap_acoes_dia_anterior',
+        'schedule': crontab(hour=11, minute=0, day_of_week='6'),
+        'args': ('todas',)
     },
 }
\ No newline at end of file
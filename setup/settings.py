@@ -80,6 +80,14 @@ DATABASES = {
     'default': env.db()
 }
 
+# locmemcache:// (padrão) ou filecache:///caminho; cada processo pode ter o
+# seu cache, pois as versões que invalidam os fragmentos do dashboard (da
+# carteira e dos preços gravados pelo worker do Celery) são lidas do banco
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+DASHBOARD_CACHE_TIMEOUT = env.int('DASHBOARD_CACHE_TIMEOUT', default=60 * 60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -147,6 +155,20 @@ USE_THOUSAND_SEPARATOR=True
 PATH_DRIVER_FIREFOX = env('PATH_DRIVER_FIREFOX')
 PATH_BINARY_FIREFOX = env('PATH_BINARY_FIREFOX')
 
+# Scraper de cotações
+SCRAPER_BACKEND = env('SCRAPER_BACKEND', default='http')
+SCRAPER_URL_BASE = env('SCRAPER_URL_BASE', default='https://www.fundamentus.com.br')
+SCRAPER_CONCORRENCIA = env.int('SCRAPER_CONCORRENCIA', default=8)
+SCRAPER_TAMANHO_LOTE = env.int('SCRAPER_TAMANHO_LOTE', default=50)
+SCRAPER_TIMEOUT = env.float('SCRAPER_TIMEOUT', default=10.0)
+SCRAPER_PARSER = env('SCRAPER_PARSER', default='html')
+SCRAPER_CACHE_DIRETORIO = env('SCRAPER_CACHE_DIRETORIO', default='')
+SCRAPER_CACHE_TAMANHO_MAXIMO = env.int('SCRAPER_CACHE_TAMANHO_MAXIMO', default=50 * 1024 * 1024)
+SCRAPER_FALLBACK_SELENIUM = env.bool('SCRAPER_FALLBACK_SELENIUM', default=True)
+SCRAPER_RETRY_ESPERA = env.int('SCRAPER_RETRY_ESPERA', default=15)
+SCRAPER_DRIVERS_POR_PROCESSO = env.int('SCRAPER_DRIVERS_POR_PROCESSO', default=1)
+SCRAPER_DRIVER_MAX_PAGINAS = env.int('SCRAPER_DRIVER_MAX_PAGINAS', default=200)
+
 CELERY_BROKER_URL = env('CLOUDAMQP_URL')
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'